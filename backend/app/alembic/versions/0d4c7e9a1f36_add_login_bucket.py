@@ -0,0 +1,32 @@
+"""add login bucket
+
+Revision ID: 0d4c7e9a1f36
+Revises: b5e81c4f2a97
+Create Date: 2026-10-18 19:27:44.902116
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '0d4c7e9a1f36'
+down_revision = 'b5e81c4f2a97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('loginbucket',
+    sa.Column('key', sqlmodel.sql.sqltypes.AutoString(length=320), nullable=False),
+    sa.Column('tokens', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    # Losing the buckets in a crash only resets the limits, skip the WAL
+    op.execute('ALTER TABLE loginbucket SET UNLOGGED')
+
+
+def downgrade():
+    op.drop_table('loginbucket')
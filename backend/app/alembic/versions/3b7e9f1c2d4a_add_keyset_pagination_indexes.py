@@ -0,0 +1,42 @@
+"""add keyset pagination indexes
+
+Revision ID: 3b7e9f1c2d4a
+Revises: aac5120dca8e
+Create Date: 2026-10-18 09:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7e9f1c2d4a'
+down_revision = 'aac5120dca8e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows get the migration time so every row has a sort key
+    op.add_column('user', sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False))
+    op.add_column('item', sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False))
+    op.alter_column('user', 'created_at', server_default=None)
+    op.alter_column('item', 'created_at', server_default=None)
+    op.execute('UPDATE todo SET created_at = now() WHERE created_at IS NULL')
+
+    op.create_index('ix_user_created_at_id', 'user', ['created_at', 'id'], unique=False)
+    op.create_index('ix_item_created_at_id', 'item', ['created_at', 'id'], unique=False)
+    op.create_index('ix_item_owner_id_created_at_id', 'item', ['owner_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_todo_created_at_id', 'todo', ['created_at', 'id'], unique=False)
+    op.create_index('ix_todo_owner_id_created_at_id', 'todo', ['owner_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_todo_owner_id_created_at_id', table_name='todo')
+    op.drop_index('ix_todo_created_at_id', table_name='todo')
+    op.drop_index('ix_item_owner_id_created_at_id', table_name='item')
+    op.drop_index('ix_item_created_at_id', table_name='item')
+    op.drop_index('ix_user_created_at_id', table_name='user')
+    op.drop_column('item', 'created_at')
+    op.drop_column('user', 'created_at')
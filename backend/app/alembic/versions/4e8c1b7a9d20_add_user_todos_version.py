@@ -0,0 +1,25 @@
+"""add user todos version
+
+Revision ID: 4e8c1b7a9d20
+Revises: 7f3b2d8e6c41
+Create Date: 2026-10-18 21:02:17.418306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '4e8c1b7a9d20'
+down_revision = '7f3b2d8e6c41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('user', sa.Column('todos_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    op.drop_column('user', 'todos_version')
@@ -0,0 +1,31 @@
+"""clear dropped email bodies
+
+Revision ID: 5d1a9e3c7b48
+Revises: 4e8c1b7a9d20
+Create Date: 2026-10-18 22:41:08.263917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '5d1a9e3c7b48'
+down_revision = '4e8c1b7a9d20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Emails given up on kept their body, which may hold a password or a
+    # reset link
+    op.execute("""
+        UPDATE emailoutbox
+        SET html_content = ''
+        WHERE next_attempt_at IS NULL
+    """)
+
+
+def downgrade():
+    pass
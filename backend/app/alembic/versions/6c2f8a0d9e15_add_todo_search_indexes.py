@@ -0,0 +1,47 @@
+"""add todo search indexes
+
+Revision ID: 6c2f8a0d9e15
+Revises: 3b7e9f1c2d4a
+Create Date: 2026-10-18 11:40:05.127733
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '6c2f8a0d9e15'
+down_revision = '3b7e9f1c2d4a'
+branch_labels = None
+depends_on = None
+
+
+def _trgm_available():
+    bind = op.get_bind()
+    return bind.execute(
+        sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    ).first() is not None
+
+
+def upgrade():
+    op.add_column('todo', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed("to_tsvector('simple', title || ' ' || \"desc\")", persisted=True),
+        nullable=True,
+    ))
+    op.create_index('ix_todo_search_vector', 'todo', ['search_vector'], unique=False, postgresql_using='gin')
+    # Without pg_trgm substring search still works, only unindexed
+    if _trgm_available():
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.create_index('ix_todo_title_trgm', 'todo', ['title'], unique=False, postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'})
+        op.create_index('ix_todo_desc_trgm', 'todo', ['desc'], unique=False, postgresql_using='gin', postgresql_ops={'desc': 'gin_trgm_ops'})
+
+
+def downgrade():
+    op.execute('DROP INDEX IF EXISTS ix_todo_desc_trgm')
+    op.execute('DROP INDEX IF EXISTS ix_todo_title_trgm')
+    op.drop_index('ix_todo_search_vector', table_name='todo', postgresql_using='gin')
+    op.drop_column('todo', 'search_vector')
@@ -0,0 +1,41 @@
+"""add todo subtodo counters
+
+Revision ID: a41d7c3e8b92
+Revises: 6c2f8a0d9e15
+Create Date: 2026-10-18 14:05:52.640118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'a41d7c3e8b92'
+down_revision = '6c2f8a0d9e15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('todo', sa.Column('subtodo_total', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('todo', sa.Column('subtodo_completed', sa.Integer(), server_default='0', nullable=False))
+    # Backfill from the existing subtodos
+    op.execute("""
+        UPDATE todo
+        SET subtodo_total = counts.total,
+            subtodo_completed = counts.completed
+        FROM (
+            SELECT todo_id,
+                   count(*) AS total,
+                   count(*) FILTER (WHERE status = 'completed') AS completed
+            FROM subtodo
+            GROUP BY todo_id
+        ) AS counts
+        WHERE todo.id = counts.todo_id
+    """)
+
+
+def downgrade():
+    op.drop_column('todo', 'subtodo_completed')
+    op.drop_column('todo', 'subtodo_total')
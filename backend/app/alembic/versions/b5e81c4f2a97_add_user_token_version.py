@@ -0,0 +1,25 @@
+"""add user token version
+
+Revision ID: b5e81c4f2a97
+Revises: e93b4d2a7f06
+Create Date: 2026-10-18 16:42:10.318274
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e81c4f2a97'
+down_revision = 'e93b4d2a7f06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('user', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    op.drop_column('user', 'token_version')
@@ -0,0 +1,99 @@
+"""store todo status as enum
+
+Revision ID: c58e2b17f4a3
+Revises: a41d7c3e8b92
+Create Date: 2026-10-18 15:31:27.904516
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c58e2b17f4a3'
+down_revision = 'a41d7c3e8b92'
+branch_labels = None
+depends_on = None
+
+status_enum = postgresql.ENUM('pending', 'completed', 'in_progress', name='statusenum')
+
+
+# Legacy free-text values, normalized to lower case with underscores
+STATUS_SYNONYMS = {
+    'pending': 'pending',
+    'todo': 'pending',
+    'to_do': 'pending',
+    'open': 'pending',
+    'new': 'pending',
+    'not_started': 'pending',
+    'completed': 'completed',
+    'complete': 'completed',
+    'done': 'completed',
+    'finished': 'completed',
+    'closed': 'completed',
+    'in_progress': 'in_progress',
+    'inprogress': 'in_progress',
+    'started': 'in_progress',
+    'doing': 'in_progress',
+    'wip': 'in_progress',
+}
+
+
+def upgrade():
+    status_enum.create(op.get_bind(), checkfirst=True)
+    for table in ('todo', 'subtodo'):
+        normalized = f"lower(regexp_replace(trim(status), '[\\s-]+', '_', 'g'))"
+        unknown = op.get_bind().execute(sa.text(f"""
+            SELECT DISTINCT status FROM {table}
+            WHERE {normalized} NOT IN :known
+        """).bindparams(sa.bindparam('known', expanding=True)),
+            {'known': list(STATUS_SYNONYMS)},
+        ).scalars().all()
+        if unknown:
+            raise RuntimeError(
+                f"Unknown {table}.status values {sorted(unknown)!r}: map them "
+                "in STATUS_SYNONYMS or fix the rows before upgrading"
+            )
+        cases = ' '.join(
+            f"WHEN '{legacy}' THEN '{status}'"
+            for legacy, status in STATUS_SYNONYMS.items()
+        )
+        op.execute(f"""
+            UPDATE {table}
+            SET status = CASE {normalized} {cases} END
+            WHERE status NOT IN ('pending', 'completed', 'in_progress')
+        """)
+        op.alter_column(table, 'status',
+                   existing_type=sqlmodel.sql.sqltypes.AutoString(length=255),
+                   type_=status_enum,
+                   existing_nullable=False,
+                   postgresql_using='status::statusenum')
+    # The counters were backfilled from the literal 'completed' only, recount
+    # them now that the synonyms are mapped
+    op.execute("""
+        UPDATE todo
+        SET subtodo_total = counts.total,
+            subtodo_completed = counts.completed
+        FROM (
+            SELECT todo_id,
+                   count(*) AS total,
+                   count(*) FILTER (WHERE status = 'completed') AS completed
+            FROM subtodo
+            GROUP BY todo_id
+        ) AS counts
+        WHERE todo.id = counts.todo_id
+    """)
+    op.create_index('ix_todo_owner_id_created_at_id_open', 'todo', ['owner_id', 'created_at', 'id'], unique=False, postgresql_where=sa.text("status <> 'completed'"))
+
+
+def downgrade():
+    op.drop_index('ix_todo_owner_id_created_at_id_open', table_name='todo', postgresql_where=sa.text("status <> 'completed'"))
+    for table in ('subtodo', 'todo'):
+        op.alter_column(table, 'status',
+                   existing_type=status_enum,
+                   type_=sqlmodel.sql.sqltypes.AutoString(length=255),
+                   existing_nullable=False,
+                   postgresql_using='status::text')
+    status_enum.drop(op.get_bind(), checkfirst=True)
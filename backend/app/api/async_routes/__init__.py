@@ -0,0 +1,3 @@
+from app.api.async_routes import items, login, sub_todo, todos, users
+
+__all__ = ["items", "login", "sub_todo", "todos", "users"]
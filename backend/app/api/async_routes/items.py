@@ -0,0 +1,115 @@
+import uuid
+from typing import Any
+
+from fastapi import APIRouter, HTTPException
+from sqlmodel import select
+
+from app.api.deps import AsyncCurrentUser, AsyncReadUser, AsyncSessionDep
+from app.api.pagination import CountMode, count_rows_async, paginate_async
+from app.models import Item, ItemCreate, ItemPublic, ItemsPublic, ItemUpdate, Message
+
+router = APIRouter(prefix="/items", tags=["items"])
+
+
+@router.get("/", response_model=ItemsPublic)
+async def read_items(
+    session: AsyncSessionDep,
+    current_user: AsyncReadUser,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    count_mode: CountMode = CountMode.exact,
+) -> Any:
+    """
+    Retrieve items.
+    """
+
+    statement = select(Item)
+    if not current_user.is_superuser:
+        statement = statement.where(Item.owner_id == current_user.id)
+    count = await count_rows_async(
+        session=session, statement=statement, mode=count_mode
+    )
+    page = await paginate_async(
+        session=session,
+        statement=statement,
+        model=Item,
+        skip=skip,
+        limit=limit,
+        cursor=cursor,
+    )
+
+    return ItemsPublic(
+        data=page.data,
+        count=count,
+        has_more=page.has_more,
+        next_cursor=page.next_cursor,
+    )
+
+
+async def _get_owned_item(
+    session: AsyncSessionDep, current_user: AsyncCurrentUser, id: uuid.UUID
+) -> Item:
+    item = await session.get(Item, id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    if not current_user.is_superuser and (item.owner_id != current_user.id):
+        raise HTTPException(status_code=400, detail="Not enough permissions")
+    return item
+
+
+@router.get("/{id}", response_model=ItemPublic)
+async def read_item(
+    session: AsyncSessionDep, current_user: AsyncReadUser, id: uuid.UUID
+) -> Any:
+    """
+    Get item by ID.
+    """
+    return await _get_owned_item(session, current_user, id)
+
+
+@router.post("/", response_model=ItemPublic)
+async def create_item(
+    *, session: AsyncSessionDep, current_user: AsyncCurrentUser, item_in: ItemCreate
+) -> Any:
+    """
+    Create new item.
+    """
+    item = Item.model_validate(item_in, update={"owner_id": current_user.id})
+    session.add(item)
+    await session.commit()
+    await session.refresh(item)
+    return item
+
+
+@router.put("/{id}", response_model=ItemPublic)
+async def update_item(
+    *,
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
+    id: uuid.UUID,
+    item_in: ItemUpdate,
+) -> Any:
+    """
+    Update an item.
+    """
+    item = await _get_owned_item(session, current_user, id)
+    update_dict = item_in.model_dump(exclude_unset=True)
+    item.sqlmodel_update(update_dict)
+    session.add(item)
+    await session.commit()
+    await session.refresh(item)
+    return item
+
+
+@router.delete("/{id}")
+async def delete_item(
+    session: AsyncSessionDep, current_user: AsyncCurrentUser, id: uuid.UUID
+) -> Message:
+    """
+    Delete an item.
+    """
+    item = await _get_owned_item(session, current_user, id)
+    await session.delete(item)
+    await session.commit()
+    return Message(message="Item deleted successfully")
@@ -0,0 +1,50 @@
+from datetime import timedelta
+from typing import Annotated, Any
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.security import OAuth2PasswordRequestForm
+
+from app import crud
+from app.api.deps import (
+    AsyncCurrentUserRecord,
+    AsyncSessionDep,
+    limit_login_attempts_async,
+)
+from app.core import security
+from app.core.config import settings
+from app.models import Token, UserPublic
+
+router = APIRouter(tags=["login"])
+
+
+@router.post("/login/access-token", dependencies=[Depends(limit_login_attempts_async)])
+async def login_access_token(
+    session: AsyncSessionDep,
+    form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
+) -> Token:
+    """
+    OAuth2 compatible token login, get an access token for future requests
+    """
+    user = await crud.authenticate_async(
+        session=session, email=form_data.username, password=form_data.password
+    )
+    if not user:
+        raise HTTPException(status_code=400, detail="Incorrect email or password")
+    elif not user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    return Token(
+        access_token=security.create_access_token(
+            user.id,
+            expires_delta=access_token_expires,
+            claims=security.user_claims(user),
+        )
+    )
+
+
+@router.post("/login/test-token", response_model=UserPublic)
+async def test_token(current_user: AsyncCurrentUserRecord) -> Any:
+    """
+    Test access token
+    """
+    return current_user
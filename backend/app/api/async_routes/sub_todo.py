@@ -0,0 +1,250 @@
+import uuid
+from datetime import datetime
+from typing import Any
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from sqlalchemy import select as sa_select
+from sqlmodel import col, select
+
+from app import crud
+from app.api.conditional import (
+    cached_response,
+    check_not_modified,
+    make_etag,
+    todos_version_statement,
+)
+from app.api.deps import AsyncCurrentUser, AsyncReadUser, AsyncSessionDep
+from app.core.events import notify_change_async
+from app.core.read_cache import CachedResponse, read_cache
+from app.models import (
+    ChangeAction,
+    Message,
+    StatusEnum,
+    SubTodo,
+    SubTodoCreate,
+    SubTodoPublic,
+    SubTodosPublic,
+    SubTodoUpdate,
+    Todo,
+    TodoChangeEvent,
+    TombstoneKind,
+)
+
+router = APIRouter(prefix="", tags=["subtodos"])
+
+
+@router.get("/todos/{todo_id}/subtodos", response_model=SubTodosPublic)
+async def read_subtodo(
+    session: AsyncSessionDep,
+    current_user: AsyncReadUser,
+    request: Request,
+    response: Response,
+    todo_id: uuid.UUID,
+) -> Any:
+    cached, token = await read_cache.get_async(
+        None if current_user.is_superuser else current_user.id, f"subtodos:{todo_id}"
+    )
+    if cached is not None:
+        return cached_response(request, response, cached)
+    todo = await session.get(Todo, todo_id)
+    if not todo:
+        raise HTTPException(status_code=404, detail="Todo not found")
+    if not current_user.is_superuser and (todo.owner_id != current_user.id):
+        raise HTTPException(status_code=400, detail="Not enough permissions")
+    version = (await session.exec(todos_version_statement(todo.owner_id))).one()
+    etag = make_etag("subtodos", todo_id, version)
+    not_modified = check_not_modified(
+        request,
+        response,
+        etag=etag,
+        last_modified=None,
+    )
+    if not_modified is not None:
+        return not_modified
+    statement = select(SubTodo).where(SubTodo.todo_id == todo_id)
+    subtodos = (await session.exec(statement)).all()
+    if not subtodos:
+        raise HTTPException(status_code=404, detail="Sub Task not found")
+    public = SubTodosPublic(count=len(subtodos), data=subtodos)
+    if token is not None:
+        cached = CachedResponse(
+            body=public.model_dump_json().encode(),
+            etag=etag,
+            last_modified=None,
+        )
+        await read_cache.set_async(
+            current_user.id, f"subtodos:{todo_id}", token, cached
+        )
+        return Response(
+            cached.body, media_type="application/json", headers=response.headers
+        )
+    return public
+
+
+@router.get("/todos/{todo_id}/subtodos/{id}", response_model=SubTodoPublic)
+async def read_sub_todo(
+    *,
+    session: AsyncSessionDep,
+    current_user: AsyncReadUser,
+    request: Request,
+    response: Response,
+    todo_id: uuid.UUID,
+    id: uuid.UUID,
+) -> Any:
+    """
+    Retrieve a specific sub todo by its ID and associated todo ID.
+    """
+    todo = await session.get(Todo, todo_id)
+    if not todo:
+        raise HTTPException(status_code=404, detail="Todo not found")
+    if not current_user.is_superuser and todo.owner_id != current_user.id:
+        raise HTTPException(
+            status_code=403, detail="Not enough permissions to access this Todo"
+        )
+    statement = select(SubTodo).where(SubTodo.todo_id == todo_id, SubTodo.id == id)
+    sub_todo = (await session.exec(statement)).first()
+    if not sub_todo:
+        raise HTTPException(status_code=404, detail="SubTodo not found")
+    not_modified = check_not_modified(
+        request,
+        response,
+        etag=make_etag("subtodo", sub_todo.id, sub_todo.updated_at),
+        last_modified=sub_todo.updated_at,
+    )
+    return sub_todo if not_modified is None else not_modified
+
+
+@router.post("/todos/{todo_id}/subtodos", response_model=SubTodoPublic)
+async def create_sub_todo(
+    *, session: AsyncSessionDep, todo_id: uuid.UUID, sub_todo_in: SubTodoCreate
+) -> Any:
+    """
+    Create new sub todo.
+    """
+    todo = await session.get(Todo, todo_id)
+    if not todo:
+        raise HTTPException(status_code=404, detail="Todo not found")
+    create_todo = SubTodo.model_validate(sub_todo_in, update={"todo_id": todo_id})
+    session.add(create_todo)
+    await crud.adjust_subtodo_counters_async(
+        session=session,
+        todo_id=todo_id,
+        total=1,
+        completed=int(create_todo.status == StatusEnum.completed),
+    )
+    await notify_change_async(
+        session=session,
+        event=TodoChangeEvent(
+            kind=TombstoneKind.subtodo,
+            action=ChangeAction.created,
+            owner_id=todo.owner_id,
+            object_id=create_todo.id,
+            todo_id=todo_id,
+        ),
+    )
+    await session.commit()
+    await session.refresh(create_todo)
+    return create_todo
+
+
+@router.put("/todos/{todo_id}/subtodos/{id}", response_model=SubTodoPublic)
+async def update_sub_todo(
+    *,
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
+    todo_id: uuid.UUID,
+    id: uuid.UUID,
+    sub_todo_in: SubTodoUpdate,
+) -> Any:
+    """
+    Update a sub todo by ID.
+    """
+    # Locked so that concurrent status changes see each other's result
+    sub_todo = await session.get(
+        SubTodo, id, with_for_update=True, populate_existing=True
+    )
+    if not sub_todo or sub_todo.todo_id != todo_id:
+        raise HTTPException(status_code=404, detail="SubTodo not found")
+    parent_todo = await session.get(Todo, sub_todo.todo_id)
+    if not parent_todo:
+        raise HTTPException(status_code=404, detail="Parent Todo not found")
+    if not current_user.is_superuser and (parent_todo.owner_id != current_user.id):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    update_data = sub_todo_in.model_dump(exclude_unset=True)
+    was_completed = sub_todo.status == StatusEnum.completed
+    sub_todo.sqlmodel_update(update_data, update={"updated_at": datetime.now()})
+    session.add(sub_todo)
+    is_completed = sub_todo.status == StatusEnum.completed
+    if is_completed != was_completed:
+        await crud.adjust_subtodo_counters_async(
+            session=session,
+            todo_id=sub_todo.todo_id,
+            completed=1 if is_completed else -1,
+        )
+    await notify_change_async(
+        session=session,
+        event=TodoChangeEvent(
+            kind=TombstoneKind.subtodo,
+            action=ChangeAction.updated,
+            owner_id=parent_todo.owner_id,
+            object_id=sub_todo.id,
+            todo_id=sub_todo.todo_id,
+        ),
+    )
+    await session.commit()
+    await session.refresh(sub_todo)
+    return sub_todo
+
+
+@router.delete("/todos/{todo_id}/subtodos/{id}")
+async def delete_sub_todo(
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
+    todo_id: uuid.UUID,
+    id: uuid.UUID,
+) -> Message:
+    """
+    Delete a sub todo.
+    """
+    todo = await session.get(Todo, todo_id)
+    if not todo:
+        raise HTTPException(status_code=404, detail="Todo not found")
+    if not current_user.is_superuser and todo.owner_id != current_user.id:
+        raise HTTPException(
+            status_code=403, detail="Not enough permissions to access this Todo"
+        )
+    statement = (
+        select(SubTodo)
+        .where(SubTodo.todo_id == todo_id, SubTodo.id == id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    sub_todo = (await session.exec(statement)).first()
+    if not sub_todo:
+        raise HTTPException(status_code=404, detail="SubTodo not found")
+    await crud.create_tombstones_async(
+        session=session,
+        kind=TombstoneKind.subtodo,
+        statement=sa_select(col(Todo.owner_id), col(SubTodo.id), col(SubTodo.todo_id))
+        .join(Todo)
+        .where(col(SubTodo.id) == id),
+    )
+    await session.delete(sub_todo)
+    await crud.adjust_subtodo_counters_async(
+        session=session,
+        todo_id=todo_id,
+        total=-1,
+        completed=-int(sub_todo.status == StatusEnum.completed),
+    )
+    await notify_change_async(
+        session=session,
+        event=TodoChangeEvent(
+            kind=TombstoneKind.subtodo,
+            action=ChangeAction.deleted,
+            owner_id=todo.owner_id,
+            object_id=id,
+            todo_id=todo_id,
+        ),
+    )
+    await session.commit()
+    return Message(message="SubTodo deleted successfully")
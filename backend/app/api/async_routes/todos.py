@@ -0,0 +1,240 @@
+import uuid
+from datetime import datetime
+from typing import Annotated, Any
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from sqlalchemy import null
+from sqlalchemy import select as sa_select
+from sqlmodel import col
+
+from app import crud
+from app.api.conditional import (
+    cached_response,
+    check_not_modified,
+    make_etag,
+    todos_version_statement,
+)
+from app.api.deps import AsyncCurrentUser, AsyncReadUser, AsyncSessionDep
+from app.api.pagination import (
+    CountMode,
+    count_rows_async,
+    page_response,
+    paginate_async,
+    paginate_rows_async,
+)
+from app.api.routes.todos import (
+    TODO_PUBLIC_COLUMNS,
+    _filter_todos,
+    _visible_owner_id,
+)
+from app.api.search import SearchMode
+from app.core.config import settings
+from app.core.events import notify_change_async
+from app.core.read_cache import CachedResponse, read_cache
+from app.models import (
+    ChangeAction,
+    Message,
+    StatusEnum,
+    Todo,
+    TodoChangeEvent,
+    TodoCreate,
+    TodoPublic,
+    TodosPublic,
+    TodoUpdate,
+    TombstoneKind,
+)
+
+router = APIRouter(prefix="/todos", tags=["todos"])
+
+
+@router.get("/", response_model=TodosPublic)
+async def read_todos(
+    session: AsyncSessionDep,
+    current_user: AsyncReadUser,
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    search: str | None = None,
+    search_mode: SearchMode = SearchMode.fulltext,
+    status: Annotated[list[StatusEnum] | None, Query()] = None,
+    cursor: str | None = None,
+    count_mode: CountMode = CountMode.exact,
+) -> Any:
+    """
+    Retrieve todos.
+
+    Pass the returned `next_cursor` back as `cursor` to fetch the next page
+    without the cost of skipping rows. Search results are ordered by
+    relevance and paged with `skip`.
+
+    A user's own list carries an ETag, which changes with any change to
+    their todos, and is answered with a 304 while it matches If-None-Match.
+    """
+
+    owner_id = _visible_owner_id(current_user)
+    statement, rank = _filter_todos(owner_id, search, search_mode, status)
+    if owner_id is not None:
+        version = (await session.exec(todos_version_statement(owner_id))).one()
+        not_modified = check_not_modified(
+            request,
+            response,
+            etag=make_etag("todos", owner_id, version, request.url.query),
+            last_modified=None,
+        )
+        if not_modified is not None:
+            return not_modified
+    count = await count_rows_async(
+        session=session, statement=statement, mode=count_mode
+    )
+    if settings.FAST_LIST_RESPONSES:
+        rows = await paginate_rows_async(
+            session=session,
+            statement=statement,
+            model=Todo,
+            columns=TODO_PUBLIC_COLUMNS,
+            skip=skip,
+            limit=limit,
+            cursor=cursor,
+            rank=rank,
+        )
+        return page_response(rows, count, headers=response.headers)
+    page = await paginate_async(
+        session=session,
+        statement=statement,
+        model=Todo,
+        skip=skip,
+        limit=limit,
+        cursor=cursor,
+        rank=rank,
+    )
+    return TodosPublic(
+        data=page.data,
+        count=count,
+        has_more=page.has_more,
+        next_cursor=page.next_cursor,
+    )
+
+
+async def _get_owned_todo(
+    session: AsyncSessionDep, current_user: AsyncCurrentUser, id: uuid.UUID
+) -> Todo:
+    todo = await session.get(Todo, id)
+    if not todo:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if not current_user.is_superuser and (todo.owner_id != current_user.id):
+        raise HTTPException(status_code=400, detail="Not enough permissions")
+    return todo
+
+
+@router.get("/{id}", response_model=TodoPublic)
+async def read_todo(
+    session: AsyncSessionDep,
+    current_user: AsyncReadUser,
+    request: Request,
+    response: Response,
+    id: uuid.UUID,
+) -> Any:
+    """
+    Get todo by ID.
+    """
+    cached, token = await read_cache.get_async(
+        None if current_user.is_superuser else current_user.id, f"todo:{id}"
+    )
+    if cached is not None:
+        return cached_response(request, response, cached)
+    todo = await _get_owned_todo(session, current_user, id)
+    etag = make_etag("todo", todo.id, todo.updated_at)
+    if token is not None:
+        cached = CachedResponse(
+            body=TodoPublic.model_validate(todo).model_dump_json().encode(),
+            etag=etag,
+            last_modified=todo.updated_at,
+        )
+        await read_cache.set_async(current_user.id, f"todo:{id}", token, cached)
+        return cached_response(request, response, cached)
+    not_modified = check_not_modified(
+        request, response, etag=etag, last_modified=todo.updated_at
+    )
+    return todo if not_modified is None else not_modified
+
+
+@router.post("/", response_model=TodoPublic)
+async def create_todo(
+    *, session: AsyncSessionDep, current_user: AsyncCurrentUser, todo_in: TodoCreate
+) -> Any:
+    """
+    Create new todo.
+    """
+    todo = Todo.model_validate(todo_in, update={"owner_id": current_user.id})
+    session.add(todo)
+    await notify_change_async(
+        session=session,
+        event=TodoChangeEvent(
+            kind=TombstoneKind.todo,
+            action=ChangeAction.created,
+            owner_id=current_user.id,
+            object_id=todo.id,
+        ),
+    )
+    await session.commit()
+    await session.refresh(todo)
+    return todo
+
+
+@router.put("/{id}", response_model=TodoPublic)
+async def update_todo(
+    *,
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
+    id: uuid.UUID,
+    todo_in: TodoUpdate,
+) -> Any:
+    """
+    Update an item.
+    """
+    todo = await _get_owned_todo(session, current_user, id)
+    update_dict = todo_in.model_dump(exclude_unset=True)
+    todo.sqlmodel_update(update_dict, update={"updated_at": datetime.now()})
+    session.add(todo)
+    await notify_change_async(
+        session=session,
+        event=TodoChangeEvent(
+            kind=TombstoneKind.todo,
+            action=ChangeAction.updated,
+            owner_id=todo.owner_id,
+            object_id=todo.id,
+        ),
+    )
+    await session.commit()
+    await session.refresh(todo)
+    return todo
+
+
+@router.delete("/{id}")
+async def delete_item(
+    session: AsyncSessionDep, current_user: AsyncCurrentUser, id: uuid.UUID
+) -> Message:
+    """
+    Delete a todo.
+    """
+    todo = await _get_owned_todo(session, current_user, id)
+    await crud.create_tombstones_async(
+        session=session,
+        kind=TombstoneKind.todo,
+        statement=sa_select(
+            col(Todo.owner_id), col(Todo.id), null().label("todo_id")
+        ).where(col(Todo.id) == id),
+    )
+    await session.delete(todo)
+    await notify_change_async(
+        session=session,
+        event=TodoChangeEvent(
+            kind=TombstoneKind.todo,
+            action=ChangeAction.deleted,
+            owner_id=todo.owner_id,
+            object_id=todo.id,
+        ),
+    )
+    await session.commit()
+    return Message(message="Task deleted successfully")
@@ -0,0 +1,280 @@
+import uuid
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlmodel import col, delete, select
+
+from app import crud
+from app.api.deps import (
+    AsyncCurrentUser,
+    AsyncCurrentUserRecord,
+    AsyncSessionDep,
+    get_current_active_superuser_async,
+    invalidate_auth_user,
+)
+from app.api.pagination import CountMode, count_rows_async, paginate_async
+from app.core.config import settings
+from app.core.events import notify_user_change_async
+from app.core.outbox import enqueue_email_async
+from app.core.security import get_password_hash_async, verify_password_async
+from app.models import (
+    Item,
+    Message,
+    UpdatePassword,
+    User,
+    UserCreate,
+    UserPublic,
+    UserRegister,
+    UsersPublic,
+    UserUpdate,
+    UserUpdateMe,
+)
+from app.utils import generate_new_account_email
+
+router = APIRouter(prefix="/users", tags=["users"])
+
+
+@router.get(
+    "/",
+    dependencies=[Depends(get_current_active_superuser_async)],
+    response_model=UsersPublic,
+)
+async def read_users(
+    session: AsyncSessionDep,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    count_mode: CountMode = CountMode.exact,
+) -> Any:
+    """
+    Retrieve users.
+    """
+
+    statement = select(User)
+    count = await count_rows_async(
+        session=session, statement=statement, mode=count_mode
+    )
+
+    page = await paginate_async(
+        session=session,
+        statement=statement,
+        model=User,
+        skip=skip,
+        limit=limit,
+        cursor=cursor,
+    )
+
+    return UsersPublic(
+        data=page.data,
+        count=count,
+        has_more=page.has_more,
+        next_cursor=page.next_cursor,
+    )
+
+
+@router.post(
+    "/",
+    dependencies=[Depends(get_current_active_superuser_async)],
+    response_model=UserPublic,
+)
+async def create_user(*, session: AsyncSessionDep, user_in: UserCreate) -> Any:
+    """
+    Create new user.
+    """
+    user = await crud.get_user_by_email_async(session=session, email=user_in.email)
+    if user:
+        raise HTTPException(
+            status_code=400,
+            detail="The user with this email already exists in the system.",
+        )
+
+    user = await crud.create_user_async(session=session, user_create=user_in)
+    if settings.emails_enabled and user_in.email:
+        email_data = generate_new_account_email(
+            email_to=user_in.email, username=user_in.email, password=user_in.password
+        )
+        await enqueue_email_async(
+            session=session,
+            email_to=user_in.email,
+            subject=email_data.subject,
+            html_content=email_data.html_content,
+        )
+        await session.commit()
+    return user
+
+
+@router.patch("/me", response_model=UserPublic)
+async def update_user_me(
+    *,
+    session: AsyncSessionDep,
+    user_in: UserUpdateMe,
+    current_user: AsyncCurrentUserRecord,
+) -> Any:
+    """
+    Update own user.
+    """
+
+    if user_in.email:
+        existing_user = await crud.get_user_by_email_async(
+            session=session, email=user_in.email
+        )
+        if existing_user and existing_user.id != current_user.id:
+            raise HTTPException(
+                status_code=409, detail="User with this email already exists"
+            )
+    user_data = user_in.model_dump(exclude_unset=True)
+    current_user.sqlmodel_update(user_data)
+    session.add(current_user)
+    await notify_user_change_async(session=session, user_id=current_user.id)
+    await session.commit()
+    invalidate_auth_user(current_user.id)
+    await session.refresh(current_user)
+    return current_user
+
+
+@router.patch("/me/password", response_model=Message)
+async def update_password_me(
+    *,
+    session: AsyncSessionDep,
+    body: UpdatePassword,
+    current_user: AsyncCurrentUserRecord,
+) -> Any:
+    """
+    Update own password.
+    """
+    if not await verify_password_async(
+        body.current_password, current_user.hashed_password
+    ):
+        raise HTTPException(status_code=400, detail="Incorrect password")
+    if body.current_password == body.new_password:
+        raise HTTPException(
+            status_code=400, detail="New password cannot be the same as the current one"
+        )
+    hashed_password = await get_password_hash_async(body.new_password)
+    current_user.hashed_password = hashed_password
+    session.add(current_user)
+    await session.commit()
+    return Message(message="Password updated successfully")
+
+
+@router.get("/me", response_model=UserPublic)
+async def read_user_me(current_user: AsyncCurrentUserRecord) -> Any:
+    """
+    Get current user.
+    """
+    return current_user
+
+
+@router.delete("/me", response_model=Message)
+async def delete_user_me(
+    session: AsyncSessionDep, current_user: AsyncCurrentUserRecord
+) -> Any:
+    """
+    Delete own user.
+    """
+    if current_user.is_superuser:
+        raise HTTPException(
+            status_code=403, detail="Super users are not allowed to delete themselves"
+        )
+    statement = delete(Item).where(col(Item.owner_id) == current_user.id)
+    await session.exec(statement)  # type: ignore
+    await session.delete(current_user)
+    await notify_user_change_async(session=session, user_id=current_user.id)
+    await session.commit()
+    invalidate_auth_user(current_user.id)
+    return Message(message="User deleted successfully")
+
+
+@router.post("/signup", response_model=UserPublic)
+async def register_user(session: AsyncSessionDep, user_in: UserRegister) -> Any:
+    """
+    Create new user without the need to be logged in.
+    """
+    user = await crud.get_user_by_email_async(session=session, email=user_in.email)
+    if user:
+        raise HTTPException(
+            status_code=400,
+            detail="The user with this email already exists in the system",
+        )
+    user_create = UserCreate.model_validate(user_in)
+    user = await crud.create_user_async(session=session, user_create=user_create)
+    return user
+
+
+@router.get("/{user_id}", response_model=UserPublic)
+async def read_user_by_id(
+    user_id: uuid.UUID, session: AsyncSessionDep, current_user: AsyncCurrentUser
+) -> Any:
+    """
+    Get a specific user by id.
+    """
+    user = await session.get(User, user_id)
+    if user_id == current_user.id:
+        return user
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=403,
+            detail="The user doesn't have enough privileges",
+        )
+    return user
+
+
+@router.patch(
+    "/{user_id}",
+    dependencies=[Depends(get_current_active_superuser_async)],
+    response_model=UserPublic,
+)
+async def update_user(
+    *,
+    session: AsyncSessionDep,
+    user_id: uuid.UUID,
+    user_in: UserUpdate,
+) -> Any:
+    """
+    Update a user.
+    """
+
+    db_user = await session.get(User, user_id)
+    if not db_user:
+        raise HTTPException(
+            status_code=404,
+            detail="The user with this id does not exist in the system",
+        )
+    if user_in.email:
+        existing_user = await crud.get_user_by_email_async(
+            session=session, email=user_in.email
+        )
+        if existing_user and existing_user.id != user_id:
+            raise HTTPException(
+                status_code=409, detail="User with this email already exists"
+            )
+
+    await notify_user_change_async(session=session, user_id=user_id)
+    db_user = await crud.update_user_async(
+        session=session, db_user=db_user, user_in=user_in
+    )
+    invalidate_auth_user(user_id)
+    return db_user
+
+
+@router.delete("/{user_id}", dependencies=[Depends(get_current_active_superuser_async)])
+async def delete_user(
+    session: AsyncSessionDep, current_user: AsyncCurrentUser, user_id: uuid.UUID
+) -> Message:
+    """
+    Delete a user.
+    """
+    user = await session.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    if user.id == current_user.id:
+        raise HTTPException(
+            status_code=403, detail="Super users are not allowed to delete themselves"
+        )
+    statement = delete(Item).where(col(Item.owner_id) == user_id)
+    await session.exec(statement)  # type: ignore
+    await session.delete(user)
+    await notify_user_change_async(session=session, user_id=user_id)
+    await session.commit()
+    invalidate_auth_user(user_id)
+    return Message(message="User deleted successfully")
@@ -0,0 +1,103 @@
+"""
+Conditional GETs: ETag and Last-Modified validators, answered with a 304 when
+the client's copy is still current.
+"""
+
+import hashlib
+import uuid
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response
+from sqlmodel import col, select
+from sqlmodel.sql.expression import SelectOfScalar
+
+from app.core.read_cache import CachedResponse
+from app.models import User
+
+# Clients may keep the responses but have to revalidate them before use
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts: object) -> str:
+    """
+    Build a strong ETag from the values a representation is derived from.
+    """
+    key = "|".join(str(part) for part in parts)
+    return f'"{hashlib.blake2b(key.encode(), digest_size=16).hexdigest()}"'
+
+
+def todos_version_statement(owner_id: uuid.UUID) -> SelectOfScalar[int]:
+    """
+    Version of the todos and subtodos of `owner_id`, which every commit
+    changing them bumps. The list ETags hash it; the lists have no
+    Last-Modified, since their updated_at stamps don't change in commit order
+    and can share a second with the client's last fetch.
+    """
+    return select(col(User.todos_version)).where(col(User.id) == owner_id)
+
+
+def _http_date(value: datetime) -> str:
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, compressed responses carry the weak form of the ETag
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in tags
+
+
+def _not_modified_since(if_modified_since: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified.astimezone(timezone.utc).replace(microsecond=0) <= since
+
+
+def check_not_modified(
+    request: Request,
+    response: Response,
+    *,
+    etag: str,
+    last_modified: datetime | None,
+) -> Response | None:
+    """
+    Put the validators on `response` and return a 304 response when the
+    request's If-None-Match, or else If-Modified-Since, still matches.
+    """
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = _http_date(last_modified)
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, etag)
+    elif if_modified_since is not None and last_modified is not None:
+        not_modified = _not_modified_since(if_modified_since, last_modified)
+    else:
+        not_modified = False
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+def cached_response(
+    request: Request, response: Response, cached: CachedResponse
+) -> Response:
+    """
+    Answer with a cached body, or a 304 when the client's copy still matches.
+    """
+    not_modified = check_not_modified(
+        request, response, etag=cached.etag, last_modified=cached.last_modified
+    )
+    if not_modified is not None:
+        return not_modified
+    return Response(
+        cached.body, media_type="application/json", headers=response.headers
+    )
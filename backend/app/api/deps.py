@@ -1,44 +1,145 @@
-from collections.abc import Generator
-from typing import Annotated
+import math
+import uuid
+from collections.abc import AsyncGenerator, Generator
+from contextlib import suppress
+from ipaddress import ip_address, ip_network
+from typing import Annotated, Any
 
 import jwt
-from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
-from sqlmodel import Session
+from sqlalchemy import exc
+from sqlmodel import Session, col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core import security
+from app.core.cache import TTLCache
 from app.core.config import settings
-from app.core.db import engine
-from app.models import TokenPayload, User
+from app.core.db import (
+    LAST_WRITE_COOKIE,
+    REQUEST_STATE,
+    async_engine,
+    engine,
+    replicas,
+    wrote_recently,
+)
+from app.core.ratelimit import take_login_attempt, take_login_attempt_async
+from app.models import AuthUser, TokenPayload, User
 
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/login/access-token"
 )
 
 
-def get_db() -> Generator[Session, None, None]:
+def get_db(request: Request) -> Generator[Session, None, None]:
     with Session(engine) as session:
+        # Lets commits set the last_write cookie of the response
+        session.info[REQUEST_STATE] = request.scope.setdefault("state", {})
+        yield session
+
+
+async def get_async_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    # Attributes can't be lazy loaded on an async session, keep them loaded
+    # after commit
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        session.info[REQUEST_STATE] = request.scope.setdefault("state", {})
         yield session
 
 
 SessionDep = Annotated[Session, Depends(get_db)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_db)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
+LoginFormDep = Annotated[OAuth2PasswordRequestForm, Depends()]
+
+
+def _is_trusted_proxy(host: str) -> bool:
+    if "*" in settings.FORWARDED_ALLOW_IPS or host in settings.FORWARDED_ALLOW_IPS:
+        return True
+    try:
+        address = ip_address(host)
+    except ValueError:
+        return False
+    networks = []
+    for network in settings.FORWARDED_ALLOW_IPS:
+        # Anything else, such as a unix socket path, only matches as is
+        with suppress(ValueError):
+            networks.append(ip_network(network, strict=False))
+    return any(address in network for network in networks)
+
+
+def _client_ip(request: Request) -> str | None:
+    """
+    Address of the client, read from X-Forwarded-For when the request came
+    through trusted proxies.
+    """
+    if not request.client:
+        return None
+    host = request.client.host
+    hops = [
+        hop.strip()
+        for header in request.headers.getlist("x-forwarded-for")
+        for hop in header.split(",")
+    ]
+    # Each proxy appends the address it got the request from, the client is
+    # the first one from the right not added by a trusted proxy
+    for hop in reversed(hops):
+        if not _is_trusted_proxy(host):
+            break
+        host = hop
+    return host
+
+
+def _check_retry_after(retry_after: float) -> None:
+    if retry_after:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many login attempts, try again later",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+
+def limit_login_attempts(request: Request, form_data: LoginFormDep) -> None:
+    """
+    Reject logins over the per email or per IP budget before any hashing.
+    """
+    if not settings.LOGIN_RATE_LIMIT:
+        return
+    with engine.begin() as connection:
+        retry_after = take_login_attempt(
+            connection, email=form_data.username, ip=_client_ip(request)
+        )
+    _check_retry_after(retry_after)
+
+
+async def limit_login_attempts_async(request: Request, form_data: LoginFormDep) -> None:
+    if not settings.LOGIN_RATE_LIMIT:
+        return
+    async with async_engine.begin() as connection:
+        retry_after = await take_login_attempt_async(
+            connection, email=form_data.username, ip=_client_ip(request)
+        )
+    _check_retry_after(retry_after)
 
 
-def get_current_user(session: SessionDep, token: TokenDep) -> User:
+def _token_payload(token: str) -> tuple[str, TokenPayload]:
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
         )
         token_data = TokenPayload(**payload)
     except (InvalidTokenError, ValidationError):
+        token_data = TokenPayload()
+    if token_data.sub is None:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user = session.get(User, token_data.sub)
+    return token_data.sub, token_data
+
+
+def _check_user(user: User | None) -> User:
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if not user.is_active:
@@ -46,12 +147,176 @@ def get_current_user(session: SessionDep, token: TokenDep) -> User:
     return user
 
 
-CurrentUser = Annotated[User, Depends(get_current_user)]
+auth_cache: TTLCache[str, AuthUser] = TTLCache(
+    name="auth_user",
+    maxsize=settings.AUTH_CACHE_MAX_ENTRIES,
+    ttl=settings.AUTH_CACHE_TTL_SECONDS,
+)
+
+
+token_revocations = security.TokenRevocations(settings.TOKEN_REVOCATION_REFRESH_SECONDS)
+
+
+def invalidate_auth_user(user_id: uuid.UUID) -> None:
+    """
+    Drop a user from the auth cache and revoke their token claims, after
+    changing or deleting them.
+    """
+    auth_cache.pop(str(user_id))
+    token_revocations.revoke(user_id)
+
+
+def _cache_auth_user(user: User | None) -> AuthUser:
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    auth_user = AuthUser.model_validate(user)
+    auth_cache.set(str(user.id), auth_user)
+    return auth_user
+
+
+def _check_auth_user(session: Session | AsyncSession, auth_user: AuthUser) -> AuthUser:
+    if not auth_user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    # Lets commits on this session mark the user as a recent writer
+    session.info["user_id"] = auth_user.id
+    return auth_user
+
+
+def _load_auth_user(session: Session, sub: str) -> AuthUser:
+    return auth_cache.get(sub) or _cache_auth_user(session.get(User, sub))
+
+
+async def _load_auth_user_async(session: AsyncSession, sub: str) -> AuthUser:
+    return auth_cache.get(sub) or _cache_auth_user(await session.get(User, sub))
+
+
+def get_current_user(session: SessionDep, token: TokenDep) -> AuthUser:
+    sub, _ = _token_payload(token)
+    return _check_auth_user(session, _load_auth_user(session, sub))
+
+
+async def get_current_user_async(session: AsyncSessionDep, token: TokenDep) -> AuthUser:
+    sub, _ = _token_payload(token)
+    return _check_auth_user(session, await _load_auth_user_async(session, sub))
+
+
+CurrentUser = Annotated[AuthUser, Depends(get_current_user)]
+AsyncCurrentUser = Annotated[AuthUser, Depends(get_current_user_async)]
+
+
+def _claims_user(sub: str, payload: TokenPayload) -> AuthUser | None:
+    if (
+        payload.is_active is None
+        or payload.is_superuser is None
+        or payload.token_version is None
+    ):
+        return None
+    user_id = uuid.UUID(sub)
+    if token_revocations.is_revoked(user_id, payload.token_version):
+        return None
+    return AuthUser(
+        id=user_id, is_active=payload.is_active, is_superuser=payload.is_superuser
+    )
+
+
+def _user_versions_statement(user_ids: list[uuid.UUID]) -> Any:
+    return select(User.id, User.token_version).where(col(User.id).in_(user_ids))
+
+
+def get_read_user(session: SessionDep, token: TokenDep) -> AuthUser:
+    """
+    Current user for read-only routes.
+
+    With settings.AUTH_TOKEN_CLAIMS the user is authorized from the claims of
+    a token that isn't revoked, without loading them.
+    """
+    sub, payload = _token_payload(token)
+    if not settings.AUTH_TOKEN_CLAIMS:
+        return _check_auth_user(session, _load_auth_user(session, sub))
+    if user_ids := token_revocations.due():
+        rows = session.exec(_user_versions_statement(user_ids)).all()
+        token_revocations.update(user_ids, dict(rows))
+    auth_user = _claims_user(sub, payload) or _load_auth_user(session, sub)
+    return _check_auth_user(session, auth_user)
+
 
+async def get_read_user_async(session: AsyncSessionDep, token: TokenDep) -> AuthUser:
+    sub, payload = _token_payload(token)
+    if not settings.AUTH_TOKEN_CLAIMS:
+        return _check_auth_user(session, await _load_auth_user_async(session, sub))
+    if user_ids := token_revocations.due():
+        rows = (await session.exec(_user_versions_statement(user_ids))).all()
+        token_revocations.update(user_ids, dict(rows))
+    auth_user = _claims_user(sub, payload) or await _load_auth_user_async(session, sub)
+    return _check_auth_user(session, auth_user)
 
-def get_current_active_superuser(current_user: CurrentUser) -> User:
+
+ReadUser = Annotated[AuthUser, Depends(get_read_user)]
+AsyncReadUser = Annotated[AuthUser, Depends(get_read_user_async)]
+
+
+def get_current_user_record(session: SessionDep, current_user: CurrentUser) -> User:
+    """
+    Load the whole current user, for the routes that need more than the
+    cached fields.
+    """
+    return _check_user(session.get(User, current_user.id))
+
+
+async def get_current_user_record_async(
+    session: AsyncSessionDep, current_user: AsyncCurrentUser
+) -> User:
+    return _check_user(await session.get(User, current_user.id))
+
+
+CurrentUserRecord = Annotated[User, Depends(get_current_user_record)]
+AsyncCurrentUserRecord = Annotated[User, Depends(get_current_user_record_async)]
+
+
+def get_read_db(
+    session: SessionDep, current_user: ReadUser, request: Request
+) -> Generator[Session, None, None]:
+    """
+    Session for read-only routes.
+
+    Reads go to the next healthy replica, or to the primary when there is
+    none or the user wrote recently, so they always see their own writes.
+    The primary session is the one of the request, so a request never holds
+    two primary connections.
+
+    Writes served by other workers are only known from the last_write
+    cookie. Clients that don't send it back, such as a cross-origin frontend
+    without credentials, may read from a lagging replica after a write that
+    another worker served.
+    """
+    last_write = request.cookies.get(LAST_WRITE_COOKIE)
+    if not wrote_recently(current_user.id, last_write):
+        for replica in replicas.candidates():
+            replica_session = Session(replica)
+            try:
+                replica_session.connection()
+            except exc.OperationalError:
+                replica_session.close()
+                replicas.mark_down(replica)
+                continue
+            with replica_session:
+                yield replica_session
+            return
+    yield session
+
+
+ReadSessionDep = Annotated[Session, Depends(get_read_db)]
+
+
+def get_current_active_superuser(current_user: CurrentUser) -> AuthUser:
     if not current_user.is_superuser:
         raise HTTPException(
             status_code=403, detail="The user doesn't have enough privileges"
         )
     return current_user
+
+
+async def get_current_active_superuser_async(
+    current_user: AsyncCurrentUser,
+) -> AuthUser:
+    return get_current_active_superuser(current_user)
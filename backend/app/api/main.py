@@ -1,16 +1,49 @@
 from fastapi import APIRouter
+from fastapi.routing import APIRoute
 
-from app.api.routes import items, login, private, todos, users, utils, sub_todo
+from app.api import async_routes
+from app.api.routes import items, login, private, sub_todo, todos, users, utils
 from app.core.config import settings
 
-api_router = APIRouter()
-api_router.include_router(login.router)
-api_router.include_router(users.router)
-api_router.include_router(utils.router)
-api_router.include_router(items.router)
-api_router.include_router(todos.router)
-api_router.include_router(sub_todo.router)
 
+def with_async_routes(router: APIRouter, async_router: APIRouter) -> APIRouter:
+    """
+    Swap the routes of `router` for their async versions in `async_router`.
 
-if settings.ENVIRONMENT == "local":
-    api_router.include_router(private.router)
+    Routes keep their position, so static paths such as `/todos/stats` still
+    win over `/todos/{id}`; routes without an async version stay sync.
+    """
+    replacements = {
+        (route.path, frozenset(route.methods)): route
+        for route in async_router.routes
+        if isinstance(route, APIRoute)
+    }
+    combined = APIRouter()
+    for route in router.routes:
+        if isinstance(route, APIRoute):
+            route = replacements.get((route.path, frozenset(route.methods)), route)
+        combined.routes.append(route)
+    return combined
+
+
+def build_api_router(*, async_db: bool) -> APIRouter:
+    routers = [
+        (login.router, async_routes.login.router),
+        (users.router, async_routes.users.router),
+        (utils.router, None),
+        (items.router, async_routes.items.router),
+        (todos.router, async_routes.todos.router),
+        (sub_todo.router, async_routes.sub_todo.router),
+    ]
+    api_router = APIRouter()
+    for router, async_router in routers:
+        if async_db and async_router is not None:
+            router = with_async_routes(router, async_router)
+        api_router.include_router(router)
+
+    if settings.ENVIRONMENT == "local":
+        api_router.include_router(private.router)
+    return api_router
+
+
+api_router = build_api_router(async_db=settings.ASYNC_DB)
@@ -0,0 +1,305 @@
+import base64
+import binascii
+import json
+import uuid
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+from typing import Any, Generic, TypeVar
+
+import orjson
+from fastapi import HTTPException, Response
+from sqlalchemy import ColumnElement, and_, literal, or_, tuple_
+from sqlalchemy.engine import Dialect
+from sqlmodel import Session, col, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel.sql.expression import SelectOfScalar
+
+from app.core.config import settings
+from app.models import Item, Todo, User
+
+ModelT = TypeVar("ModelT", Todo, Item, User)
+
+
+class CountMode(str, Enum):
+    exact = "exact"
+    estimated = "estimated"
+    none = "none"
+
+
+def encode_cursor(created_at: datetime | None, id: uuid.UUID) -> str:
+    """
+    Build an opaque cursor pointing right after the row (created_at, id).
+    """
+    key = [created_at.isoformat() if created_at else None, str(id)]
+    raw = json.dumps(key, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime | None, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, id = json.loads(raw)
+        return (
+            datetime.fromisoformat(created_at) if created_at else None,
+            uuid.UUID(id),
+        )
+    except (binascii.Error, ValueError, TypeError, AttributeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@dataclass
+class Page(Generic[ModelT]):
+    data: Sequence[ModelT]
+    has_more: bool
+    next_cursor: str | None = None
+
+
+def _page_statement(
+    *,
+    statement: SelectOfScalar[ModelT],
+    model: type[ModelT],
+    skip: int,
+    limit: int,
+    cursor: str | None,
+    rank: ColumnElement[Any] | None,
+) -> tuple[SelectOfScalar[ModelT], ColumnElement[Any] | None]:
+    created_at, id = col(model.created_at), col(model.id)
+    # DESC sorts NULLs first in Postgres, matching a backward scan of the
+    # (created_at, id) indexes
+    statement = statement.order_by(created_at.desc(), id.desc())
+    if cursor:
+        last_created_at, last_id = decode_cursor(cursor)
+        if last_created_at is None:
+            statement = statement.where(
+                or_(
+                    and_(created_at.is_(None), id < last_id),
+                    created_at.is_not(None),
+                )
+            )
+        else:
+            statement = statement.where(
+                tuple_(created_at, id)
+                < tuple_(literal(last_created_at), literal(last_id))
+            )
+        rank = None
+    else:
+        if rank is not None:
+            statement = statement.order_by(None).order_by(
+                rank.desc(), created_at.desc(), id.desc()
+            )
+        statement = statement.offset(skip)
+    return statement.limit(limit + 1), rank
+
+
+def _make_page(
+    rows: Sequence[Any], limit: int, rank: ColumnElement[Any] | None
+) -> Page[Any]:
+    page = rows[:limit]
+    has_more = len(rows) > limit
+    next_cursor = None
+    if has_more and page and rank is None:
+        next_cursor = encode_cursor(page[-1].created_at, page[-1].id)
+    return Page(data=page, has_more=has_more, next_cursor=next_cursor)
+
+
+def paginate(
+    *,
+    session: Session,
+    statement: SelectOfScalar[ModelT],
+    model: type[ModelT],
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    rank: ColumnElement[Any] | None = None,
+) -> Page[ModelT]:
+    """
+    Fetch one page of `statement` ordered by (created_at, id), newest first.
+
+    With a `cursor` the page is located with a keyset predicate, so any page
+    costs the same index range scan; without one it falls back to `skip`.
+    The returned cursor is set only when another page exists.
+
+    A `rank` expression, such as a search relevance, takes precedence over
+    recency for offset pages; those pages don't hand out a cursor.
+    """
+    statement, rank = _page_statement(
+        statement=statement,
+        model=model,
+        skip=skip,
+        limit=limit,
+        cursor=cursor,
+        rank=rank,
+    )
+    return _make_page(session.exec(statement).all(), limit, rank)
+
+
+async def paginate_async(
+    *,
+    session: AsyncSession,
+    statement: SelectOfScalar[ModelT],
+    model: type[ModelT],
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    rank: ColumnElement[Any] | None = None,
+) -> Page[ModelT]:
+    """
+    Same as `paginate`, on an async session.
+    """
+    statement, rank = _page_statement(
+        statement=statement,
+        model=model,
+        skip=skip,
+        limit=limit,
+        cursor=cursor,
+        rank=rank,
+    )
+    return _make_page((await session.exec(statement)).all(), limit, rank)
+
+
+def paginate_rows(
+    *,
+    session: Session,
+    statement: SelectOfScalar[ModelT],
+    model: type[ModelT],
+    columns: Sequence[ColumnElement[Any]],
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    rank: ColumnElement[Any] | None = None,
+) -> Page[Any]:
+    """
+    Same as `paginate`, but only selects `columns`, as plain rows instead of
+    ORM objects. `columns` must include the model's created_at and id.
+    """
+    statement, rank = _page_statement(
+        statement=statement,
+        model=model,
+        skip=skip,
+        limit=limit,
+        cursor=cursor,
+        rank=rank,
+    )
+    rows = session.execute(statement.with_only_columns(*columns)).all()
+    return _make_page(rows, limit, rank)
+
+
+async def paginate_rows_async(
+    *,
+    session: AsyncSession,
+    statement: SelectOfScalar[ModelT],
+    model: type[ModelT],
+    columns: Sequence[ColumnElement[Any]],
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    rank: ColumnElement[Any] | None = None,
+) -> Page[Any]:
+    """
+    Same as `paginate_rows`, on an async session.
+    """
+    statement, rank = _page_statement(
+        statement=statement,
+        model=model,
+        skip=skip,
+        limit=limit,
+        cursor=cursor,
+        rank=rank,
+    )
+    result = await session.execute(statement.with_only_columns(*columns))
+    return _make_page(result.all(), limit, rank)
+
+
+def page_response(
+    page: Page[Any], count: int | None, headers: Mapping[str, str] | None = None
+) -> Response:
+    """
+    Serialize a page of `paginate_rows` with orjson, bypassing the route's
+    response_model.
+
+    The rows are written as they come from the database, so the columns must
+    already have the names and types of the public model.
+    """
+    content = orjson.dumps(
+        {
+            "data": [row._asdict() for row in page.data],
+            "count": count,
+            "has_more": page.has_more,
+            "next_cursor": page.next_cursor,
+        }
+    )
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+def _explain_statement(
+    statement: SelectOfScalar[ModelT], dialect: Dialect
+) -> tuple[str, Any]:
+    # Expanding IN parameters, such as a status filter, are only rendered at
+    # execution time, which exec_driver_sql skips
+    compiled = statement.compile(
+        dialect=dialect, compile_kwargs={"render_postcompile": True}
+    )
+    return f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+
+
+def _plan_rows(plan: Any) -> int:
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def count_rows(
+    *,
+    session: Session,
+    statement: SelectOfScalar[ModelT],
+    mode: CountMode = CountMode.exact,
+) -> int | None:
+    """
+    Count the rows matched by `statement` according to `mode`.
+
+    `exact` runs a full count, `estimated` trusts the planner for large sets
+    and only counts exactly, up to `COUNT_ESTIMATE_CAP` rows, when the
+    estimate is small, and `none` skips counting altogether.
+    """
+    if mode == CountMode.none:
+        return None
+    statement = statement.order_by(None)
+    if mode == CountMode.estimated:
+        cap = settings.COUNT_ESTIMATE_CAP
+        connection = session.connection()
+        plan = connection.exec_driver_sql(
+            *_explain_statement(statement, connection.dialect)
+        )
+        estimate = _plan_rows(plan.scalar_one())
+        if estimate >= cap:
+            return estimate
+        capped = select(func.count()).select_from(statement.limit(cap).subquery())
+        return session.exec(capped).one()
+    return session.exec(select(func.count()).select_from(statement.subquery())).one()
+
+
+async def count_rows_async(
+    *,
+    session: AsyncSession,
+    statement: SelectOfScalar[ModelT],
+    mode: CountMode = CountMode.exact,
+) -> int | None:
+    """
+    Same as `count_rows`, on an async session.
+    """
+    if mode == CountMode.none:
+        return None
+    statement = statement.order_by(None)
+    if mode == CountMode.estimated:
+        cap = settings.COUNT_ESTIMATE_CAP
+        connection = await session.connection()
+        plan = await connection.exec_driver_sql(
+            *_explain_statement(statement, connection.dialect)
+        )
+        estimate = _plan_rows(plan.scalar_one())
+        if estimate >= cap:
+            return estimate
+        capped = select(func.count()).select_from(statement.limit(cap).subquery())
+        return (await session.exec(capped)).one()
+    counted = select(func.count()).select_from(statement.subquery())
+    return (await session.exec(counted)).one()
@@ -1,33 +1,82 @@
 import uuid
+from datetime import datetime
 from typing import Any
 
-from fastapi import APIRouter, HTTPException
-from sqlmodel import func, select
+from fastapi import APIRouter, HTTPException, Request, Response
+from sqlalchemy import select as sa_select
+from sqlmodel import col, func, select
 
-from app.api.deps import CurrentUser, SessionDep
-from app.models import SubTodo, SubTodoCreate, SubTodoPublic, SubTodosPublic, SubTodoUpdate, Message, Todo
+from app import crud
+from app.api.conditional import (
+    cached_response,
+    check_not_modified,
+    make_etag,
+    todos_version_statement,
+)
+from app.api.deps import CurrentUser, ReadSessionDep, ReadUser, SessionDep
+from app.core.db import replicas
+from app.core.events import notify_change
+from app.core.read_cache import CachedResponse, read_cache
+from app.models import ChangeAction, SubTodo, SubTodoCreate, SubTodoPublic, SubTodosPublic, SubTodoUpdate, Message, StatusEnum, Todo, TodoChangeEvent, TombstoneKind
 
 router = APIRouter(prefix="", tags=["subtodos"])
 
 @router.get("/todos/{todo_id}/subtodos", response_model=SubTodosPublic)
-def read_subtodo(session: SessionDep, current_user: CurrentUser, todo_id: uuid.UUID) -> Any:
+def read_subtodo(
+    session: ReadSessionDep,
+    current_user: ReadUser,
+    request: Request,
+    response: Response,
+    todo_id: uuid.UUID,
+) -> Any:
+    cached, token = read_cache.get(
+        None if current_user.is_superuser else current_user.id, f"subtodos:{todo_id}"
+    )
+    if cached is not None:
+        return cached_response(request, response, cached)
     todo = session.get(Todo, todo_id)
+    if not todo:
+        raise HTTPException(status_code=404, detail="Todo not found")
     if not current_user.is_superuser and (todo.owner_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
+    version = session.exec(todos_version_statement(todo.owner_id)).one()
+    etag = make_etag("subtodos", todo_id, version)
+    not_modified = check_not_modified(
+        request,
+        response,
+        etag=etag,
+        last_modified=None,
+    )
+    if not_modified is not None:
+        return not_modified
     statement = select(SubTodo).where(SubTodo.todo_id == todo_id)
     subtodos = session.exec(statement).all()
     if not subtodos:
         raise HTTPException(status_code=404, detail="Sub Task not found")
-    return SubTodosPublic(count=len(subtodos), data=subtodos)
+    public = SubTodosPublic(count=len(subtodos), data=subtodos)
+    # Replicas may lag behind the write that invalidated the entry
+    if token is not None and not replicas.is_replica(session):
+        cached = CachedResponse(
+            body=public.model_dump_json().encode(),
+            etag=etag,
+            last_modified=None,
+        )
+        read_cache.set(current_user.id, f"subtodos:{todo_id}", token, cached)
+        return Response(
+            cached.body, media_type="application/json", headers=response.headers
+        )
+    return public
 
 @router.get("/todos/{todo_id}/subtodos/{id}", response_model=SubTodoPublic)
 def read_sub_todo(
     *,
-    session: SessionDep,
-    current_user: CurrentUser,
+    session: ReadSessionDep,
+    current_user: ReadUser,
+    request: Request,
+    response: Response,
     todo_id: uuid.UUID,
     id: uuid.UUID
-) -> SubTodoPublic:
+) -> Any:
     """
     Retrieve a specific sub todo by its ID and associated todo ID.
     """
@@ -40,7 +89,13 @@ def read_sub_todo(
     sub_todo = session.exec(statement).first()
     if not sub_todo:
         raise HTTPException(status_code=404, detail="SubTodo not found")
-    return sub_todo
+    not_modified = check_not_modified(
+        request,
+        response,
+        etag=make_etag("subtodo", sub_todo.id, sub_todo.updated_at),
+        last_modified=sub_todo.updated_at,
+    )
+    return sub_todo if not_modified is None else not_modified
 
 @router.post("/todos/{todo_id}/subtodos", response_model=SubTodoPublic)
 def create_sub_todo(
@@ -55,6 +110,22 @@ def create_sub_todo(
     sub_todo = SubTodoCreate.model_validate(sub_todo_in)
     create_todo = SubTodo(**{**sub_todo.dict(), "todo_id": todo_id})
     session.add(create_todo)
+    crud.adjust_subtodo_counters(
+        session=session,
+        todo_id=todo_id,
+        total=1,
+        completed=int(create_todo.status == StatusEnum.completed),
+    )
+    notify_change(
+        session=session,
+        event=TodoChangeEvent(
+            kind=TombstoneKind.subtodo,
+            action=ChangeAction.created,
+            owner_id=todo.owner_id,
+            object_id=create_todo.id,
+            todo_id=todo_id,
+        ),
+    )
     session.commit()
     session.refresh(create_todo)
     return create_todo
@@ -71,7 +142,8 @@ def update_sub_todo(
     """
     Update a sub todo by ID.
     """
-    sub_todo = session.get(SubTodo, id)
+    # Locked so that concurrent status changes see each other's result
+    sub_todo = session.get(SubTodo, id, with_for_update=True, populate_existing=True)
     if not sub_todo:
         raise HTTPException(status_code=404, detail="SubTodo not found")
     parent_todo = session.get(Todo, sub_todo.todo_id)
@@ -80,9 +152,28 @@ def update_sub_todo(
     if not current_user.is_superuser and (parent_todo.owner_id != current_user.id):
         raise HTTPException(status_code=403, detail="Not enough permissions")
     update_data = sub_todo_in.model_dump(exclude_unset=True)
+    was_completed = sub_todo.status == StatusEnum.completed
     for key, value in update_data.items():
         setattr(sub_todo, key, value)
+    sub_todo.updated_at = datetime.now()
     session.add(sub_todo)
+    is_completed = sub_todo.status == StatusEnum.completed
+    if is_completed != was_completed:
+        crud.adjust_subtodo_counters(
+            session=session,
+            todo_id=sub_todo.todo_id,
+            completed=1 if is_completed else -1,
+        )
+    notify_change(
+        session=session,
+        event=TodoChangeEvent(
+            kind=TombstoneKind.subtodo,
+            action=ChangeAction.updated,
+            owner_id=parent_todo.owner_id,
+            object_id=sub_todo.id,
+            todo_id=sub_todo.todo_id,
+        ),
+    )
     session.commit()
     session.refresh(sub_todo)
     
@@ -103,8 +194,40 @@ def delete_sub_todo(
     sub_todo = session.get(SubTodo, id)
     if not sub_todo:
         raise HTTPException(status_code=404, detail="SubTodo not found")
-    statement = select(SubTodo).where(SubTodo.todo_id == todo_id, SubTodo.id == id)
+    statement = (
+        select(SubTodo)
+        .where(SubTodo.todo_id == todo_id, SubTodo.id == id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
     sub_todo = session.exec(statement).first()
+    if not sub_todo:
+        raise HTTPException(status_code=404, detail="SubTodo not found")
+    crud.create_tombstones(
+        session=session,
+        kind=TombstoneKind.subtodo,
+        statement=sa_select(
+            col(Todo.owner_id), col(SubTodo.id), col(SubTodo.todo_id)
+        )
+        .join(Todo)
+        .where(col(SubTodo.id) == id),
+    )
     session.delete(sub_todo)
+    crud.adjust_subtodo_counters(
+        session=session,
+        todo_id=todo_id,
+        total=-1,
+        completed=-int(sub_todo.status == StatusEnum.completed),
+    )
+    notify_change(
+        session=session,
+        event=TodoChangeEvent(
+            kind=TombstoneKind.subtodo,
+            action=ChangeAction.deleted,
+            owner_id=todo.owner_id,
+            object_id=id,
+            todo_id=todo_id,
+        ),
+    )
     session.commit()
     return Message(message="SubTodo deleted successfully")
@@ -1,66 +1,372 @@
+import base64
+import binascii
 import uuid
-from typing import Any
+from datetime import datetime, timedelta
+from typing import Annotated, Any
 
-from fastapi import APIRouter, HTTPException, Query
-from sqlmodel import func, select
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import SkipValidation, ValidationError
+from sqlalchemy import ColumnElement, false, inspect, null
+from sqlalchemy import select as sa_select
+from sqlalchemy.orm import selectinload
+from sqlmodel import Session, col, delete, func, select, update
+from sqlmodel.sql.expression import SelectOfScalar
 
-from app.api.deps import CurrentUser, SessionDep
-from app.models import Todo, TodoCreate, TodoPublic, TodosPublic, TodoUpdate, Message, SubTodo, SubTodosPublic
+from app import crud
+from app.api.conditional import (
+    cached_response,
+    check_not_modified,
+    make_etag,
+    todos_version_statement,
+)
+from app.api.deps import (
+    CurrentUser,
+    ReadSessionDep,
+    ReadUser,
+    SessionDep,
+    get_current_active_superuser,
+)
+from app.api.pagination import (
+    CountMode,
+    count_rows,
+    page_response,
+    paginate,
+    paginate_rows,
+)
+from app.api.search import SearchMode, search_todos
+from app.core.config import settings
+from app.core.db import replicas
+from app.core.events import change_listener, notify_change
+from app.core.read_cache import CachedResponse, read_cache
+from app.models import (
+    AuthUser,
+    ChangeAction,
+    Message,
+    StatusEnum,
+    SubTodo,
+    Todo,
+    TodoBulkError,
+    TodoBulkFilter,
+    TodoChangeEvent,
+    TodoChanges,
+    TodoCreate,
+    TodoPublic,
+    TodosBulkAffected,
+    TodosBulkCreated,
+    TodosBulkUpdate,
+    TodosPublic,
+    TodoStatusCounts,
+    TodoTreesPublic,
+    TodoUpdate,
+    Tombstone,
+    TombstoneKind,
+)
 
 router = APIRouter(prefix="/todos", tags=["todos"])
 
+TODO_BULK_MAX_ROWS = 10_000
+SYNC_OVERLAP = timedelta(seconds=5)
+# What read_todos selects when settings.FAST_LIST_RESPONSES is on
+TODO_PUBLIC_COLUMNS = [
+    inspect(Todo).local_table.c[name] for name in TodoPublic.model_fields
+]
+
+
+def _filter_todos(
+    owner_id: uuid.UUID | None,
+    search: str | None,
+    search_mode: SearchMode,
+    status: list[StatusEnum] | None,
+) -> tuple[SelectOfScalar[Todo], ColumnElement[Any] | None]:
+    statement = select(Todo)
+    rank = None
+    if owner_id is not None:
+        statement = statement.where(Todo.owner_id == owner_id)
+    if status:
+        statement = statement.where(col(Todo.status).in_(status))
+    if search:
+        statement, rank = search_todos(statement, search, search_mode)
+    return statement, rank
+
+
+def _visible_owner_id(current_user: AuthUser) -> uuid.UUID | None:
+    return None if current_user.is_superuser else current_user.id
+
+
+def _status_counts(
+    session: Session, statement: SelectOfScalar[Todo]
+) -> TodoStatusCounts:
+    stats_statement = select(col(Todo.status), func.count()).group_by(col(Todo.status))
+    if statement.whereclause is not None:
+        stats_statement = stats_statement.where(statement.whereclause)
+    counts = dict.fromkeys(StatusEnum, 0)
+    counts.update(session.exec(stats_statement).all())
+    return TodoStatusCounts(counts=counts, total=sum(counts.values()))
+
 
 @router.get("/", response_model=TodosPublic)
 def read_todos(
-    session: SessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 100, search: str | None = None
+    session: ReadSessionDep,
+    current_user: ReadUser,
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    search: str | None = None,
+    search_mode: SearchMode = SearchMode.fulltext,
+    status: Annotated[list[StatusEnum] | None, Query()] = None,
+    cursor: str | None = None,
+    count_mode: CountMode = CountMode.exact,
 ) -> Any:
     """
     Retrieve todos.
+
+    Pass the returned `next_cursor` back as `cursor` to fetch the next page
+    without the cost of skipping rows. Search results are ordered by
+    relevance and paged with `skip`.
+
+    A user's own list carries an ETag, which changes with any change to
+    their todos, and is answered with a 304 while it matches If-None-Match.
     """
 
-    if current_user.is_superuser:
-        count_statement = select(func.count()).select_from(Todo)
-        count = session.exec(count_statement).one()
-        statement = select(Todo).offset(skip).limit(limit)
-        todos = session.exec(statement).all()
-    else:
-        count_statement = (
-            select(func.count())
-            .select_from(Todo)
-            .where(Todo.owner_id == current_user.id)
+    owner_id = _visible_owner_id(current_user)
+    statement, rank = _filter_todos(owner_id, search, search_mode, status)
+    if owner_id is not None:
+        version = session.exec(todos_version_statement(owner_id)).one()
+        not_modified = check_not_modified(
+            request,
+            response,
+            etag=make_etag("todos", owner_id, version, request.url.query),
+            last_modified=None,
         )
-        statement = (
-            select(Todo)
-            .where(Todo.owner_id == current_user.id)
-            .order_by(Todo.created_at.desc())
+        if not_modified is not None:
+            return not_modified
+    count = count_rows(session=session, statement=statement, mode=count_mode)
+    if settings.FAST_LIST_RESPONSES:
+        rows = paginate_rows(
+            session=session,
+            statement=statement,
+            model=Todo,
+            columns=TODO_PUBLIC_COLUMNS,
+            skip=skip,
+            limit=limit,
+            cursor=cursor,
+            rank=rank,
         )
-        if search:
-            statement = statement.where(Todo.title.contains(search) | Todo.desc.contains(search) | Todo.status.contains(search))
-            count_statement = (
-                select(func.count())
-                .select_from(Todo)
-                .where(Todo.owner_id == current_user.id)
-                .where(Todo.title.contains(search) | Todo.desc.contains(search) | Todo.status.contains(search))
+        return page_response(rows, count, headers=response.headers)
+    page = paginate(
+        session=session,
+        statement=statement,
+        model=Todo,
+        skip=skip,
+        limit=limit,
+        cursor=cursor,
+        rank=rank,
+    )
+    return TodosPublic(
+        data=page.data,
+        count=count,
+        has_more=page.has_more,
+        next_cursor=page.next_cursor,
+    )
+
+
+@router.get("/tree", response_model=TodoTreesPublic)
+def read_todo_tree(
+    session: ReadSessionDep,
+    current_user: ReadUser,
+    skip: int = 0,
+    limit: int = 100,
+    search: str | None = None,
+    search_mode: SearchMode = SearchMode.fulltext,
+    status: Annotated[list[StatusEnum] | None, Query()] = None,
+    cursor: str | None = None,
+    count_mode: CountMode = CountMode.exact,
+) -> Any:
+    """
+    Retrieve todos together with their subtodos.
+
+    Takes the same parameters as listing todos. The subtodos of the whole
+    page are loaded with one extra query.
+    """
+
+    statement, rank = _filter_todos(
+        _visible_owner_id(current_user), search, search_mode, status
+    )
+    count = count_rows(session=session, statement=statement, mode=count_mode)
+    page = paginate(
+        session=session,
+        statement=statement.options(selectinload(Todo.subtodos)),  # type: ignore[arg-type]
+        model=Todo,
+        skip=skip,
+        limit=limit,
+        cursor=cursor,
+        rank=rank,
+    )
+    return TodoTreesPublic(
+        data=page.data,
+        count=count,
+        has_more=page.has_more,
+        next_cursor=page.next_cursor,
+    )
+
+
+@router.get("/stats", response_model=TodoStatusCounts)
+def read_todo_stats(
+    session: ReadSessionDep,
+    current_user: ReadUser,
+    search: str | None = None,
+    search_mode: SearchMode = SearchMode.fulltext,
+    status: Annotated[list[StatusEnum] | None, Query()] = None,
+) -> Any:
+    """
+    Count the current user's todos per status.
+
+    Takes the same filters as listing todos.
+    """
+    statement, _ = _filter_todos(current_user.id, search, search_mode, status)
+    return _status_counts(session, statement)
+
+
+@router.get(
+    "/stats/all",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_model=TodoStatusCounts,
+)
+def read_all_todo_stats(
+    session: ReadSessionDep,
+    search: str | None = None,
+    search_mode: SearchMode = SearchMode.fulltext,
+    status: Annotated[list[StatusEnum] | None, Query()] = None,
+) -> Any:
+    """
+    Count the todos of all users per status.
+    """
+    statement, _ = _filter_todos(None, search, search_mode, status)
+    return _status_counts(session, statement)
+
+
+def _encode_sync_token(synced_at: datetime) -> str:
+    return base64.urlsafe_b64encode(synced_at.isoformat().encode()).decode()
+
+
+def _decode_sync_token(token: str) -> datetime:
+    try:
+        return datetime.fromisoformat(base64.urlsafe_b64decode(token).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+
+
+@router.get("/changes", response_model=TodoChanges)
+def read_todo_changes(
+    session: SessionDep, current_user: ReadUser, since: str | None = None
+) -> Any:
+    """
+    Get the current user's todos and subtodos changed since a sync token.
+
+    Without `since` everything is returned. Pass the returned `token` as
+    `since` on the next call; changes close to the token boundary may be
+    sent twice, so apply them idempotently. Subtodos of a deleted todo are
+    not listed separately. A token older than the tombstone retention gets a
+    410: drop the local copy and sync again without `since`.
+    """
+    # Stays on the primary: replica lag could exceed SYNC_OVERLAP and a
+    # change missed here would never be sent
+    synced_at = datetime.now()
+    todos_statement = select(Todo).where(Todo.owner_id == current_user.id)
+    subtodos_statement = (
+        select(SubTodo).join(Todo).where(Todo.owner_id == current_user.id)
+    )
+    tombstones_statement = select(Tombstone).where(
+        Tombstone.owner_id == current_user.id
+    )
+    if since is not None:
+        # Overlap with the previous sync to catch writes that were still
+        # uncommitted when it ran
+        changed_after = _decode_sync_token(since) - SYNC_OVERLAP
+        # The tombstones of older deletions may be purged already
+        if changed_after < synced_at - timedelta(
+            days=settings.TOMBSTONE_RETENTION_DAYS
+        ):
+            raise HTTPException(
+                status_code=410, detail="Sync token expired, sync again without since"
             )
-        count = session.exec(count_statement).one()
-        statement = statement.offset(skip).limit(limit)
-        todos = session.exec(statement).all()
-    return TodosPublic(data=todos, count=count)
+        todos_statement = todos_statement.where(col(Todo.updated_at) >= changed_after)
+        subtodos_statement = subtodos_statement.where(
+            col(SubTodo.updated_at) >= changed_after
+        )
+        tombstones_statement = tombstones_statement.where(
+            col(Tombstone.deleted_at) >= changed_after
+        )
+    else:
+        tombstones_statement = tombstones_statement.where(false())
+    return TodoChanges(
+        todos=session.exec(todos_statement).all(),
+        subtodos=session.exec(subtodos_statement).all(),
+        deleted=session.exec(tombstones_statement).all(),
+        token=_encode_sync_token(synced_at),
+    )
+
+
+@router.get("/events", response_class=StreamingResponse)
+def stream_todo_events(
+    session: SessionDep, current_user: ReadUser
+) -> StreamingResponse:
+    """
+    Stream changes to the current user's todos and subtodos as Server-Sent
+    Events.
+
+    A `resync` event means some changes were dropped, catch up with
+    `/todos/changes`.
+    """
+    # Hand the connection back to the pool, the stream can stay open for hours
+    session.close()
+    return StreamingResponse(
+        change_listener.stream(current_user.id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/{id}", response_model=TodoPublic)
-def read_todo(session: SessionDep, current_user: CurrentUser, id: uuid.UUID) -> Any:
+def read_todo(
+    session: ReadSessionDep,
+    current_user: ReadUser,
+    request: Request,
+    response: Response,
+    id: uuid.UUID,
+) -> Any:
     """
     Get todo by ID.
     """
+    cached, token = read_cache.get(
+        None if current_user.is_superuser else current_user.id, f"todo:{id}"
+    )
+    if cached is not None:
+        return cached_response(request, response, cached)
     todo = session.get(Todo, id)
     if not todo:
         raise HTTPException(status_code=404, detail="Task not found")
     if not current_user.is_superuser and (todo.owner_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
-    return todo
+    etag = make_etag("todo", todo.id, todo.updated_at)
+    # Replicas may lag behind the write that invalidated the entry
+    if token is not None and not replicas.is_replica(session):
+        cached = CachedResponse(
+            body=TodoPublic.model_validate(todo).model_dump_json().encode(),
+            etag=etag,
+            last_modified=todo.updated_at,
+        )
+        read_cache.set(current_user.id, f"todo:{id}", token, cached)
+        return cached_response(request, response, cached)
+    not_modified = check_not_modified(
+        request, response, etag=etag, last_modified=todo.updated_at
+    )
+    return todo if not_modified is None else not_modified
 
-# CurrentUser to authenticat ->middleware
+
+# CurrentUser rejects unauthenticated requests before the handler runs
 @router.post("/", response_model=TodoPublic)
 def create_todo(
     *, session: SessionDep, current_user: CurrentUser, todo_in: TodoCreate
@@ -70,11 +376,141 @@ def create_todo(
     """
     todo = Todo.model_validate(todo_in, update={"owner_id": current_user.id})
     session.add(todo)
+    notify_change(
+        session=session,
+        event=TodoChangeEvent(
+            kind=TombstoneKind.todo,
+            action=ChangeAction.created,
+            owner_id=current_user.id,
+            object_id=todo.id,
+        ),
+    )
     session.commit()
     session.refresh(todo)
     return todo
 
 
+@router.post("/bulk", response_model=TodosBulkCreated)
+def create_todos_bulk(
+    *,
+    session: SessionDep,
+    current_user: CurrentUser,
+    # Documented as todos, but validated one by one below
+    todos_in: Annotated[
+        list[SkipValidation[TodoCreate]], Body(max_length=TODO_BULK_MAX_ROWS)
+    ],
+) -> Any:
+    """
+    Create many todos in one transaction.
+
+    Each entry is validated as a todo on its own: invalid entries are
+    reported by index in `errors` and the valid ones are still created.
+    """
+    valid: list[TodoCreate] = []
+    errors: list[TodoBulkError] = []
+    for index, todo_data in enumerate(todos_in):
+        try:
+            valid.append(TodoCreate.model_validate(todo_data))
+        except ValidationError as e:
+            errors.append(
+                TodoBulkError(
+                    index=index,
+                    errors=e.errors(include_url=False, include_context=False),
+                )
+            )
+    ids = crud.create_todos_bulk(
+        session=session, todos_in=valid, owner_id=current_user.id
+    )
+    if ids:
+        notify_change(
+            session=session,
+            event=TodoChangeEvent(
+                kind=TombstoneKind.todo,
+                action=ChangeAction.created,
+                owner_id=current_user.id,
+            ),
+        )
+    session.commit()
+    return TodosBulkCreated(ids=ids, errors=errors)
+
+
+def _bulk_filter_clause(
+    current_user: AuthUser, bulk_filter: TodoBulkFilter
+) -> ColumnElement[bool]:
+    statement = select(Todo).where(Todo.owner_id == current_user.id)
+    if bulk_filter.ids is not None:
+        statement = statement.where(col(Todo.id).in_(bulk_filter.ids))
+    if bulk_filter.status is not None:
+        statement = statement.where(Todo.status == bulk_filter.status)
+    if bulk_filter.created_after is not None:
+        statement = statement.where(col(Todo.created_at) >= bulk_filter.created_after)
+    if bulk_filter.created_before is not None:
+        statement = statement.where(col(Todo.created_at) < bulk_filter.created_before)
+    if bulk_filter.search:
+        statement, _ = search_todos(statement, bulk_filter.search)
+    assert statement.whereclause is not None
+    return statement.whereclause
+
+
+@router.patch("/bulk", response_model=TodosBulkAffected)
+def update_todos_bulk(
+    *, session: SessionDep, current_user: CurrentUser, body: TodosBulkUpdate
+) -> Any:
+    """
+    Set the status of the current user's todos matching a filter.
+    """
+    statement = (
+        update(Todo)
+        .where(_bulk_filter_clause(current_user, body.filter))
+        .values(status=body.status, updated_at=datetime.now())
+    )
+    result = session.execute(statement)
+    notify_change(
+        session=session,
+        event=TodoChangeEvent(
+            kind=TombstoneKind.todo,
+            action=ChangeAction.updated,
+            owner_id=current_user.id,
+        ),
+    )
+    session.commit()
+    return TodosBulkAffected(count=result.rowcount)  # type: ignore[attr-defined]
+
+
+@router.delete("/bulk", response_model=TodosBulkAffected)
+def delete_todos_bulk(
+    *, session: SessionDep, current_user: CurrentUser, body: TodoBulkFilter
+) -> Any:
+    """
+    Delete the current user's todos matching a filter.
+    """
+    criteria = (body.ids, body.status, body.created_after, body.created_before)
+    if not body.all and all(value is None for value in criteria) and not body.search:
+        raise HTTPException(
+            status_code=422,
+            detail="Give a filter, or set all to delete every todo",
+        )
+    clause = _bulk_filter_clause(current_user, body)
+    crud.create_tombstones(
+        session=session,
+        kind=TombstoneKind.todo,
+        statement=sa_select(
+            col(Todo.owner_id), col(Todo.id), null().label("todo_id")
+        ).where(clause),
+    )
+    result = session.execute(delete(Todo).where(clause))
+    notify_change(
+        session=session,
+        event=TodoChangeEvent(
+            kind=TombstoneKind.todo,
+            action=ChangeAction.deleted,
+            owner_id=current_user.id,
+        ),
+    )
+    session.commit()
+    return TodosBulkAffected(count=result.rowcount)  # type: ignore[attr-defined]
+
+
 @router.put("/{id}", response_model=TodoPublic)
 def update_todo(
     *,
@@ -92,8 +528,17 @@ def update_todo(
     if not current_user.is_superuser and (todo.owner_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
     update_dict = todo_in.model_dump(exclude_unset=True)
-    todo.sqlmodel_update(update_dict)
+    todo.sqlmodel_update(update_dict, update={"updated_at": datetime.now()})
     session.add(todo)
+    notify_change(
+        session=session,
+        event=TodoChangeEvent(
+            kind=TombstoneKind.todo,
+            action=ChangeAction.updated,
+            owner_id=todo.owner_id,
+            object_id=todo.id,
+        ),
+    )
     session.commit()
     session.refresh(todo)
     return todo
@@ -111,7 +556,22 @@ def delete_item(
         raise HTTPException(status_code=404, detail="Task not found")
     if not current_user.is_superuser and (todo.owner_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
+    crud.create_tombstones(
+        session=session,
+        kind=TombstoneKind.todo,
+        statement=sa_select(
+            col(Todo.owner_id), col(Todo.id), null().label("todo_id")
+        ).where(col(Todo.id) == id),
+    )
     session.delete(todo)
+    notify_change(
+        session=session,
+        event=TodoChangeEvent(
+            kind=TombstoneKind.todo,
+            action=ChangeAction.deleted,
+            owner_id=todo.owner_id,
+            object_id=todo.id,
+        ),
+    )
     session.commit()
     return Message(message="Task deleted successfully")
-
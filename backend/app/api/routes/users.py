@@ -2,15 +2,21 @@ import uuid
 from typing import Any
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import col, delete, func, select
+from sqlmodel import col, delete, select
 
 from app import crud
 from app.api.deps import (
     CurrentUser,
+    CurrentUserRecord,
+    ReadSessionDep,
     SessionDep,
     get_current_active_superuser,
+    invalidate_auth_user,
 )
+from app.api.pagination import CountMode, count_rows, paginate
 from app.core.config import settings
+from app.core.events import notify_user_change
+from app.core.outbox import enqueue_email
 from app.core.security import get_password_hash, verify_password
 from app.models import (
     Item,
@@ -24,7 +30,7 @@ from app.models import (
     UserUpdate,
     UserUpdateMe,
 )
-from app.utils import generate_new_account_email, send_email
+from app.utils import generate_new_account_email
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -34,18 +40,35 @@ router = APIRouter(prefix="/users", tags=["users"])
     dependencies=[Depends(get_current_active_superuser)],
     response_model=UsersPublic,
 )
-def read_users(session: SessionDep, skip: int = 0, limit: int = 100) -> Any:
+def read_users(
+    session: ReadSessionDep,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    count_mode: CountMode = CountMode.exact,
+) -> Any:
     """
     Retrieve users.
     """
 
-    count_statement = select(func.count()).select_from(User)
-    count = session.exec(count_statement).one()
+    statement = select(User)
+    count = count_rows(session=session, statement=statement, mode=count_mode)
 
-    statement = select(User).offset(skip).limit(limit)
-    users = session.exec(statement).all()
+    page = paginate(
+        session=session,
+        statement=statement,
+        model=User,
+        skip=skip,
+        limit=limit,
+        cursor=cursor,
+    )
 
-    return UsersPublic(data=users, count=count)
+    return UsersPublic(
+        data=page.data,
+        count=count,
+        has_more=page.has_more,
+        next_cursor=page.next_cursor,
+    )
 
 
 @router.post(
@@ -67,17 +90,19 @@ def create_user(*, session: SessionDep, user_in: UserCreate) -> Any:
         email_data = generate_new_account_email(
             email_to=user_in.email, username=user_in.email, password=user_in.password
         )
-        send_email(
+        enqueue_email(
+            session=session,
             email_to=user_in.email,
             subject=email_data.subject,
             html_content=email_data.html_content,
         )
+        session.commit()
     return user
 
 
 @router.patch("/me", response_model=UserPublic)
 def update_user_me(
-    *, session: SessionDep, user_in: UserUpdateMe, current_user: CurrentUser
+    *, session: SessionDep, user_in: UserUpdateMe, current_user: CurrentUserRecord
 ) -> Any:
     """
     Update own user.
@@ -92,14 +117,16 @@ def update_user_me(
     user_data = user_in.model_dump(exclude_unset=True)
     current_user.sqlmodel_update(user_data)
     session.add(current_user)
+    notify_user_change(session=session, user_id=current_user.id)
     session.commit()
+    invalidate_auth_user(current_user.id)
     session.refresh(current_user)
     return current_user
 
 
 @router.patch("/me/password", response_model=Message)
 def update_password_me(
-    *, session: SessionDep, body: UpdatePassword, current_user: CurrentUser
+    *, session: SessionDep, body: UpdatePassword, current_user: CurrentUserRecord
 ) -> Any:
     """
     Update own password.
@@ -118,7 +145,7 @@ def update_password_me(
 
 
 @router.get("/me", response_model=UserPublic)
-def read_user_me(current_user: CurrentUser) -> Any:
+def read_user_me(current_user: CurrentUserRecord) -> Any:
     """
     Get current user.
     """
@@ -126,7 +153,7 @@ def read_user_me(current_user: CurrentUser) -> Any:
 
 
 @router.delete("/me", response_model=Message)
-def delete_user_me(session: SessionDep, current_user: CurrentUser) -> Any:
+def delete_user_me(session: SessionDep, current_user: CurrentUserRecord) -> Any:
     """
     Delete own user.
     """
@@ -137,7 +164,9 @@ def delete_user_me(session: SessionDep, current_user: CurrentUser) -> Any:
     statement = delete(Item).where(col(Item.owner_id) == current_user.id)
     session.exec(statement)  # type: ignore
     session.delete(current_user)
+    notify_user_change(session=session, user_id=current_user.id)
     session.commit()
+    invalidate_auth_user(current_user.id)
     return Message(message="User deleted successfully")
 
 
@@ -159,13 +188,13 @@ def register_user(session: SessionDep, user_in: UserRegister) -> Any:
 
 @router.get("/{user_id}", response_model=UserPublic)
 def read_user_by_id(
-    user_id: uuid.UUID, session: SessionDep, current_user: CurrentUser
+    user_id: uuid.UUID, session: ReadSessionDep, current_user: CurrentUser
 ) -> Any:
     """
     Get a specific user by id.
     """
     user = session.get(User, user_id)
-    if user == current_user:
+    if user_id == current_user.id:
         return user
     if not current_user.is_superuser:
         raise HTTPException(
@@ -203,7 +232,9 @@ def update_user(
                 status_code=409, detail="User with this email already exists"
             )
 
+    notify_user_change(session=session, user_id=user_id)
     db_user = crud.update_user(session=session, db_user=db_user, user_in=user_in)
+    invalidate_auth_user(user_id)
     return db_user
 
 
@@ -217,12 +248,14 @@ def delete_user(
     user = session.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    if user == current_user:
+    if user.id == current_user.id:
         raise HTTPException(
             status_code=403, detail="Super users are not allowed to delete themselves"
         )
     statement = delete(Item).where(col(Item.owner_id) == user_id)
     session.exec(statement)  # type: ignore
     session.delete(user)
+    notify_user_change(session=session, user_id=user_id)
     session.commit()
+    invalidate_auth_user(user_id)
     return Message(message="User deleted successfully")
@@ -0,0 +1,54 @@
+from enum import Enum
+from typing import Any
+
+from sqlalchemy import ColumnElement, String, cast, or_
+from sqlmodel import col, func
+from sqlmodel.sql.expression import SelectOfScalar
+
+from app.models import TODO_SEARCH_CONFIG, StatusEnum, Todo
+
+
+class SearchMode(str, Enum):
+    fulltext = "fulltext"
+    legacy = "legacy"
+
+
+def _like_pattern(search: str) -> str:
+    escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def search_todos(
+    statement: SelectOfScalar[Todo],
+    search: str,
+    mode: SearchMode = SearchMode.fulltext,
+) -> tuple[SelectOfScalar[Todo], ColumnElement[Any] | None]:
+    """
+    Restrict `statement` to todos matching `search`.
+
+    `fulltext` matches whole words through the GIN-indexed search vector and
+    substrings of title or desc through the trigram indexes, and returns a
+    relevance expression to order by. `legacy` is the original unindexed
+    substring match on title, desc and status, with no relevance.
+    """
+    if mode == SearchMode.legacy:
+        return (
+            statement.where(
+                col(Todo.title).contains(search)
+                | col(Todo.desc).contains(search)
+                | cast(col(Todo.status), String).contains(search)
+            ),
+            None,
+        )
+    query = func.websearch_to_tsquery(TODO_SEARCH_CONFIG, search)
+    search_vector = col(Todo.search_vector)
+    pattern = _like_pattern(search)
+    matches: list[ColumnElement[bool]] = [
+        search_vector.op("@@")(query),
+        col(Todo.title).ilike(pattern, escape="\\"),
+        col(Todo.desc).ilike(pattern, escape="\\"),
+    ]
+    if search in StatusEnum.__members__:
+        matches.append(col(Todo.status) == StatusEnum(search))
+    statement = statement.where(or_(*matches))
+    return statement, func.ts_rank(search_vector, query)
@@ -0,0 +1,67 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Generic, TypeVar
+
+from app.core.metrics import Counter
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Cache lookups by cache and result.", ["cache", "result"]
+)
+
+
+class TTLCache(Generic[K, V]):
+    """
+    Bounded in-process cache whose entries expire `ttl` seconds after being set.
+
+    The least recently used entry is evicted once `maxsize` is reached. Lookups
+    are counted as hits and misses under `name`.
+    """
+
+    def __init__(self, *, name: str, maxsize: int, ttl: float) -> None:
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                CACHE_REQUESTS.inc(self.name, "hit")
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+        CACHE_REQUESTS.inc(self.name, "miss")
+        return None
+
+    def set(self, key: K, value: V) -> None:
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: K) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def hits(self) -> int:
+        return int(CACHE_REQUESTS.value(self.name, "hit"))
+
+    @property
+    def misses(self) -> int:
+        return int(CACHE_REQUESTS.value(self.name, "miss"))
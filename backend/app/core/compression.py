@@ -0,0 +1,269 @@
+"""
+Compression of responses, negotiated from the Accept-Encoding header.
+
+gzip is always offered, br and zstd only when the brotli and zstandard
+packages are installed.
+"""
+
+import zlib
+from typing import Protocol
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import Counter, Histogram, route_label
+
+try:
+    import brotli  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+RESPONSE_BYTES = Counter(
+    "http_compressed_response_bytes_total",
+    "Bytes of compressed responses before and after compression, by route.",
+    ["route", "encoding", "stage"],
+)
+COMPRESSION_RATIO = Histogram(
+    "http_compression_ratio",
+    "Compressed size over original size of compressed responses, by route.",
+    ["route", "encoding"],
+    buckets=(0.05, 0.1, 0.15, 0.2, 0.3, 0.4, 0.5, 0.6, 0.8, 1),
+)
+
+
+class Encoder(Protocol):
+    def compress(self, data: bytes) -> bytes: ...
+
+    # Everything compressed so far, keeping the stream open
+    def flush(self) -> bytes: ...
+
+    def finish(self) -> bytes: ...
+
+
+class GzipEncoder:
+    def __init__(self, level: int) -> None:
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    def __init__(self, quality: int) -> None:
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return bytes(self._compressor.process(data))
+
+    def flush(self) -> bytes:
+        return bytes(self._compressor.flush())
+
+    def finish(self) -> bytes:
+        return bytes(self._compressor.finish())
+
+
+class ZstdEncoder:
+    def __init__(self, level: int) -> None:
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return bytes(self._compressor.compress(data))
+
+    def flush(self) -> bytes:
+        return bytes(self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK))
+
+    def finish(self) -> bytes:
+        return bytes(self._compressor.flush())
+
+
+def available_encodings() -> list[str]:
+    """
+    The encodings this process can produce, preferred first.
+    """
+    encodings = []
+    if brotli is not None:
+        encodings.append("br")
+    if zstandard is not None:
+        encodings.append("zstd")
+    encodings.append("gzip")
+    return encodings
+
+
+def negotiate_encoding(accept_encoding: str, encodings: list[str]) -> str | None:
+    """
+    Pick the encoding with the highest q-value in `accept_encoding`, ties
+    going to the first in `encodings`.
+    """
+    weights: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        weight = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0
+        if name:
+            weights[name.strip().lower()] = weight
+    best, best_weight = None, 0.0
+    for encoding in encodings:
+        weight = weights.get(encoding, weights.get("*", 0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def is_compressible(content_type: str) -> bool:
+    content_type = content_type.partition(";")[0].strip().lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES) or content_type.endswith(
+        ("+json", "+xml")
+    )
+
+
+class CompressionMiddleware:
+    """
+    Compress responses of at least `minimum_size` bytes whose content type
+    is compressible.
+
+    Streamed responses are always compressed, and every chunk is flushed as
+    it is sent, so Server-Sent Events and NDJSON lines reach the client
+    without waiting for more data.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        minimum_size: int = 500,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        zstd_level: int = 3,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.levels = {"gzip": gzip_level, "br": brotli_quality, "zstd": zstd_level}
+        self.encodings = available_encodings()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(
+            Headers(scope=scope).get("accept-encoding", ""), self.encodings
+        )
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressedResponder(
+            scope, send, encoding, self.levels[encoding], self.minimum_size
+        )
+        await self.app(scope, receive, responder.send)
+
+
+def _encoder(encoding: str, level: int) -> Encoder:
+    if encoding == "br":
+        return BrotliEncoder(level)
+    if encoding == "zstd":
+        return ZstdEncoder(level)
+    return GzipEncoder(level)
+
+
+class _CompressedResponder:
+    def __init__(
+        self, scope: Scope, send: Send, encoding: str, level: int, minimum_size: int
+    ) -> None:
+        self.scope = scope
+        self._send = send
+        self.encoding = encoding
+        self.level = level
+        self.minimum_size = minimum_size
+        self.start: Message | None = None
+        self.encoder: Encoder | None = None
+        self.passthrough = False
+        self.original_size = 0
+        self.compressed_size = 0
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+        body: bytes = message.get("body", b"")
+        more_body: bool = message.get("more_body", False)
+        if self.encoder is None:
+            assert self.start is not None
+            start, self.start = self.start, None
+            headers = MutableHeaders(scope=start)
+            if not self._should_compress(start, headers, body, more_body):
+                self.passthrough = True
+                await self._send(start)
+                await self._send(message)
+                return
+            self.encoder = _encoder(self.encoding, self.level)
+            self._set_headers(headers)
+            if not more_body:
+                compressed = self.encoder.compress(body) + self.encoder.finish()
+                headers["Content-Length"] = str(len(compressed))
+                await self._send(start)
+                await self._send({**message, "body": compressed})
+                self._observe(len(body), len(compressed))
+                return
+            del headers["Content-Length"]
+            await self._send(start)
+        compressed = self.encoder.compress(body)
+        compressed += self.encoder.flush() if more_body else self.encoder.finish()
+        self.original_size += len(body)
+        self.compressed_size += len(compressed)
+        await self._send({**message, "body": compressed})
+        if not more_body:
+            self._observe(self.original_size, self.compressed_size)
+
+    def _should_compress(
+        self, start: Message, headers: MutableHeaders, body: bytes, more_body: bool
+    ) -> bool:
+        if start["status"] in (204, 304) or "content-encoding" in headers:
+            return False
+        if not is_compressible(headers.get("content-type", "")):
+            return False
+        headers.add_vary_header("Accept-Encoding")
+        return more_body or len(body) >= self.minimum_size
+
+    def _set_headers(self, headers: MutableHeaders) -> None:
+        headers["Content-Encoding"] = self.encoding
+        etag = headers.get("etag")
+        # The bytes differ from the uncompressed representation
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+
+    def _observe(self, original_size: int, compressed_size: int) -> None:
+        route = route_label(self.scope)
+        RESPONSE_BYTES.inc(route, self.encoding, "original", amount=original_size)
+        RESPONSE_BYTES.inc(route, self.encoding, "compressed", amount=compressed_size)
+        if original_size:
+            COMPRESSION_RATIO.observe(
+                compressed_size / original_size, route, self.encoding
+            )
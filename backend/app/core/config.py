@@ -34,8 +34,73 @@ class Settings(BaseSettings):
     SECRET_KEY: str = secrets.token_urlsafe(32)
     # 60 minutes * 24 hours * 8 days = 8 days
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8
+    # The id, is_active and is_superuser of authenticated users are cached
+    # this long per worker, 0 disables the cache. Changes made through the
+    # user routes apply at once on the worker that served them
+    AUTH_CACHE_TTL_SECONDS: float = 30
+    AUTH_CACHE_MAX_ENTRIES: int = 10_000
+    # Put is_active, is_superuser and token_version into access tokens, so
+    # read-only routes can authorize from the token without loading the user.
+    # Role changes revoke older tokens within TOKEN_REVOCATION_REFRESH_SECONDS
+    AUTH_TOKEN_CLAIMS: bool = False
+    TOKEN_REVOCATION_REFRESH_SECONDS: float = 5
+    # Stored hashes with another cost are rehashed on the next login
+    PASSWORD_BCRYPT_ROUNDS: int = 12
+    # Processes hashing passwords, per worker. 0 hashes on the request thread
+    PASSWORD_HASH_WORKERS: int = 1
+    # Password checks waiting or running per worker beyond which requests
+    # needing one are rejected with a 503
+    PASSWORD_HASH_MAX_QUEUE: int = 32
+    # Token buckets of login attempts per email and per client IP, checked
+    # before hashing. A rejected attempt also spends, up to one token of debt
+    LOGIN_RATE_LIMIT: bool = True
+    LOGIN_EMAIL_BURST: int = 10
+    LOGIN_EMAIL_PER_MINUTE: float = 5
+    LOGIN_IP_BURST: int = 100
+    LOGIN_IP_PER_MINUTE: float = 60
+    # Proxies, as addresses or networks, trusted to report the client address
+    # in X-Forwarded-For, such as Traefik's. "*" trusts any. The Dockerfile
+    # passes the same list to the server
+    FORWARDED_ALLOW_IPS: Annotated[list[str] | str, BeforeValidator(parse_cors)] = [
+        "127.0.0.1"
+    ]
     FRONTEND_HOST: str = "http://localhost:5173"
     ENVIRONMENT: Literal["local", "staging", "production"] = "local"
+    # Estimated list counts below this many rows are replaced by an exact,
+    # capped count since planner estimates are unreliable for small sets
+    COUNT_ESTIMATE_CAP: int = 1000
+    # Serve the todo, subtodo, item, user and login routes from async handlers
+    # on an AsyncEngine instead of sync handlers on the threadpool
+    ASYNC_DB: bool = False
+    # Select only the public columns of listed todos and serialize them with
+    # orjson, skipping the ORM objects and the pydantic models
+    FAST_LIST_RESPONSES: bool = False
+    # Tombstones of deleted todos and subtodos are purged after this long, an
+    # older /todos/changes token gets a 410 and the client syncs from scratch
+    TOMBSTONE_RETENTION_DAYS: int = 30
+    # Responses of at least COMPRESSION_MIN_SIZE bytes are compressed with the
+    # encoding the client prefers among gzip, and br and zstd when the brotli
+    # and zstandard packages are installed. Streamed responses always are
+    COMPRESSION: bool = True
+    COMPRESSION_MIN_SIZE: int = 500
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    COMPRESSION_ZSTD_LEVEL: int = 3
+    # Cache the responses of single todos and of subtodo lists, per owner.
+    # "memory" keeps them in each worker, which drops them when another
+    # worker's change notification arrives. "redis" shares them between the
+    # workers and needs the redis package
+    READ_CACHE: Literal["none", "memory", "redis"] = "none"
+    READ_CACHE_TTL_SECONDS: float = 60
+    READ_CACHE_MAX_ENTRIES: int = 10_000
+    READ_CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+    READ_CACHE_REDIS_TIMEOUT_SECONDS: float = 0.1
+    # Count requests, their latency and response size per route in /metrics
+    HTTP_METRICS: bool = True
+    # Directory where every worker writes its metrics each interval, so that
+    # /metrics reports the sum over the workers. Empty it before starting
+    METRICS_MULTIPROC_DIR: str | None = None
+    METRICS_MULTIPROC_INTERVAL_SECONDS: float = 1
 
     BACKEND_CORS_ORIGINS: Annotated[
         list[AnyUrl] | str, BeforeValidator(parse_cors)
@@ -55,6 +120,26 @@ class Settings(BaseSettings):
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str = ""
     POSTGRES_DB: str = ""
+    # Every worker process has its own pool, so Postgres may see up to
+    # workers * (POSTGRES_POOL_SIZE + POSTGRES_MAX_OVERFLOW) connections.
+    # "null" opens a connection per checkout, "pgbouncer" does the same and
+    # also disables prepared statements for PgBouncer in transaction mode
+    POSTGRES_POOL_MODE: Literal["queue", "null", "pgbouncer"] = "queue"
+    POSTGRES_POOL_SIZE: int = 5
+    POSTGRES_MAX_OVERFLOW: int = 10
+    POSTGRES_POOL_TIMEOUT: float = 30
+    # Seconds after which a pooled connection is replaced, -1 keeps it forever
+    POSTGRES_POOL_RECYCLE: int = -1
+    POSTGRES_POOL_PRE_PING: bool = False
+    # Read replicas of POSTGRES_DB as "host" or "host:port", comma separated.
+    # GET routes spread their reads over them and fall back to the primary
+    POSTGRES_REPLICA_SERVERS: Annotated[
+        list[str] | str, BeforeValidator(parse_cors)
+    ] = []
+    # A user's reads stay on the primary this long after they wrote
+    REPLICA_READ_YOUR_WRITES_SECONDS: float = 5
+    # How long a replica that failed to connect is skipped
+    REPLICA_RETRY_SECONDS: float = 30
 
     @computed_field  # type: ignore[prop-decorator]
     @property
@@ -68,6 +153,24 @@ class Settings(BaseSettings):
             path=self.POSTGRES_DB,
         )
 
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def SQLALCHEMY_REPLICA_URIS(self) -> list[MultiHostUrl]:
+        uris = []
+        for server in self.POSTGRES_REPLICA_SERVERS:
+            host, _, port = server.partition(":")
+            uris.append(
+                MultiHostUrl.build(
+                    scheme="postgresql+psycopg",
+                    username=self.POSTGRES_USER,
+                    password=self.POSTGRES_PASSWORD,
+                    host=host,
+                    port=int(port) if port else self.POSTGRES_PORT,
+                    path=self.POSTGRES_DB,
+                )
+            )
+        return uris
+
     SMTP_TLS: bool = True
     SMTP_SSL: bool = False
     SMTP_PORT: int = 587
@@ -85,6 +188,17 @@ class Settings(BaseSettings):
         return self
 
     EMAIL_RESET_TOKEN_EXPIRE_HOURS: int = 48
+    # Emails are queued in the emailoutbox table and sent in batches, over one
+    # SMTP connection per batch. A failed email is retried after
+    # EMAIL_RETRY_SECONDS, doubled on each attempt, until EMAIL_MAX_ATTEMPTS
+    EMAIL_BATCH_SIZE: int = 50
+    EMAIL_POLL_SECONDS: float = 10
+    EMAIL_RETRY_SECONDS: float = 30
+    EMAIL_MAX_ATTEMPTS: int = 8
+    # Emails given up on are kept this long, without their body, then deleted
+    EMAIL_OUTBOX_RETENTION_DAYS: int = 7
+    # Directory where compiled email templates are cached across restarts
+    EMAIL_TEMPLATES_BYTECODE_DIR: str | None = None
 
     @computed_field  # type: ignore[prop-decorator]
     @property
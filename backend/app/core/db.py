@@ -1,10 +1,265 @@
+import itertools
+import math
+import time
+import uuid
+from collections.abc import Iterable
+from http.cookies import SimpleCookie
+from typing import Any
+
+from sqlalchemy import Engine, event, exc
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import Session as SASession
+from sqlalchemy.pool import (
+    AsyncAdaptedQueuePool,
+    ConnectionPoolEntry,
+    NullPool,
+    Pool,
+    QueuePool,
+)
 from sqlmodel import Session, create_engine, select
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from app import crud
 from app.core.config import settings
+from app.core.metrics import Counter, Histogram, gauge_lines, register_collector
 from app.models import User, UserCreate
 
-engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent getting a connection from the pool, opening it included.",
+    ["pool"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+POOL_CHECKOUT_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts_total",
+    "Checkouts that gave up after POSTGRES_POOL_TIMEOUT.",
+    ["pool"],
+)
+_engines: list[Engine] = []
+
+
+class _InstrumentedPool(Pool):
+    def _do_get(self) -> ConnectionPoolEntry:
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            POOL_CHECKOUT_TIMEOUTS.inc(self.logging_name or "")
+            raise
+        finally:
+            POOL_CHECKOUT_WAIT.observe(
+                time.perf_counter() - start, self.logging_name or ""
+            )
+
+
+class InstrumentedQueuePool(_InstrumentedPool, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPool, AsyncAdaptedQueuePool):
+    pass
+
+
+class InstrumentedNullPool(_InstrumentedPool, NullPool):
+    pass
+
+
+def engine_options(
+    *, name: str, is_async: bool = False, pre_ping: bool | None = None
+) -> dict[str, Any]:
+    """
+    Pool options for an engine, following the POSTGRES_POOL_* settings.
+    """
+    options: dict[str, Any] = {
+        "pool_logging_name": name,
+        "pool_pre_ping": settings.POSTGRES_POOL_PRE_PING
+        if pre_ping is None
+        else pre_ping,
+    }
+    if settings.POSTGRES_POOL_MODE == "queue":
+        options.update(
+            poolclass=InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+            pool_size=settings.POSTGRES_POOL_SIZE,
+            max_overflow=settings.POSTGRES_MAX_OVERFLOW,
+            pool_timeout=settings.POSTGRES_POOL_TIMEOUT,
+            pool_recycle=settings.POSTGRES_POOL_RECYCLE,
+        )
+    else:
+        options["poolclass"] = InstrumentedNullPool
+    if settings.POSTGRES_POOL_MODE == "pgbouncer":
+        # Server side prepared statements don't survive PgBouncer handing
+        # each transaction to a different server connection
+        options["connect_args"] = {"prepare_threshold": None}
+    return options
+
+
+def _collect_pools() -> Iterable[str]:
+    queue_pools = [
+        engine.pool for engine in _engines if isinstance(engine.pool, QueuePool)
+    ]
+    yield from gauge_lines(
+        "db_pool_connections_in_use",
+        "Connections currently checked out of the pool.",
+        ["pool"],
+        [((pool.logging_name or "",), pool.checkedout()) for pool in queue_pools],
+    )
+    yield from gauge_lines(
+        "db_pool_connections_idle",
+        "Connections idle in the pool.",
+        ["pool"],
+        [((pool.logging_name or "",), pool.checkedin()) for pool in queue_pools],
+    )
+    yield from gauge_lines(
+        "db_pool_connections_max",
+        "Most connections the pool opens, overflow included.",
+        ["pool"],
+        [
+            ((pool.logging_name or "",), pool.size() + settings.POSTGRES_MAX_OVERFLOW)
+            for pool in queue_pools
+        ],
+    )
+
+
+register_collector(_collect_pools)
+
+engine = create_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI), **engine_options(name="primary")
+)
+# Only connects when the async routes are used, see settings.ASYNC_DB
+async_engine = create_async_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI),
+    **engine_options(name="primary_async", is_async=True),
+)
+_engines.extend([engine, async_engine.sync_engine])
+
+
+class ReplicaSet:
+    """
+    Round-robin over read replicas, skipping the ones that recently failed.
+    """
+
+    def __init__(self, engines: list[Engine]) -> None:
+        self.engines = engines
+        self._next = itertools.count()
+        self._down_until: dict[Engine, float] = {}
+
+    def candidates(self) -> list[Engine]:
+        """
+        Replicas to try in order, starting from the next one in turn.
+        """
+        if not self.engines:
+            return []
+        start = next(self._next) % len(self.engines)
+        now = time.monotonic()
+        rotated = self.engines[start:] + self.engines[:start]
+        return [engine for engine in rotated if self._down_until.get(engine, 0) <= now]
+
+    def is_replica(self, session: SASession) -> bool:
+        return session.bind in self.engines
+
+    def mark_down(self, engine: Engine) -> None:
+        self._down_until[engine] = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+
+
+def _replica_engine(name: str, uri: str) -> Engine:
+    # Pre-ping so a replica that went away is noticed on checkout, and give up
+    # connecting quickly to fail over to the next one
+    options = engine_options(name=name, pre_ping=True)
+    options["connect_args"] = {**options.get("connect_args", {}), "connect_timeout": 2}
+    return create_engine(uri, **options)
+
+
+replicas = ReplicaSet(
+    [
+        _replica_engine(f"replica_{i}", str(uri))
+        for i, uri in enumerate(settings.SQLALCHEMY_REPLICA_URIS)
+    ]
+)
+_engines.extend(replicas.engines)
+
+# Users that wrote recently, mapped to when their reads may leave the primary.
+# Only known to the worker that served the write, the last_write cookie
+# carries it to the others
+_recent_writers: dict[uuid.UUID, float] = {}
+_RECENT_WRITERS_MAX = 10_000
+
+LAST_WRITE_COOKIE = "last_write"
+# Key of the request state that get_db shares with the session
+REQUEST_STATE = "request_state"
+
+
+def mark_recent_write(user_id: uuid.UUID) -> None:
+    now = time.monotonic()
+    if len(_recent_writers) >= _RECENT_WRITERS_MAX:
+        for key, until in list(_recent_writers.items()):
+            if until <= now:
+                del _recent_writers[key]
+    _recent_writers[user_id] = now + settings.REPLICA_READ_YOUR_WRITES_SECONDS
+
+
+def wrote_recently(user_id: uuid.UUID, last_write: str | None = None) -> bool:
+    """
+    Whether `user_id` wrote within REPLICA_READ_YOUR_WRITES_SECONDS, through
+    this worker or, per the `last_write` cookie of the request, any other.
+    """
+    if _recent_writers.get(user_id, 0) > time.monotonic():
+        return True
+    try:
+        wrote_at = float(last_write or "")
+    except ValueError:
+        return False
+    # A time in the future is forged, don't let it pin reads to the primary
+    now = time.time()
+    return now - settings.REPLICA_READ_YOUR_WRITES_SECONDS < wrote_at <= now
+
+
+@event.listens_for(SASession, "after_commit")
+def _track_writer(session: SASession) -> None:
+    # get_current_user tags the sessions of authenticated requests
+    user_id = session.info.get("user_id")
+    if user_id is not None:
+        mark_recent_write(user_id)
+        if replicas.engines and (state := session.info.get(REQUEST_STATE)) is not None:
+            state[LAST_WRITE_COOKIE] = time.time()
+
+
+def _last_write_cookie(wrote_at: float) -> str:
+    cookie: SimpleCookie = SimpleCookie()
+    cookie[LAST_WRITE_COOKIE] = f"{wrote_at:.3f}"
+    morsel = cookie[LAST_WRITE_COOKIE]
+    morsel["max-age"] = math.ceil(settings.REPLICA_READ_YOUR_WRITES_SECONDS)
+    morsel["path"] = "/"
+    morsel["httponly"] = True
+    morsel["samesite"] = "lax"
+    morsel["secure"] = settings.ENVIRONMENT != "local"
+    return morsel.OutputString()
+
+
+class LastWriteMiddleware:
+    """
+    Set the last_write cookie on the responses of requests that committed a
+    write, so the next reads of the client stay on the primary whichever
+    worker serves them.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and (
+                wrote_at := scope.get("state", {}).get(LAST_WRITE_COOKIE)
+            ):
+                headers = MutableHeaders(scope=message)
+                headers.append("set-cookie", _last_write_cookie(wrote_at))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
 
 
 # make sure all SQLModel models are imported (app.models) before initializing DB
@@ -0,0 +1,261 @@
+import asyncio
+import logging
+import uuid
+from collections import defaultdict
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+
+import psycopg
+from psycopg.conninfo import make_conninfo
+from pydantic import ValidationError
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session as SASession
+from sqlmodel import Session, col, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.models import TodoChangeEvent, User
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "todo_changes"
+# Users changed or deleted, whose cached auth every worker drops
+USER_CHANNEL = "user_changes"
+HEARTBEAT_SECONDS = 15
+SUBSCRIBER_QUEUE_SIZE = 100
+MAX_RECONNECT_DELAY_SECONDS = 30
+
+# Session info key of the owners whose todos the transaction changed
+CHANGED_OWNERS = "changed_owners"
+
+
+def listen_conninfo() -> str:
+    """
+    Connection string for the LISTEN connections, which stay outside the
+    pools.
+    """
+    return make_conninfo(
+        host=settings.POSTGRES_SERVER,
+        port=settings.POSTGRES_PORT,
+        user=settings.POSTGRES_USER,
+        password=settings.POSTGRES_PASSWORD,
+        dbname=settings.POSTGRES_DB,
+    )
+
+
+def notify_change(*, session: Session, event: TodoChangeEvent) -> None:
+    """
+    Queue a change event on the session's transaction.
+
+    Postgres only delivers it when the transaction commits, and drops it on
+    rollback.
+    """
+    session.info.setdefault(CHANGED_OWNERS, set()).add(event.owner_id)
+    session.exec(select(func.pg_notify(CHANNEL, event.model_dump_json())))
+
+
+async def notify_change_async(*, session: AsyncSession, event: TodoChangeEvent) -> None:
+    session.info.setdefault(CHANGED_OWNERS, set()).add(event.owner_id)
+    await session.exec(select(func.pg_notify(CHANNEL, event.model_dump_json())))
+
+
+@event.listens_for(SASession, "before_commit")
+def _bump_todos_versions(session: SASession) -> None:
+    # Every commit changing an owner's todos changes their version, which
+    # max(updated_at) misses when the writes commit out of order
+    if owners := session.info.get(CHANGED_OWNERS):
+        session.execute(
+            update(User)
+            .where(col(User.id).in_(sorted(owners)))
+            .values(todos_version=col(User.todos_version) + 1)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def notify_user_change(*, session: Session, user_id: uuid.UUID) -> None:
+    """
+    Queue a notification that `user_id` changed on the session's transaction,
+    for the workers to drop their cached copies when it commits.
+    """
+    session.exec(select(func.pg_notify(USER_CHANNEL, str(user_id))))
+
+
+async def notify_user_change_async(
+    *, session: AsyncSession, user_id: uuid.UUID
+) -> None:
+    await session.exec(select(func.pg_notify(USER_CHANNEL, str(user_id))))
+
+
+class ChangeListener:
+    """
+    Fans out change notifications to the streams of this process.
+
+    A single LISTEN connection per process is opened on the first
+    subscription and reconnected with backoff if it drops.
+    """
+
+    def __init__(self) -> None:
+        # None asks the subscriber to resync, after it fell too far behind
+        self._subscribers: defaultdict[uuid.UUID, set[asyncio.Queue[str | None]]] = (
+            defaultdict(set)
+        )
+        self._handlers: list[Callable[[TodoChangeEvent], None]] = []
+        self._user_handlers: list[Callable[[uuid.UUID], None]] = []
+        self._reconnect_handlers: list[Callable[[], None]] = []
+        # Whether a connection was up before, any later one may have missed
+        # notifications
+        self._connected = False
+        self._task: asyncio.Task[None] | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _ensure_listening(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            if self._loop is not loop:
+                # Queues belong to one loop, a new one has nothing to resync
+                self._connected = False
+            self._loop = loop
+            self._task = loop.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        conninfo = listen_conninfo()
+        delay = 1
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    conninfo, autocommit=True
+                ) as connection:
+                    await connection.execute(f"LISTEN {CHANNEL}")
+                    await connection.execute(f"LISTEN {USER_CHANNEL}")
+                    delay = 1
+                    if self._connected:
+                        self._reconnected()
+                    self._connected = True
+                    async for notify in connection.notifies():
+                        if notify.channel == USER_CHANNEL:
+                            self._dispatch_user(notify.payload)
+                        else:
+                            self._dispatch(notify.payload)
+            except Exception as e:
+                # Anything but a cancellation reconnects, the subscribers and
+                # handlers depend on this task staying up
+                logger.error(f"change listener disconnected: {e!r}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY_SECONDS)
+
+    def _dispatch(self, payload: str) -> None:
+        try:
+            event = TodoChangeEvent.model_validate_json(payload)
+        except ValidationError as e:
+            logger.error(f"dropped invalid change event {payload!r}: {e}")
+            return
+        for handler in self._handlers:
+            try:
+                handler(event)
+            except Exception:
+                logger.exception(f"change handler {handler!r} failed")
+        for queue in self._subscribers.get(event.owner_id, ()):
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                self._resync(queue)
+
+    def _dispatch_user(self, payload: str) -> None:
+        try:
+            user_id = uuid.UUID(payload)
+        except ValueError:
+            logger.error(f"dropped invalid user change {payload!r}")
+            return
+        for handler in self._user_handlers:
+            try:
+                handler(user_id)
+            except Exception:
+                logger.exception(f"user change handler {handler!r} failed")
+
+    @staticmethod
+    def _resync(queue: asyncio.Queue[str | None]) -> None:
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    def _reconnected(self) -> None:
+        # Notifications sent while disconnected are lost
+        for handler in self._reconnect_handlers:
+            try:
+                handler()
+            except Exception:
+                logger.exception(f"reconnect handler {handler!r} failed")
+        for queues in self._subscribers.values():
+            for queue in queues:
+                self._resync(queue)
+
+    def watch(self, handler: Callable[[TodoChangeEvent], None]) -> None:
+        """
+        Call `handler` with the change events of every owner, including the
+        ones sent by this process.
+        """
+        if handler not in self._handlers:
+            self._handlers.append(handler)
+        self._ensure_listening()
+
+    def watch_users(self, handler: Callable[[uuid.UUID], None]) -> None:
+        """
+        Call `handler` with the id of every user changed or deleted, including
+        by this process.
+        """
+        if handler not in self._user_handlers:
+            self._user_handlers.append(handler)
+        self._ensure_listening()
+
+    def watch_reconnects(self, handler: Callable[[], None]) -> None:
+        """
+        Call `handler` whenever the connection is back after a drop, since
+        the events sent meanwhile are lost.
+        """
+        if handler not in self._reconnect_handlers:
+            self._reconnect_handlers.append(handler)
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        # A task of another loop can't be awaited, and stops with its loop
+        if task is None or self._loop is not asyncio.get_running_loop():
+            return
+        # The waits in psycopg can swallow a cancellation that arrives along
+        # with a notification, cancel until the task is done
+        while not task.done():
+            task.cancel()
+            await asyncio.wait([task], timeout=1)
+
+    @asynccontextmanager
+    async def subscribe(
+        self, owner_id: uuid.UUID
+    ) -> AsyncIterator[asyncio.Queue[str | None]]:
+        self._ensure_listening()
+        queue: asyncio.Queue[str | None] = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers[owner_id].add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers[owner_id].discard(queue)
+            if not self._subscribers[owner_id]:
+                del self._subscribers[owner_id]
+
+    async def stream(self, owner_id: uuid.UUID) -> AsyncIterator[str]:
+        """
+        Server-Sent Events for the changes to the todos of `owner_id`.
+        """
+        async with self.subscribe(owner_id) as queue:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if payload is None:
+                    yield "event: resync\ndata: {}\n\n"
+                else:
+                    yield f"event: change\ndata: {payload}\n\n"
+
+
+change_listener = ChangeListener()
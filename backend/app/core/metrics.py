@@ -0,0 +1,299 @@
+"""
+Minimal in-process metrics rendered in the Prometheus text format.
+
+Each worker process keeps its own values. With METRICS_MULTIPROC_DIR set,
+every worker also writes them to a file of that directory, and a scrape
+reports the sum over the files, so it sees all the workers.
+"""
+
+import bisect
+import logging
+import math
+import os
+import threading
+from collections.abc import Callable, Iterable, Sequence
+from pathlib import Path
+
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from starlette.types import Scope
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+Labels = tuple[str, ...]
+Collector = Callable[[], Iterable[str]]
+
+_collectors: list[Collector] = []
+
+
+def _format_labels(names: Sequence[str], values: Labels, **extra: str) -> str:
+    pairs = [*zip(names, values, strict=True), *extra.items()]
+    if not pairs:
+        return ""
+    body = ",".join(f'{name}="{value}"' for name, value in pairs)
+    return f"{{{body}}}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: dict[Labels, float] = {}
+        self._lock = threading.Lock()
+        _collectors.append(self.collect)
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def collect(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in list(self._values.items()):
+            yield (
+                f"{self.name}{_format_labels(self.labelnames, labels)} "
+                f"{_format_value(value)}"
+            )
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = (*sorted(buckets), math.inf)
+        # Per label set: the count of each bucket, made cumulative when
+        # collected, then the sum
+        self._values: dict[Labels, tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+        _collectors.append(self.collect)
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = ([0] * len(self.buckets), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def count(self, *labels: str) -> int:
+        counts, _ = self._values.get(labels, ([0], [0.0]))
+        return sum(counts)
+
+    def collect(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total) in list(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, list(counts), strict=True):
+                cumulative += count
+                label_text = _format_labels(
+                    self.labelnames, labels, le=_format_value(bound)
+                )
+                yield f"{self.name}_bucket{label_text} {cumulative}"
+            label_text = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{label_text} {_format_value(total[0])}"
+            yield f"{self.name}_count{label_text} {cumulative}"
+
+
+class Gauge:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: dict[Labels, float] = {}
+        self._lock = threading.Lock()
+        _collectors.append(self.collect)
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def collect(self) -> Iterable[str]:
+        return gauge_lines(
+            self.name, self.help, self.labelnames, list(self._values.items())
+        )
+
+
+def gauge_lines(
+    name: str,
+    help: str,
+    labelnames: Sequence[str],
+    values: Iterable[tuple[Labels, float]],
+) -> Iterable[str]:
+    """
+    Render a gauge whose values are read when scraped.
+    """
+    yield f"# HELP {name} {help}"
+    yield f"# TYPE {name} gauge"
+    for labels, value in values:
+        yield f"{name}{_format_labels(labelnames, labels)} {_format_value(value)}"
+
+
+def register_collector(collector: Collector) -> None:
+    _collectors.append(collector)
+
+
+def render_metrics() -> str:
+    return "".join(f"{line}\n" for collect in _collectors for line in collect())
+
+
+def route_label(scope: Scope) -> str:
+    """
+    Template of the route that served the request, like `/todos/{id}`, so
+    the labels don't grow with the paths requested.
+    """
+    route = scope.get("route")
+    return getattr(route, "path", None) or "other"
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def merge_metrics(texts: Iterable[tuple[str, bool]]) -> str:
+    """
+    Sum the samples of several renderings of the metrics, given with whether
+    their process is still alive.
+
+    Counters and histograms of exited processes still count, so the totals
+    never go down. Their gauges are left out.
+    """
+    # Per metric: its help and type lines, then its samples in order
+    families: dict[str, tuple[list[str], dict[str, float]]] = {}
+    for text, alive in texts:
+        samples: dict[str, float] = {}
+        kind = ""
+        for line in text.splitlines():
+            if line.startswith("# "):
+                _, keyword, name, rest = line.split(" ", 3)
+                header, samples = families.setdefault(name, ([], {}))
+                if not any(h.startswith(f"# {keyword} ") for h in header):
+                    header.append(line)
+                if keyword == "TYPE":
+                    kind = rest
+                continue
+            if not line or (kind == "gauge" and not alive):
+                continue
+            sample, _, value = line.rpartition(" ")
+            samples[sample] = samples.get(sample, 0) + float(value)
+    return "".join(
+        "".join(f"{line}\n" for line in header)
+        + "".join(
+            f"{sample} {_format_value(value)}\n" for sample, value in samples.items()
+        )
+        for header, samples in families.values()
+    )
+
+
+class MultiprocessWriter:
+    """
+    Writes the metrics of this process to `directory` every `interval`
+    seconds, for the scrapes served by the other workers.
+    """
+
+    def __init__(self, directory: str, interval: float) -> None:
+        self.directory = Path(directory)
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def path(self) -> Path:
+        return self.directory / f"metrics_{os.getpid()}.prom"
+
+    def write(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_suffix(".tmp")
+        temporary.write_text(render_metrics())
+        # Readers see the whole previous file or the whole new one
+        temporary.replace(self.path)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                logger.error(f"writing metrics failed: {e}")
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="metrics-writer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.write()
+
+    def render(self) -> str:
+        """
+        The metrics summed over the files of every worker, with the current
+        values of this one.
+        """
+        self.write()
+        texts = []
+        for path in sorted(self.directory.glob("metrics_*.prom")):
+            try:
+                pid = int(path.stem.removeprefix("metrics_"))
+                texts.append((path.read_text(), _alive(pid)))
+            except (ValueError, OSError):
+                continue
+        return merge_metrics(texts)
+
+
+multiprocess_writer = (
+    MultiprocessWriter(
+        settings.METRICS_MULTIPROC_DIR, settings.METRICS_MULTIPROC_INTERVAL_SECONDS
+    )
+    if settings.METRICS_MULTIPROC_DIR
+    else None
+)
+
+
+def metrics(_: Request) -> PlainTextResponse:
+    text = multiprocess_writer.render() if multiprocess_writer else render_metrics()
+    return PlainTextResponse(
+        text, media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
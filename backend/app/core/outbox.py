@@ -0,0 +1,237 @@
+"""
+Durable queue of outgoing emails.
+
+Routes add emails to the emailoutbox table and return. A thread in each
+worker process sends them in batches over one SMTP connection per batch,
+and retries failures with exponential backoff.
+"""
+
+import logging
+import smtplib
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any
+
+import psycopg
+from emails.backend.smtp import SMTPBackend  # type: ignore
+from emails.backend.smtp.exceptions import SMTPConnectNetworkError  # type: ignore
+from sqlalchemy import Update, delete, update
+from sqlmodel import Session, col, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.events import listen_conninfo
+from app.core.metrics import Counter
+from app.models import EmailOutbox
+from app.utils import email_message, smtp_options
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "email_outbox"
+# A claimed email is sent again if its worker didn't report back by then
+LEASE = timedelta(minutes=5)
+MAX_RETRY_DELAY = timedelta(hours=6)
+# Seconds between two purges of the emails given up on
+PURGE_INTERVAL = 3600
+
+EMAILS_SENT = Counter(
+    "emails_sent_total", "Emails handled by the outbox, by result.", ["result"]
+)
+
+
+def enqueue_email(
+    *, session: Session, email_to: str, subject: str, html_content: str
+) -> None:
+    """
+    Queue an email in the session's transaction. The caller commits, which
+    wakes up the outbox worker.
+    """
+    session.add(
+        EmailOutbox(email_to=email_to, subject=subject, html_content=html_content)
+    )
+    session.exec(select(func.pg_notify(CHANNEL, "")))
+
+
+async def enqueue_email_async(
+    *, session: AsyncSession, email_to: str, subject: str, html_content: str
+) -> None:
+    session.add(
+        EmailOutbox(email_to=email_to, subject=subject, html_content=html_content)
+    )
+    await session.exec(select(func.pg_notify(CHANNEL, "")))
+
+
+def _claim_statement(now: datetime, limit: int) -> Update:
+    due = (
+        select(EmailOutbox.id)
+        .where(col(EmailOutbox.next_attempt_at) <= now)
+        .order_by(col(EmailOutbox.next_attempt_at))
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        # A CTE runs once, a subquery may be rerun by the planner and then
+        # claim more than `limit` rows
+        .cte("due")
+    )
+    return (
+        update(EmailOutbox)
+        .where(col(EmailOutbox.id) == due.c.id)
+        .values(attempts=col(EmailOutbox.attempts) + 1, next_attempt_at=now + LEASE)
+        .returning(EmailOutbox)
+    )
+
+
+def retry_delay(attempts: int) -> timedelta:
+    delay = timedelta(seconds=settings.EMAIL_RETRY_SECONDS * 2 ** (attempts - 1))
+    return min(delay, MAX_RETRY_DELAY)
+
+
+def _send(emails: list[EmailOutbox]) -> dict[uuid.UUID, str | None]:
+    """
+    Send `emails` over a single SMTP connection.
+
+    Returns the error of each email, None when it was sent. When the relay
+    can't be reached the rest of the batch isn't tried.
+    """
+    errors: dict[uuid.UUID, str | None] = {}
+    unreachable: str | None = None
+    backend = SMTPBackend(**smtp_options())
+    try:
+        for email in emails:
+            if unreachable is not None:
+                errors[email.id] = unreachable
+                continue
+            message = email_message(
+                subject=email.subject, html_content=email.html_content
+            )
+            response: Any = message.send(to=email.email_to, smtp=backend)
+            errors[email.id] = None if response.success else repr(response.error)
+            if isinstance(
+                response.error,
+                SMTPConnectNetworkError | smtplib.SMTPServerDisconnected,
+            ):
+                unreachable = errors[email.id]
+    finally:
+        backend.close()
+    return errors
+
+
+def send_due_emails(limit: int | None = None) -> int:
+    """
+    Send a batch of due emails and record the results.
+
+    Returns the number of emails in the batch.
+    """
+    now = datetime.now()
+    with Session(engine, expire_on_commit=False) as session:
+        statement = _claim_statement(now, limit or settings.EMAIL_BATCH_SIZE)
+        emails = list(session.execute(statement).scalars())
+        session.commit()
+    if not emails:
+        return 0
+    errors = _send(emails)
+    with Session(engine) as session:
+        sent = [id for id, error in errors.items() if error is None]
+        if sent:
+            session.execute(delete(EmailOutbox).where(col(EmailOutbox.id).in_(sent)))
+        for email in emails:
+            error = errors[email.id]
+            if error is None:
+                continue
+            gave_up = email.attempts >= settings.EMAIL_MAX_ATTEMPTS
+            logger.warning(
+                f"email {email.id} to {email.email_to} failed "
+                f"(attempt {email.attempts}): {error}"
+            )
+            values: dict[str, Any] = {"last_error": error}
+            if gave_up:
+                # The body may hold a password or a reset link, don't keep it
+                values.update(next_attempt_at=None, html_content="")
+            else:
+                values["next_attempt_at"] = datetime.now() + retry_delay(email.attempts)
+            session.execute(
+                update(EmailOutbox)
+                .where(col(EmailOutbox.id) == email.id)
+                .values(**values)
+            )
+            EMAILS_SENT.inc("dropped" if gave_up else "retry")
+        session.commit()
+    EMAILS_SENT.inc("sent", amount=len(sent))
+    return len(emails)
+
+
+def purge_dropped_emails() -> int:
+    """
+    Delete the emails given up on more than EMAIL_OUTBOX_RETENTION_DAYS ago.
+
+    Returns the number of emails deleted.
+    """
+    cutoff = datetime.now() - timedelta(days=settings.EMAIL_OUTBOX_RETENTION_DAYS)
+    with Session(engine) as session:
+        result = session.execute(
+            delete(EmailOutbox).where(
+                col(EmailOutbox.next_attempt_at).is_(None),
+                col(EmailOutbox.created_at) < cutoff,
+            )
+        )
+        session.commit()
+    return int(result.rowcount)  # type: ignore[attr-defined]
+
+
+class OutboxWorker:
+    """
+    Sends the queued emails from a background thread.
+
+    The thread sends while there are due emails, then waits for a
+    notification of a new one, or EMAIL_POLL_SECONDS for the retries.
+    """
+
+    def __init__(self) -> None:
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._purged_at = 0.0
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="email-outbox", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                with psycopg.connect(listen_conninfo(), autocommit=True) as connection:
+                    connection.execute(f"LISTEN {CHANNEL}")
+                    while not self._stop.is_set():
+                        while send_due_emails() == settings.EMAIL_BATCH_SIZE:
+                            if self._stop.is_set():
+                                return
+                        if time.monotonic() - self._purged_at >= PURGE_INTERVAL:
+                            purge_dropped_emails()
+                            self._purged_at = time.monotonic()
+                        self._wait(connection)
+            except Exception as e:
+                logger.error(f"email outbox worker failed: {e}")
+                self._stop.wait(settings.EMAIL_POLL_SECONDS)
+
+    def _wait(self, connection: psycopg.Connection[Any]) -> None:
+        waited = 0.0
+        # Short waits so that stop() doesn't block for the whole poll interval
+        while waited < settings.EMAIL_POLL_SECONDS and not self._stop.is_set():
+            for _ in connection.notifies(timeout=1, stop_after=1):
+                return
+            waited += 1
+
+
+outbox_worker = OutboxWorker()
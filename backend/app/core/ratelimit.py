@@ -0,0 +1,115 @@
+"""
+Token buckets of login attempts, kept in Postgres so all workers share them.
+"""
+
+import hashlib
+import time
+from datetime import timedelta
+
+from sqlalchemy import Connection, Delete, Insert, delete, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlmodel import col
+
+from app.core.config import settings
+from app.core.metrics import Counter
+from app.models import LoginBucket
+
+LOGIN_RATE_LIMITED = Counter(
+    "login_rate_limited_total",
+    "Login attempts rejected before checking the password.",
+    ["bucket"],
+)
+
+# Buckets untouched this long are full again and can be dropped
+PRUNE_INTERVAL = 600
+
+_pruned_at = time.monotonic()
+
+
+def _email_key(email: str) -> str:
+    # The username is unvalidated form input, hash it to bound the key length
+    digest = hashlib.blake2b(email.lower().encode(), digest_size=16).hexdigest()
+    return f"email:{digest}"
+
+
+def _buckets(email: str, ip: str | None) -> list[tuple[str, str, int, float]]:
+    buckets = [
+        (
+            "email",
+            _email_key(email),
+            settings.LOGIN_EMAIL_BURST,
+            settings.LOGIN_EMAIL_PER_MINUTE / 60,
+        )
+    ]
+    if ip:
+        buckets.append(
+            (
+                "ip",
+                f"ip:{ip}",
+                settings.LOGIN_IP_BURST,
+                settings.LOGIN_IP_PER_MINUTE / 60,
+            )
+        )
+    return buckets
+
+
+def _take_statement(key: str, burst: int, rate: float) -> Insert:
+    elapsed = func.extract("epoch", func.now() - col(LoginBucket.updated_at))
+    refilled = func.least(burst, col(LoginBucket.tokens) + elapsed * rate)
+    statement = insert(LoginBucket).values(
+        key=key, tokens=burst - 1, updated_at=func.now()
+    )
+    return statement.on_conflict_do_update(
+        index_elements=[col(LoginBucket.key)],
+        set_={"tokens": func.greatest(refilled - 1, -1), "updated_at": func.now()},
+    ).returning(col(LoginBucket.tokens))
+
+
+def _prune_statement() -> Delete | None:
+    global _pruned_at
+    if time.monotonic() - _pruned_at < PRUNE_INTERVAL:
+        return None
+    _pruned_at = time.monotonic()
+    full_after = max(
+        settings.LOGIN_EMAIL_BURST / settings.LOGIN_EMAIL_PER_MINUTE,
+        settings.LOGIN_IP_BURST / settings.LOGIN_IP_PER_MINUTE,
+    )
+    return delete(LoginBucket).where(
+        col(LoginBucket.updated_at) < func.now() - timedelta(minutes=full_after)
+    )
+
+
+def _retry_after(name: str, tokens: float, rate: float) -> float:
+    if tokens >= 0:
+        return 0
+    LOGIN_RATE_LIMITED.inc(name)
+    # Until the bucket is back to one token
+    return (1 - tokens) / rate
+
+
+def take_login_attempt(connection: Connection, *, email: str, ip: str | None) -> float:
+    """
+    Spend a login attempt from the buckets of `email` and `ip`.
+
+    Returns 0 when the attempt is allowed, otherwise the seconds to wait.
+    """
+    retry_after = 0.0
+    for name, key, burst, rate in _buckets(email, ip):
+        tokens = connection.execute(_take_statement(key, burst, rate)).scalar_one()
+        retry_after = max(retry_after, _retry_after(name, tokens, rate))
+    if (prune := _prune_statement()) is not None:
+        connection.execute(prune)
+    return retry_after
+
+
+async def take_login_attempt_async(
+    connection: AsyncConnection, *, email: str, ip: str | None
+) -> float:
+    retry_after = 0.0
+    for name, key, burst, rate in _buckets(email, ip):
+        result = await connection.execute(_take_statement(key, burst, rate))
+        retry_after = max(retry_after, _retry_after(name, result.scalar_one(), rate))
+    if (prune := _prune_statement()) is not None:
+        await connection.execute(prune)
+    return retry_after
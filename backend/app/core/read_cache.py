@@ -0,0 +1,298 @@
+"""
+Read-through cache of todo responses, keyed by owner and object.
+
+Each owner has a generation token, stored next to the entries, and entries
+are only served under the current token. A committed write that notified a
+change replaces the owner's token, which drops all their entries at once,
+including ones being filled by reads that started before the write. Other
+workers replace theirs when the change notification reaches them.
+"""
+
+import logging
+import secrets
+import time
+import uuid
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Protocol
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session as SASession
+from starlette.concurrency import run_in_threadpool
+
+from app.core.cache import CACHE_REQUESTS, TTLCache
+from app.core.config import settings
+from app.core.events import CHANGED_OWNERS
+from app.core.metrics import Counter, Histogram
+from app.models import TodoChangeEvent
+
+logger = logging.getLogger(__name__)
+
+CACHE_NAME = "todo_reads"
+
+READ_CACHE_INVALIDATIONS = Counter(
+    "read_cache_invalidations_total",
+    "Owners whose cached reads were dropped, by where the change came from.",
+    ["source"],
+)
+READ_CACHE_HIT_AGE = Histogram(
+    "read_cache_hit_age_seconds",
+    "Age of the cached reads served.",
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+READ_CACHE_ERRORS = Counter(
+    "read_cache_errors_total",
+    "Cache backend calls that failed, the reads then go to the database.",
+)
+
+
+class CacheBackend(Protocol):
+    # Whether all the workers see the same entries
+    shared: bool
+
+    def get_many(self, keys: Sequence[str]) -> list[bytes | None]: ...
+
+    def set(self, key: str, value: bytes) -> None: ...
+
+    # Store `value` unless `key` is set, and return the stored value
+    def add(self, key: str, value: bytes) -> bytes: ...
+
+
+class MemoryBackend:
+    shared = False
+
+    def __init__(self, *, maxsize: int, ttl: float) -> None:
+        self._entries: TTLCache[str, bytes] = TTLCache(
+            name=f"{CACHE_NAME}_memory", maxsize=maxsize, ttl=ttl
+        )
+
+    def get_many(self, keys: Sequence[str]) -> list[bytes | None]:
+        return [self._entries.get(key) for key in keys]
+
+    def set(self, key: str, value: bytes) -> None:
+        self._entries.set(key, value)
+
+    def add(self, key: str, value: bytes) -> bytes:
+        current = self._entries.get(key)
+        if current is not None:
+            return current
+        self._entries.set(key, value)
+        return value
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class RedisBackend:
+    """
+    Entries in Redis, or any server speaking its protocol, shared by the
+    workers. Needs the redis package.
+    """
+
+    shared = True
+
+    def __init__(self, client: Any, *, ttl: float) -> None:
+        self._client = client
+        self._ttl_ms = int(ttl * 1000)
+
+    @classmethod
+    def from_url(cls, url: str, *, ttl: float, timeout: float) -> "RedisBackend":
+        import redis
+
+        client = redis.Redis.from_url(
+            url, socket_timeout=timeout, socket_connect_timeout=timeout
+        )
+        return cls(client, ttl=ttl)
+
+    def get_many(self, keys: Sequence[str]) -> list[bytes | None]:
+        return list(self._client.mget(keys))
+
+    def set(self, key: str, value: bytes) -> None:
+        self._client.set(key, value, px=self._ttl_ms)
+
+    def add(self, key: str, value: bytes) -> bytes:
+        pipeline = self._client.pipeline()
+        pipeline.set(key, value, px=self._ttl_ms, nx=True)
+        pipeline.get(key)
+        _, current = pipeline.execute()
+        return current or value
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+    last_modified: datetime | None
+
+
+def _encode(token: bytes, cached: CachedResponse) -> bytes:
+    last_modified = cached.last_modified.isoformat() if cached.last_modified else ""
+    header = f"{time.time()}\n{cached.etag}\n{last_modified}\n"
+    return token + b"\n" + header.encode() + cached.body
+
+
+def _decode(value: bytes) -> tuple[bytes, float, CachedResponse]:
+    token, cached_at, etag, last_modified, body = value.split(b"\n", 4)
+    cached = CachedResponse(
+        body=body,
+        etag=etag.decode(),
+        last_modified=(
+            datetime.fromisoformat(last_modified.decode()) if last_modified else None
+        ),
+    )
+    return token, float(cached_at), cached
+
+
+class ReadCache:
+    def __init__(self, backend: CacheBackend | None) -> None:
+        self.backend = backend
+
+    @staticmethod
+    def _generation_key(owner_id: uuid.UUID) -> str:
+        return f"{CACHE_NAME}:generation:{owner_id}"
+
+    @staticmethod
+    def _entry_key(owner_id: uuid.UUID, key: str) -> str:
+        return f"{CACHE_NAME}:{owner_id}:{key}"
+
+    def get(
+        self, owner_id: uuid.UUID | None, key: str
+    ) -> tuple[CachedResponse | None, bytes | None]:
+        """
+        Look up the entry `key` of `owner_id`.
+
+        Returns the entry, or None, and the generation token to store the
+        entry under after reading it from the database. The token is None
+        when the read can't be cached.
+        """
+        if self.backend is None or owner_id is None:
+            return None, None
+        generation_key = self._generation_key(owner_id)
+        try:
+            token, value = self.backend.get_many(
+                [generation_key, self._entry_key(owner_id, key)]
+            )
+            if token is None:
+                token = self.backend.add(generation_key, secrets.token_hex(8).encode())
+        except Exception as e:
+            READ_CACHE_ERRORS.inc()
+            logger.warning(f"read cache lookup failed: {e}")
+            return None, None
+        if value is not None:
+            entry_token, cached_at, cached = _decode(value)
+            if entry_token == token:
+                CACHE_REQUESTS.inc(CACHE_NAME, "hit")
+                READ_CACHE_HIT_AGE.observe(time.time() - cached_at)
+                return cached, token
+        CACHE_REQUESTS.inc(CACHE_NAME, "miss")
+        return None, token
+
+    def set(
+        self,
+        owner_id: uuid.UUID,
+        key: str,
+        token: bytes | None,
+        cached: CachedResponse,
+    ) -> None:
+        if self.backend is None or token is None:
+            return
+        try:
+            self.backend.set(self._entry_key(owner_id, key), _encode(token, cached))
+        except Exception as e:
+            READ_CACHE_ERRORS.inc()
+            logger.warning(f"read cache store failed: {e}")
+
+    async def get_async(
+        self, owner_id: uuid.UUID | None, key: str
+    ) -> tuple[CachedResponse | None, bytes | None]:
+        """
+        Same as `get`, for async routes. Backends doing network I/O are
+        called from the thread pool to keep the event loop free.
+        """
+        if self.backend is None or isinstance(self.backend, MemoryBackend):
+            return self.get(owner_id, key)
+        return await run_in_threadpool(self.get, owner_id, key)
+
+    async def set_async(
+        self,
+        owner_id: uuid.UUID,
+        key: str,
+        token: bytes | None,
+        cached: CachedResponse,
+    ) -> None:
+        if self.backend is None or isinstance(self.backend, MemoryBackend):
+            self.set(owner_id, key, token, cached)
+        else:
+            await run_in_threadpool(self.set, owner_id, key, token, cached)
+
+    def invalidate(self, owner_id: uuid.UUID, source: str = "local") -> None:
+        """
+        Drop all the entries of `owner_id`.
+        """
+        if self.backend is None:
+            return
+        try:
+            self.backend.set(
+                self._generation_key(owner_id), secrets.token_hex(8).encode()
+            )
+        except Exception as e:
+            READ_CACHE_ERRORS.inc()
+            logger.warning(f"read cache invalidation failed: {e}")
+            return
+        READ_CACHE_INVALIDATIONS.inc(source)
+
+    def on_change(self, change: TodoChangeEvent) -> None:
+        """
+        Drop the entries of an owner whose todos changed on another worker.
+        """
+        # A shared backend was already invalidated by the writer
+        if self.backend is not None and not self.backend.shared:
+            self.invalidate(change.owner_id, "broadcast")
+
+    def on_reconnect(self) -> None:
+        """
+        Drop every entry of this worker after change notifications may have
+        been missed.
+        """
+        if isinstance(self.backend, MemoryBackend):
+            self.backend.clear()
+            READ_CACHE_INVALIDATIONS.inc("reconnect")
+
+    @property
+    def hits(self) -> int:
+        return int(CACHE_REQUESTS.value(CACHE_NAME, "hit"))
+
+    @property
+    def misses(self) -> int:
+        return int(CACHE_REQUESTS.value(CACHE_NAME, "miss"))
+
+
+def _backend() -> CacheBackend | None:
+    if settings.READ_CACHE == "memory":
+        return MemoryBackend(
+            maxsize=settings.READ_CACHE_MAX_ENTRIES,
+            ttl=settings.READ_CACHE_TTL_SECONDS,
+        )
+    if settings.READ_CACHE == "redis":
+        return RedisBackend.from_url(
+            settings.READ_CACHE_REDIS_URL,
+            ttl=settings.READ_CACHE_TTL_SECONDS,
+            timeout=settings.READ_CACHE_REDIS_TIMEOUT_SECONDS,
+        )
+    return None
+
+
+read_cache = ReadCache(_backend())
+
+
+@event.listens_for(SASession, "after_commit")
+def _invalidate_changed_owners(session: SASession) -> None:
+    # notify_change records the owners whose todos the transaction changed
+    for owner_id in session.info.pop(CHANGED_OWNERS, ()):
+        read_cache.invalidate(owner_id)
+
+
+@event.listens_for(SASession, "after_rollback")
+def _forget_changed_owners(session: SASession) -> None:
+    session.info.pop(CHANGED_OWNERS, None)
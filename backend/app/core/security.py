@@ -1,27 +1,257 @@
+import asyncio
+import functools
+import math
+import multiprocessing
+import secrets
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from concurrent.futures import Future, ProcessPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Any
+from typing import Any, TypeVar
 
 import jwt
 from passlib.context import CryptContext
 
 from app.core.config import settings
+from app.models import User
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+)
+
+T = TypeVar("T")
 
 
 ALGORITHM = "HS256"
 
 
-def create_access_token(subject: str | Any, expires_delta: timedelta) -> str:
+def create_access_token(
+    subject: str | Any,
+    expires_delta: timedelta,
+    claims: dict[str, Any] | None = None,
+) -> str:
     expire = datetime.now(timezone.utc) + expires_delta
-    to_encode = {"exp": expire, "sub": str(subject)}
+    to_encode = {**(claims or {}), "exp": expire, "sub": str(subject)}
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
+def user_claims(user: User) -> dict[str, Any] | None:
+    """
+    Claims that let read-only routes authorize `user` from the token alone.
+    """
+    if not settings.AUTH_TOKEN_CLAIMS:
+        return None
+    return {
+        "is_active": user.is_active,
+        "is_superuser": user.is_superuser,
+        "token_version": user.token_version,
+    }
+
+
+class TokenRevocations:
+    """
+    Token versions of the users authorized from token claims by this worker.
+
+    Tokens older than the version known for their user are revoked, as are
+    the tokens of users whose version isn't known yet, so those are checked
+    against the database. The versions of the users seen since the last
+    refresh are reloaded at most every `refresh_seconds`. Versions only move
+    up, and deleted users stay revoked.
+    """
+
+    def __init__(self, refresh_seconds: float) -> None:
+        self.refresh_seconds = refresh_seconds
+        self._versions: dict[uuid.UUID, float] = {}
+        self._revoked_at: dict[uuid.UUID, float] = {}
+        self._seen: set[uuid.UUID] = set()
+        self._refreshed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def is_revoked(self, user_id: uuid.UUID, token_version: int) -> bool:
+        with self._lock:
+            self._seen.add(user_id)
+            return token_version < self._versions.get(user_id, math.inf)
+
+    def revoke(self, user_id: uuid.UUID) -> None:
+        """
+        Revoke all tokens of a user until a refresh started after now.
+        """
+        with self._lock:
+            self._versions[user_id] = math.inf
+            self._revoked_at[user_id] = time.monotonic()
+            self._seen.add(user_id)
+
+    def due(self) -> list[uuid.UUID]:
+        """
+        Users whose versions should be reloaded now, if any.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not self._seen or now - self._refreshed_at < self.refresh_seconds:
+                return []
+            self._refreshed_at = now
+            seen, self._seen = self._seen, set()
+            return list(seen)
+
+    def update(self, user_ids: list[uuid.UUID], versions: dict[uuid.UUID, int]) -> None:
+        """
+        Store the `versions` reloaded for `user_ids` after the last `due`.
+        """
+        with self._lock:
+            for user_id in user_ids:
+                version = versions.get(user_id, math.inf)
+                revoked_at = self._revoked_at.get(user_id)
+                if revoked_at is None:
+                    old = self._versions.get(user_id, 0)
+                    self._versions[user_id] = max(old, version)
+                elif revoked_at < self._refreshed_at:
+                    # Read after the revoking commit, replaces the revocation
+                    del self._revoked_at[user_id]
+                    self._versions[user_id] = version
+                else:
+                    # May have been read before the revoking commit, keep
+                    # the revocation until the next refresh
+                    self._seen.add(user_id)
+
+
+class PasswordHashingBusy(Exception):
+    """
+    Too many password checks are already waiting.
+    """
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a pool of `workers` processes, so a burst of logins can't
+    hold the request threads on the CPU.
+
+    At most `max_queue` calls wait or run at once, further calls raise
+    PasswordHashingBusy. With no workers bcrypt runs on the calling thread.
+    """
+
+    def __init__(self, *, workers: int, max_queue: int) -> None:
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Forking a process running threads isn't safe, spawn instead
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _submit(self, fn: Callable[..., T], *args: Any) -> Future[T]:
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHashingBusy()
+        future: Future[T]
+        try:
+            if self.workers > 0:
+                future = self._get_executor().submit(fn, *args)
+            else:
+                future = Future()
+                future.set_result(fn(*args))
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, fn: Callable[..., T], *args: Any) -> T:
+        return self._submit(fn, *args).result()
+
+    async def run_async(self, fn: Callable[..., T], *args: Any) -> T:
+        return await asyncio.wrap_future(self._submit(fn, *args))
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
+
+
+def _verify_password(plain_password: str, hashed_password: str) -> bool:
+    return bool(pwd_context.verify(plain_password, hashed_password))
+
+
+def _verify_and_update(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    verified, new_hash = pwd_context.verify_and_update(plain_password, hashed_password)
+    return bool(verified), new_hash
+
+
+def _hash_password(password: str) -> str:
+    return str(pwd_context.hash(password))
+
+
+@functools.cache
+def _dummy_hash() -> str:
+    return str(pwd_context.hash(secrets.token_urlsafe()))
+
+
+def _verify_dummy(plain_password: str) -> bool:
+    pwd_context.verify(plain_password, _dummy_hash())
+    return False
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_hasher.run(_verify_password, plain_password, hashed_password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.run_async(
+        _verify_password, plain_password, hashed_password
+    )
+
+
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    """
+    Verify a password and, when the hash needs an update (e.g. the bcrypt
+    cost changed), also return a new hash of it.
+    """
+    return password_hasher.run(_verify_and_update, plain_password, hashed_password)
+
+
+async def verify_and_update_password_async(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    return await password_hasher.run_async(
+        _verify_and_update, plain_password, hashed_password
+    )
+
+
+def verify_dummy_password(plain_password: str) -> bool:
+    """
+    Spend the time of a password check when there is no hash to check, so
+    response times don't tell whether an account exists.
+    """
+    return password_hasher.run(_verify_dummy, plain_password)
+
+
+async def verify_dummy_password_async(plain_password: str) -> bool:
+    return await password_hasher.run_async(_verify_dummy, plain_password)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return password_hasher.run(_hash_password, password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await password_hasher.run_async(_hash_password, password)
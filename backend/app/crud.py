@@ -1,10 +1,44 @@
+import time
 import uuid
+from datetime import datetime, timedelta
 from typing import Any
 
-from sqlmodel import Session, select
+from sqlalchemy import (
+    Delete,
+    Insert,
+    Select,
+    Update,
+    delete,
+    func,
+    insert,
+    inspect,
+    literal,
+    update,
+)
+from sqlmodel import Session, col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.core.security import get_password_hash, verify_password
-from app.models import Item, ItemCreate, Todo, TodoCreate, User, UserCreate, UserUpdate, SubTodoCreate
+from app.core.config import settings
+from app.core.security import (
+    get_password_hash,
+    get_password_hash_async,
+    verify_and_update_password,
+    verify_and_update_password_async,
+    verify_dummy_password,
+    verify_dummy_password_async,
+)
+from app.models import (
+    Item,
+    ItemCreate,
+    SubTodoCreate,
+    Todo,
+    TodoCreate,
+    Tombstone,
+    TombstoneKind,
+    User,
+    UserCreate,
+    UserUpdate,
+)
 
 
 def create_user(*, session: Session, user_create: UserCreate) -> User:
@@ -17,6 +51,28 @@ def create_user(*, session: Session, user_create: UserCreate) -> User:
     return db_obj
 
 
+async def create_user_async(*, session: AsyncSession, user_create: UserCreate) -> User:
+    hashed_password = await get_password_hash_async(user_create.password)
+    db_obj = User.model_validate(
+        user_create, update={"hashed_password": hashed_password}
+    )
+    session.add(db_obj)
+    await session.commit()
+    await session.refresh(db_obj)
+    return db_obj
+
+
+def _bump_token_version(
+    db_user: User, user_data: dict[str, Any], extra_data: dict[str, Any]
+) -> None:
+    # Tokens carrying the old is_active or is_superuser as claims are revoked
+    if any(
+        field in user_data and user_data[field] != getattr(db_user, field)
+        for field in ("is_active", "is_superuser")
+    ):
+        extra_data["token_version"] = db_user.token_version + 1
+
+
 def update_user(*, session: Session, db_user: User, user_in: UserUpdate) -> Any:
     user_data = user_in.model_dump(exclude_unset=True)
     extra_data = {}
@@ -24,6 +80,7 @@ def update_user(*, session: Session, db_user: User, user_in: UserUpdate) -> Any:
         password = user_data["password"]
         hashed_password = get_password_hash(password)
         extra_data["hashed_password"] = hashed_password
+    _bump_token_version(db_user, user_data, extra_data)
     db_user.sqlmodel_update(user_data, update=extra_data)
     session.add(db_user)
     session.commit()
@@ -31,18 +88,70 @@ def update_user(*, session: Session, db_user: User, user_in: UserUpdate) -> Any:
     return db_user
 
 
+async def update_user_async(
+    *, session: AsyncSession, db_user: User, user_in: UserUpdate
+) -> Any:
+    user_data = user_in.model_dump(exclude_unset=True)
+    extra_data = {}
+    if "password" in user_data:
+        password = user_data["password"]
+        hashed_password = await get_password_hash_async(password)
+        extra_data["hashed_password"] = hashed_password
+    _bump_token_version(db_user, user_data, extra_data)
+    db_user.sqlmodel_update(user_data, update=extra_data)
+    session.add(db_user)
+    await session.commit()
+    await session.refresh(db_user)
+    return db_user
+
+
 def get_user_by_email(*, session: Session, email: str) -> User | None:
     statement = select(User).where(User.email == email)
     session_user = session.exec(statement).first()
     return session_user
 
 
+async def get_user_by_email_async(*, session: AsyncSession, email: str) -> User | None:
+    statement = select(User).where(User.email == email)
+    return (await session.exec(statement)).first()
+
+
 def authenticate(*, session: Session, email: str, password: str) -> User | None:
     db_user = get_user_by_email(session=session, email=email)
+    # Give the connection back to the pool while bcrypt runs, the loaded
+    # attributes stay available on the detached user
+    session.close()
+    if not db_user:
+        verify_dummy_password(password)
+        return None
+    verified, new_hash = verify_and_update_password(password, db_user.hashed_password)
+    if not verified:
+        return None
+    if new_hash:
+        # Stored with an outdated cost, upgrade it now that we know the password
+        db_user.hashed_password = new_hash
+        session.add(db_user)
+        session.commit()
+    return db_user
+
+
+async def authenticate_async(
+    *, session: AsyncSession, email: str, password: str
+) -> User | None:
+    db_user = await get_user_by_email_async(session=session, email=email)
+    await session.close()
     if not db_user:
+        await verify_dummy_password_async(password)
         return None
-    if not verify_password(password, db_user.hashed_password):
+    verified, new_hash = await verify_and_update_password_async(
+        password, db_user.hashed_password
+    )
+    if not verified:
         return None
+    if new_hash:
+        db_user.hashed_password = new_hash
+        session.add(db_user)
+        await session.commit()
     return db_user
 
 
@@ -54,9 +163,145 @@ def create_item(*, session: Session, item_in: ItemCreate, owner_id: uuid.UUID) -
     return db_item
 
 
-def create_subtodo(*, session: Session, item_in: SubTodoCreate, owner_id: uuid.UUID) -> Item:
+def _subtodo_counters_statement(
+    todo_id: uuid.UUID, total: int, completed: int
+) -> Update:
+    return (
+        update(Todo)
+        .where(col(Todo.id) == todo_id)
+        .values(
+            subtodo_total=col(Todo.subtodo_total) + total,
+            subtodo_completed=col(Todo.subtodo_completed) + completed,
+            updated_at=datetime.now(),
+        )
+    )
+
+
+def adjust_subtodo_counters(
+    *, session: Session, todo_id: uuid.UUID, total: int = 0, completed: int = 0
+) -> None:
+    """
+    Shift the subtodo counters of a todo in the current transaction.
+    """
+    session.execute(_subtodo_counters_statement(todo_id, total, completed))
+
+
+async def adjust_subtodo_counters_async(
+    *, session: AsyncSession, todo_id: uuid.UUID, total: int = 0, completed: int = 0
+) -> None:
+    await session.exec(_subtodo_counters_statement(todo_id, total, completed))  # type: ignore
+
+
+# Seconds between two purges of the expired tombstones
+TOMBSTONES_PRUNE_INTERVAL = 600
+
+_tombstones_pruned_at = time.monotonic()
+
+
+def _prune_tombstones_statement() -> Delete | None:
+    global _tombstones_pruned_at
+    if time.monotonic() - _tombstones_pruned_at < TOMBSTONES_PRUNE_INTERVAL:
+        return None
+    _tombstones_pruned_at = time.monotonic()
+    expired = datetime.now() - timedelta(days=settings.TOMBSTONE_RETENTION_DAYS)
+    return delete(Tombstone).where(col(Tombstone.deleted_at) < expired)
+
+
+def _tombstones_statement(kind: TombstoneKind, statement: Select[Any]) -> Insert:
+    return insert(Tombstone).from_select(
+        ["owner_id", "object_id", "todo_id", "id", "kind", "deleted_at"],
+        statement.add_columns(
+            func.gen_random_uuid(),
+            literal(kind, inspect(Tombstone).c.kind.type),
+            literal(datetime.now()),
+        ),
+    )
+
+
+def create_tombstones(
+    *,
+    session: Session,
+    kind: TombstoneKind,
+    statement: Select[Any],
+) -> None:
+    """
+    Record deletions in the current transaction, before deleting the rows.
+
+    `statement` selects the owner id, object id and parent todo id (or NULL)
+    of every row about to be deleted. Tombstones older than
+    TOMBSTONE_RETENTION_DAYS are purged along the way.
+    """
+    session.execute(_tombstones_statement(kind, statement))
+    prune = _prune_tombstones_statement()
+    if prune is not None:
+        session.execute(prune)
+
+
+async def create_tombstones_async(
+    *,
+    session: AsyncSession,
+    kind: TombstoneKind,
+    statement: Select[Any],
+) -> None:
+    await session.exec(_tombstones_statement(kind, statement))  # type: ignore
+    prune = _prune_tombstones_statement()
+    if prune is not None:
+        await session.exec(prune)  # type: ignore
+
+
+def create_subtodo(
+    *, session: Session, item_in: SubTodoCreate, owner_id: uuid.UUID
+) -> Item:
     db_item = Item.model_validate(item_in, update={"owner_id": owner_id})
     session.add(db_item)
     session.commit()
     session.refresh(db_item)
     return db_item
+
+
+TODO_BULK_BATCH_SIZE = 250
+TODO_BULK_COPY_THRESHOLD = 1000
+_TODO_BULK_COLUMNS = (
+    "id",
+    "owner_id",
+    "title",
+    "desc",
+    "status",
+    "created_at",
+    "updated_at",
+)
+
+
+def create_todos_bulk(
+    *, session: Session, todos_in: list[TodoCreate], owner_id: uuid.UUID
+) -> list[uuid.UUID]:
+    """
+    Insert many todos in the current transaction without loading them back.
+
+    Small payloads go through batched multi-row INSERT ... RETURNING, larger
+    ones are streamed with COPY. The caller commits.
+    """
+    rows = []
+    for todo_in in todos_in:
+        # Server time, whatever the payload holds, or /todos/changes misses
+        # the rows
+        now = datetime.now()
+        todo = Todo.model_validate(
+            todo_in, update={"owner_id": owner_id, "created_at": now, "updated_at": now}
+        )
+        rows.append(todo.model_dump(include=set(_TODO_BULK_COLUMNS)))
+    if len(rows) > TODO_BULK_COPY_THRESHOLD:
+        columns = ", ".join(f'"{name}"' for name in _TODO_BULK_COLUMNS)
+        driver_connection = session.connection().connection.driver_connection
+        assert driver_connection is not None
+        with driver_connection.cursor() as cursor:
+            with cursor.copy(f"COPY todo ({columns}) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row([row[name] for name in _TODO_BULK_COLUMNS])
+        return [row["id"] for row in rows]
+    ids: list[uuid.UUID] = []
+    for start in range(0, len(rows), TODO_BULK_BATCH_SIZE):
+        batch = rows[start : start + TODO_BULK_BATCH_SIZE]
+        statement = insert(Todo).values(batch).returning(col(Todo.id))
+        ids.extend(session.execute(statement).scalars())
+    return ids
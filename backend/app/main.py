@@ -1,18 +1,56 @@
-from fastapi import FastAPI
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.routing import APIRoute
 from starlette.middleware.cors import CORSMiddleware
 
+from app.api.deps import auth_cache, invalidate_auth_user
 from app.api.main import api_router
+from app.core.compression import CompressionMiddleware
 from app.core.config import settings
+from app.core.db import LastWriteMiddleware, async_engine
+from app.core.events import change_listener
+from app.core.http_metrics import MetricsMiddleware
+from app.core.metrics import metrics, multiprocess_writer
+from app.core.outbox import outbox_worker
+from app.core.read_cache import read_cache
+from app.core.security import PasswordHashingBusy, password_hasher
+from app.utils import warm_email_templates
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
     return f"{route.tags[0]}-{route.name}"
 
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    warm_email_templates()
+    if multiprocess_writer is not None:
+        multiprocess_writer.start()
+    if settings.emails_enabled:
+        outbox_worker.start()
+    if read_cache.backend is not None:
+        change_listener.watch(read_cache.on_change)
+        change_listener.watch_reconnects(read_cache.on_reconnect)
+    # Users changed on other workers must not stay authorized from the cache
+    change_listener.watch_users(invalidate_auth_user)
+    change_listener.watch_reconnects(auth_cache.clear)
+    yield
+    await change_listener.stop()
+    outbox_worker.stop()
+    if multiprocess_writer is not None:
+        multiprocess_writer.stop()
+    await async_engine.dispose()
+    password_hasher.shutdown()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
+    lifespan=lifespan,
 )
 
 # Set all CORS enabled origins
@@ -25,4 +63,33 @@ if settings.all_cors_origins:
         allow_headers=["*"],
     )
 
+# Inert until a commit sets the cookie, which needs read replicas
+app.add_middleware(LastWriteMiddleware)
+
+if settings.COMPRESSION:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MIN_SIZE,
+        gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+        zstd_level=settings.COMPRESSION_ZSTD_LEVEL,
+    )
+
+# Added last to be the outermost, so it times the other middleware too
+if settings.HTTP_METRICS:
+    app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(PasswordHashingBusy)
+async def password_hashing_busy_handler(
+    _: Request, __: PasswordHashingBusy
+) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many password checks, try again later"},
+        headers={"Retry-After": "1"},
+    )
+
+
 app.include_router(api_router, prefix=settings.API_V1_STR)
+app.add_route("/metrics", metrics, include_in_schema=False)
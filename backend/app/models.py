@@ -1,8 +1,12 @@
 from datetime import datetime
 import uuid
 from enum import Enum
+from typing import Any
 
 from pydantic import EmailStr
+from sqlalchemy import Column, Computed, Index, inspect, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred
 from sqlmodel import Field, Relationship, SQLModel
 
 
@@ -43,12 +47,29 @@ class UpdatePassword(SQLModel):
 
 # Database model, database table inferred from class name
 class User(UserBase, table=True):
+    __table_args__ = (Index("ix_user_created_at_id", "created_at", "id"),)
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     hashed_password: str
+    created_at: datetime = Field(default_factory=datetime.now)
+    # Bumped when is_active or is_superuser change, revoking the access
+    # tokens that carry the old values as claims
+    token_version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    # Bumped by every transaction changing the user's todos or subtodos, when
+    # it commits. Hashed into the list ETags, unlike the updated_at stamps it
+    # changes in commit order
+    todos_version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
     items: list["Item"] = Relationship(back_populates="owner", cascade_delete=True)
     todos: list["Todo"] = Relationship(back_populates="owner", cascade_delete=True)
 
 
+# Fields of the current user needed to authorize a request
+class AuthUser(SQLModel):
+    id: uuid.UUID
+    is_active: bool
+    is_superuser: bool
+
+
 # Properties to return via API, id is always required
 class UserPublic(UserBase):
     id: uuid.UUID
@@ -56,7 +77,9 @@ class UserPublic(UserBase):
 
 class UsersPublic(SQLModel):
     data: list[UserPublic]
-    count: int
+    count: int | None
+    has_more: bool = False
+    next_cursor: str | None = None
 
 
 # Shared properties
@@ -77,11 +100,17 @@ class ItemUpdate(ItemBase):
 
 # Database model, database table inferred from class name
 class Item(ItemBase, table=True):
+    __table_args__ = (
+        Index("ix_item_created_at_id", "created_at", "id"),
+        Index("ix_item_owner_id_created_at_id", "owner_id", "created_at", "id"),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     title: str = Field(max_length=255)
     owner_id: uuid.UUID = Field(
         foreign_key="user.id", nullable=False, ondelete="CASCADE"
     )
+    created_at: datetime = Field(default_factory=datetime.now)
     owner: User | None = Relationship(back_populates="items")
 
 
@@ -93,7 +122,9 @@ class ItemPublic(ItemBase):
 
 class ItemsPublic(SQLModel):
     data: list[ItemPublic]
-    count: int
+    count: int | None
+    has_more: bool = False
+    next_cursor: str | None = None
 
 
 # Generic message
@@ -110,12 +141,19 @@ class Token(SQLModel):
 # Contents of JWT token
 class TokenPayload(SQLModel):
     sub: str | None = None
+    # Only set in tokens issued with settings.AUTH_TOKEN_CLAIMS
+    is_active: bool | None = None
+    is_superuser: bool | None = None
+    token_version: int | None = None
 
 
 class NewPassword(SQLModel):
     token: str
     new_password: str = Field(min_length=8, max_length=40)
 
+# Text search configuration of Todo.search_vector, queries must use the same
+TODO_SEARCH_CONFIG = "simple"
+
 # Shared properties
 class StatusEnum(str, Enum):
     pending = "pending"
@@ -130,31 +168,121 @@ class TodoBase(SQLModel):
 
 # Table Todo
 class Todo(TodoBase, table=True):
+    __table_args__ = (
+        Index("ix_todo_created_at_id", "created_at", "id"),
+        Index("ix_todo_owner_id_created_at_id", "owner_id", "created_at", "id"),
+        # Serves the "open tasks" views, which skip completed todos
+        Index(
+            "ix_todo_owner_id_created_at_id_open",
+            "owner_id",
+            "created_at",
+            "id",
+            postgresql_where=text("status <> 'completed'"),
+        ),
+        Index("ix_todo_owner_id_status", "owner_id", "status"),
+        Index("ix_todo_owner_id_updated_at", "owner_id", "updated_at"),
+        Index("ix_todo_search_vector", "search_vector", postgresql_using="gin"),
+        Index(
+            "ix_todo_title_trgm",
+            "title",
+            postgresql_using="gin",
+            postgresql_ops={"title": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_todo_desc_trgm",
+            "desc",
+            postgresql_using="gin",
+            postgresql_ops={"desc": "gin_trgm_ops"},
+        ),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     owner_id: uuid.UUID = Field(
         foreign_key="user.id", nullable=False, ondelete="CASCADE"
     )
-    status: str = Field(default="in_progress", max_length=255)
+    status: StatusEnum = Field(default=StatusEnum.in_progress)
+    # Kept in step with the subtodos by the subtodo routes
+    subtodo_total: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    subtodo_completed: int = Field(
+        default=0, sa_column_kwargs={"server_default": "0"}
+    )
+    # Maintained by Postgres from title and desc, only used for searching
+    search_vector: Any = Field(
+        default=None,
+        exclude=True,
+        sa_column=Column(
+            TSVECTOR,
+            Computed(
+                f"to_tsvector('{TODO_SEARCH_CONFIG}', title || ' ' || \"desc\")",
+                persisted=True,
+            ),
+        ),
+    )
     owner: User | None = Relationship(back_populates="todos")
-    subtodos: list["SubTodo"] = Relationship(back_populates="todo")
+    # Subtodos are removed by the database through ON DELETE CASCADE
+    subtodos: list["SubTodo"] = Relationship(
+        back_populates="todo", passive_deletes="all"
+    )
+
+
+# Don't load the search vector along with every todo
+inspect(Todo).add_property(
+    "search_vector", deferred(inspect(Todo).local_table.c.search_vector)
+)
 
-class TodoCreate(TodoBase):
-    pass
+
+# The timestamps are set by the server, /todos/changes relies on them
+class TodoCreate(SQLModel):
+    title: str = Field(min_length=1, max_length=255)
+    desc: str = Field(max_length=255)
 
 # Properties to receive on item update
 class TodoUpdate(TodoBase):
     title: str | None = Field(default=None, min_length=1, max_length=255)  # type: ignore
     desc: str | None = Field(default=None, max_length=255)
-    status: str | None = Field(default=None, max_length=255)
+    status: StatusEnum | None = None
+
+class TodoBulkError(SQLModel):
+    index: int
+    errors: list[dict[str, Any]]
+
+class TodosBulkCreated(SQLModel):
+    ids: list[uuid.UUID]
+    errors: list[TodoBulkError]
+
+# Selects the current user's todos for a bulk action, all of them if empty.
+# Bulk deletes refuse an empty filter unless `all` is set
+class TodoBulkFilter(SQLModel):
+    ids: list[uuid.UUID] | None = None
+    status: StatusEnum | None = None
+    created_after: datetime | None = None
+    created_before: datetime | None = None
+    search: str | None = None
+    all: bool = False
+
+class TodosBulkUpdate(SQLModel):
+    filter: TodoBulkFilter = Field(default_factory=TodoBulkFilter)
+    status: StatusEnum
+
+class TodosBulkAffected(SQLModel):
+    count: int
+
+class TodoStatusCounts(SQLModel):
+    counts: dict[StatusEnum, int]
+    total: int
 
 class TodoPublic(TodoBase):
     id: uuid.UUID
     owner_id: uuid.UUID
-    status: str
+    status: StatusEnum
+    subtodo_total: int = 0
+    subtodo_completed: int = 0
 
 class TodosPublic(SQLModel):
     data: list[TodoPublic]
-    count: int
+    count: int | None
+    has_more: bool = False
+    next_cursor: str | None = None
 
 # Table SubTodo
 class SubTodoBase(SQLModel):
@@ -164,11 +292,13 @@ class SubTodoBase(SQLModel):
     updated_at: datetime | None = Field(default_factory=datetime.now, nullable=True)
 
 class SubTodo(SubTodoBase, table=True):
+    __table_args__ = (Index("ix_subtodo_todo_id_updated_at", "todo_id", "updated_at"),)
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     todo_id: uuid.UUID = Field(
         foreign_key="todo.id", nullable=False, ondelete="CASCADE"
     )
-    status: str = Field(default="in_progress", max_length=255)
+    status: StatusEnum = Field(default=StatusEnum.in_progress)
     todo: Todo | None = Relationship(back_populates="subtodos")
 
 class SubTodoCreate(SQLModel):
@@ -179,14 +309,93 @@ class SubTodoCreate(SQLModel):
 class SubTodoUpdate(SubTodoBase):
     title: str | None = Field(default=None, min_length=1, max_length=255)  # type: ignore
     desc: str | None = Field(default=None, max_length=255)
-    status: str | None = Field(default=None, max_length=255)
+    status: StatusEnum | None = None
     
 class SubTodoPublic(SubTodoBase):
     id: uuid.UUID
     desc: str | None = Field(default=None, max_length=255)
     todo_id: uuid.UUID
-    status: str
+    status: StatusEnum
 
 class SubTodosPublic(SQLModel):
     data: list[SubTodoPublic]
-    count: int
\ No newline at end of file
+    count: int
+
+class TodoTreePublic(TodoPublic):
+    subtodos: list[SubTodoPublic]
+
+class TodoTreesPublic(SQLModel):
+    data: list[TodoTreePublic]
+    count: int | None
+    has_more: bool = False
+    next_cursor: str | None = None
+
+
+class TombstoneKind(str, Enum):
+    todo = "todo"
+    subtodo = "subtodo"
+
+# Records a deleted todo or subtodo so that syncing clients can drop it. Kept
+# for TOMBSTONE_RETENTION_DAYS
+class Tombstone(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_tombstone_owner_id_deleted_at", "owner_id", "deleted_at"),
+        Index("ix_tombstone_deleted_at", "deleted_at"),
+    )
+
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    owner_id: uuid.UUID = Field(
+        foreign_key="user.id", nullable=False, ondelete="CASCADE"
+    )
+    kind: TombstoneKind
+    object_id: uuid.UUID
+    todo_id: uuid.UUID | None = None
+    deleted_at: datetime = Field(default_factory=datetime.now)
+
+# Login attempts left for an email or a client IP, shared by all workers
+class LoginBucket(SQLModel, table=True):
+    key: str = Field(primary_key=True, max_length=320)
+    tokens: float
+    updated_at: datetime
+
+# Emails waiting for the outbox worker. Sent emails are deleted, emails that
+# ran out of attempts stay with no next_attempt_at and an empty body, until
+# EMAIL_OUTBOX_RETENTION_DAYS
+class EmailOutbox(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_emailoutbox_next_attempt_at", "next_attempt_at"),
+    )
+
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    email_to: str = Field(max_length=255)
+    subject: str
+    html_content: str
+    attempts: int = 0
+    next_attempt_at: datetime | None = Field(default_factory=datetime.now)
+    last_error: str | None = None
+    created_at: datetime = Field(default_factory=datetime.now)
+
+class TombstonePublic(SQLModel):
+    kind: TombstoneKind
+    object_id: uuid.UUID
+    todo_id: uuid.UUID | None
+    deleted_at: datetime
+
+class TodoChanges(SQLModel):
+    todos: list[TodoPublic]
+    subtodos: list[SubTodoPublic]
+    deleted: list[TombstonePublic]
+    token: str
+
+class ChangeAction(str, Enum):
+    created = "created"
+    updated = "updated"
+    deleted = "deleted"
+
+# Pushed to the owner's event streams, bulk changes carry no object_id
+class TodoChangeEvent(SQLModel):
+    kind: TombstoneKind
+    action: ChangeAction
+    owner_id: uuid.UUID
+    object_id: uuid.UUID | None = None
+    todo_id: uuid.UUID | None = None
@@ -0,0 +1,227 @@
+from collections.abc import Generator
+from unittest.mock import patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.main import build_api_router
+from app.core.config import settings
+from app.core.read_cache import MemoryBackend, read_cache
+from app.main import app, custom_generate_unique_id, lifespan
+from app.tests.utils.user import user_authentication_headers
+from app.tests.utils.utils import random_email, random_lower_string
+
+async_app = FastAPI(
+    generate_unique_id_function=custom_generate_unique_id, lifespan=lifespan
+)
+async_app.include_router(build_api_router(async_db=True), prefix=settings.API_V1_STR)
+
+
+@pytest.fixture(scope="module")
+def client() -> Generator[TestClient, None, None]:
+    with TestClient(async_app) as c:
+        yield c
+
+
+def test_async_routes_keep_openapi() -> None:
+    sync_paths = app.openapi()["paths"]
+    async_paths = async_app.openapi()["paths"]
+    assert list(async_paths) == list(sync_paths)
+    for path, operations in sync_paths.items():
+        for method, operation in operations.items():
+            assert async_paths[path][method]["operationId"] == operation["operationId"]
+
+
+def test_async_user_flow(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    email, password = random_email(), random_lower_string()
+    r = client.post(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        json={"email": email, "password": password},
+    )
+    assert r.status_code == 200
+    user_id = r.json()["id"]
+    headers = user_authentication_headers(client=client, email=email, password=password)
+
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+    assert r.json()["email"] == email
+    r = client.patch(
+        f"{settings.API_V1_STR}/users/me",
+        headers=headers,
+        json={"full_name": "Async"},
+    )
+    assert r.json()["full_name"] == "Async"
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        params={"limit": 1},
+    )
+    assert r.status_code == 200
+    assert r.json()["next_cursor"]
+
+    r = client.delete(
+        f"{settings.API_V1_STR}/users/{user_id}", headers=superuser_token_headers
+    )
+    assert r.status_code == 200
+    r = client.post(
+        f"{settings.API_V1_STR}/login/access-token",
+        data={"username": email, "password": password},
+    )
+    assert r.status_code == 400
+
+
+def test_async_todo_flow(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    todos_url = f"{settings.API_V1_STR}/todos/"
+    r = client.post(
+        todos_url,
+        headers=normal_user_token_headers,
+        json={"title": "Async", "desc": "Todo"},
+    )
+    assert r.status_code == 200
+    todo_id = r.json()["id"]
+
+    subtodos_url = f"{todos_url}{todo_id}/subtodos"
+    r = client.post(
+        subtodos_url,
+        headers=normal_user_token_headers,
+        json={"title": "Step", "desc": "One"},
+    )
+    assert r.status_code == 200
+    subtodo_id = r.json()["id"]
+    r = client.put(
+        f"{subtodos_url}/{subtodo_id}",
+        headers=normal_user_token_headers,
+        json={"status": "completed"},
+    )
+    assert r.json()["status"] == "completed"
+
+    r = client.get(f"{todos_url}{todo_id}", headers=normal_user_token_headers)
+    content = r.json()
+    assert content["subtodo_total"] == 1
+    assert content["subtodo_completed"] == 1
+
+    r = client.get(
+        todos_url,
+        headers=normal_user_token_headers,
+        params={"search": "Async", "count_mode": "estimated"},
+    )
+    assert todo_id in [todo["id"] for todo in r.json()["data"]]
+
+    # Routes without an async version are still served
+    r = client.get(f"{todos_url}stats", headers=normal_user_token_headers)
+    assert r.status_code == 200
+
+    r = client.delete(f"{subtodos_url}/{subtodo_id}", headers=normal_user_token_headers)
+    assert r.status_code == 200
+    r = client.delete(f"{todos_url}{todo_id}", headers=normal_user_token_headers)
+    assert r.status_code == 200
+    r = client.get(f"{todos_url}{todo_id}", headers=normal_user_token_headers)
+    assert r.status_code == 404
+
+
+def test_async_read_todos_fast_response(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    todos_url = f"{settings.API_V1_STR}/todos/"
+    client.post(
+        todos_url,
+        headers=normal_user_token_headers,
+        json={"title": "Async", "desc": "Fast"},
+    )
+    normal = client.get(todos_url, headers=normal_user_token_headers).json()
+    with patch.object(settings, "FAST_LIST_RESPONSES", True):
+        fast = client.get(todos_url, headers=normal_user_token_headers).json()
+    assert fast == normal
+    assert fast["data"]
+
+
+def test_async_reads_not_modified(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    todos_url = f"{settings.API_V1_STR}/todos/"
+    r = client.post(
+        todos_url,
+        headers=normal_user_token_headers,
+        json={"title": "Async", "desc": "Etag"},
+    )
+    todo_id = r.json()["id"]
+    r = client.post(
+        f"{todos_url}{todo_id}/subtodos",
+        headers=normal_user_token_headers,
+        json={"title": "Step", "desc": "One"},
+    )
+    subtodo_id = r.json()["id"]
+    for url in (
+        todos_url,
+        f"{todos_url}{todo_id}",
+        f"{todos_url}{todo_id}/subtodos",
+        f"{todos_url}{todo_id}/subtodos/{subtodo_id}",
+    ):
+        etag = client.get(url, headers=normal_user_token_headers).headers["etag"]
+        r = client.get(
+            url, headers={**normal_user_token_headers, "If-None-Match": etag}
+        )
+        assert r.status_code == 304
+
+    etag = client.get(todos_url, headers=normal_user_token_headers).headers["etag"]
+    client.delete(f"{todos_url}{todo_id}", headers=normal_user_token_headers)
+    r = client.get(
+        todos_url, headers={**normal_user_token_headers, "If-None-Match": etag}
+    )
+    assert r.status_code == 200
+
+
+def test_async_reads_cached(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    todos_url = f"{settings.API_V1_STR}/todos/"
+    r = client.post(
+        todos_url,
+        headers=normal_user_token_headers,
+        json={"title": "Async", "desc": "Cached"},
+    )
+    todo_url = f"{todos_url}{r.json()['id']}"
+    with patch.object(read_cache, "backend", MemoryBackend(maxsize=100, ttl=60)):
+        client.post(
+            f"{todo_url}/subtodos",
+            headers=normal_user_token_headers,
+            json={"title": "Step", "desc": "One"},
+        )
+        for url in (todo_url, f"{todo_url}/subtodos"):
+            first = client.get(url, headers=normal_user_token_headers)
+            hits = read_cache.hits
+            second = client.get(url, headers=normal_user_token_headers)
+            assert read_cache.hits == hits + 1
+            assert second.json() == first.json()
+
+        client.put(
+            todo_url, headers=normal_user_token_headers, json={"title": "Changed"}
+        )
+        r = client.get(todo_url, headers=normal_user_token_headers)
+        assert r.json()["title"] == "Changed"
+
+
+def test_async_item_flow(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    items_url = f"{settings.API_V1_STR}/items/"
+    r = client.post(
+        items_url, headers=normal_user_token_headers, json={"title": "Async"}
+    )
+    assert r.status_code == 200
+    item_id = r.json()["id"]
+    r = client.put(
+        f"{items_url}{item_id}",
+        headers=normal_user_token_headers,
+        json={"title": "Updated"},
+    )
+    assert r.json()["title"] == "Updated"
+    r = client.get(items_url, headers=normal_user_token_headers)
+    assert item_id in [item["id"] for item in r.json()["data"]]
+    r = client.delete(f"{items_url}{item_id}", headers=normal_user_token_headers)
+    assert r.status_code == 200
@@ -1,11 +1,18 @@
+import secrets
 from unittest.mock import patch
 
+import jwt
 from fastapi.testclient import TestClient
 from sqlmodel import Session, select
 
+from app import crud
+from app.api import deps
+from app.core import security
 from app.core.config import settings
 from app.core.security import verify_password
-from app.models import User
+from app.models import User, UserCreate
+from app.tests.utils.user import user_authentication_headers
+from app.tests.utils.utils import random_email, random_lower_string
 from app.utils import generate_password_reset_token
 
 
@@ -30,6 +37,15 @@ def test_get_access_token_incorrect_password(client: TestClient) -> None:
     assert r.status_code == 400
 
 
+def test_get_access_token_long_username(client: TestClient) -> None:
+    login_data = {
+        "username": "a" * 400 + "@example.com",
+        "password": "incorrect",
+    }
+    r = client.post(f"{settings.API_V1_STR}/login/access-token", data=login_data)
+    assert r.status_code == 400
+
+
 def test_use_access_token(
     client: TestClient, superuser_token_headers: dict[str, str]
 ) -> None:
@@ -102,3 +118,117 @@ def test_reset_password_invalid_token(
     assert "detail" in response
     assert r.status_code == 400
     assert response["detail"] == "Invalid token"
+
+
+def test_read_routes_authorize_from_token_claims(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    email = random_email()
+    password = random_lower_string()
+    user = crud.create_user(
+        session=db, user_create=UserCreate(email=email, password=password)
+    )
+    with patch.object(settings, "AUTH_TOKEN_CLAIMS", True):
+        headers = user_authentication_headers(
+            client=client, email=email, password=password
+        )
+        token = headers["Authorization"].removeprefix("Bearer ")
+        payload = jwt.decode(
+            token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
+        )
+        assert payload["is_active"] is True
+        assert payload["is_superuser"] is False
+        assert payload["token_version"] == 0
+
+        # Loaded from the database until the worker knows the user's version
+        r = client.get(f"{settings.API_V1_STR}/todos/", headers=headers)
+        assert r.status_code == 200
+        with (
+            patch.object(deps.token_revocations, "refresh_seconds", 0),
+            patch("app.api.deps._load_auth_user") as load_auth_user,
+        ):
+            r = client.get(f"{settings.API_V1_STR}/todos/", headers=headers)
+        assert r.status_code == 200
+        load_auth_user.assert_not_called()
+
+        r = client.patch(
+            f"{settings.API_V1_STR}/users/{user.id}",
+            headers=superuser_token_headers,
+            json={"is_active": False},
+        )
+        assert r.status_code == 200
+        r = client.get(f"{settings.API_V1_STR}/todos/", headers=headers)
+        assert r.status_code == 400
+        assert r.json() == {"detail": "Inactive user"}
+
+
+def test_read_routes_ignore_token_claims_by_default(
+    client: TestClient, db: Session
+) -> None:
+    email = random_email()
+    password = random_lower_string()
+    crud.create_user(session=db, user_create=UserCreate(email=email, password=password))
+    with patch.object(settings, "AUTH_TOKEN_CLAIMS", True):
+        headers = user_authentication_headers(
+            client=client, email=email, password=password
+        )
+    with patch(
+        "app.api.deps._load_auth_user", wraps=deps._load_auth_user
+    ) as load_auth_user:
+        r = client.get(f"{settings.API_V1_STR}/todos/", headers=headers)
+    assert r.status_code == 200
+    load_auth_user.assert_called_once()
+
+
+def test_get_access_token_password_hashing_busy(client: TestClient) -> None:
+    login_data = {
+        "username": settings.FIRST_SUPERUSER,
+        "password": settings.FIRST_SUPERUSER_PASSWORD,
+    }
+    with patch("app.crud.authenticate", side_effect=security.PasswordHashingBusy):
+        r = client.post(f"{settings.API_V1_STR}/login/access-token", data=login_data)
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "1"
+
+
+def test_get_access_token_rate_limited(client: TestClient) -> None:
+    login_data = {"username": random_email(), "password": "incorrect"}
+    with patch.object(settings, "LOGIN_EMAIL_BURST", 2):
+        for _ in range(2):
+            r = client.post(
+                f"{settings.API_V1_STR}/login/access-token", data=login_data
+            )
+            assert r.status_code == 400
+        with patch("app.crud.authenticate") as authenticate:
+            r = client.post(
+                f"{settings.API_V1_STR}/login/access-token", data=login_data
+            )
+    assert r.status_code == 429
+    assert int(r.headers["Retry-After"]) > 0
+    authenticate.assert_not_called()
+
+
+def test_get_access_token_rate_limited_behind_proxy(client: TestClient) -> None:
+    def login(forwarded_for: str) -> int:
+        r = client.post(
+            f"{settings.API_V1_STR}/login/access-token",
+            data={"username": random_email(), "password": "incorrect"},
+            headers={"X-Forwarded-For": forwarded_for},
+        )
+        return r.status_code
+
+    # The client sent the first address, the trusted proxy appended the rest
+    spoofed = f"198.51.100.{secrets.randbelow(256)}"
+    client_ip = f"203.0.113.{secrets.randbelow(256)}"
+    other_ip = f"192.0.2.{secrets.randbelow(256)}"
+    with (
+        patch.object(settings, "FORWARDED_ALLOW_IPS", ["testclient", "10.0.0.0/8"]),
+        patch.object(settings, "LOGIN_IP_BURST", 2),
+    ):
+        for _ in range(2):
+            assert login(f"{spoofed}, {client_ip}, 10.0.0.5") == 400
+        assert login(f"{spoofed}, {client_ip}, 10.0.0.5") == 429
+        assert login(f"{client_ip}, 10.0.0.5") == 429
+        assert login(f"{client_ip}, 10.0.0.5, 10.0.0.6") == 429
+        # Other clients behind the proxy keep their own budget
+        assert login(f"{other_ip}, 10.0.0.5") == 400
@@ -0,0 +1,151 @@
+import threading
+import time
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from app import crud
+from app.core.config import settings
+from app.core.db import engine
+from app.models import StatusEnum, SubTodo, Todo
+from app.tests.utils.todo import create_random_todo
+from app.tests.utils.user import create_random_user
+
+
+def test_subtodo_counters(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    todo = create_random_todo(db, owner=create_random_user(db))
+    url = f"{settings.API_V1_STR}/todos/{todo.id}/subtodos"
+
+    ids = []
+    for title in ("first", "second", "third"):
+        response = client.post(
+            url, headers=superuser_token_headers, json={"title": title, "desc": ""}
+        )
+        assert response.status_code == 200
+        ids.append(response.json()["id"])
+    response = client.put(
+        f"{url}/{ids[0]}", headers=superuser_token_headers, json={"status": "completed"}
+    )
+    assert response.status_code == 200
+    client.put(
+        f"{url}/{ids[1]}", headers=superuser_token_headers, json={"status": "completed"}
+    )
+    client.put(
+        f"{url}/{ids[1]}", headers=superuser_token_headers, json={"status": "pending"}
+    )
+    response = client.delete(f"{url}/{ids[0]}", headers=superuser_token_headers)
+    assert response.status_code == 200
+
+    response = client.get(
+        f"{settings.API_V1_STR}/todos/{todo.id}", headers=superuser_token_headers
+    )
+    content = response.json()
+    assert content["subtodo_total"] == 2
+    assert content["subtodo_completed"] == 0
+
+
+def test_subtodo_counters_concurrent_updates(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    todo = create_random_todo(db, owner=create_random_user(db))
+    url = f"{settings.API_V1_STR}/todos/{todo.id}/subtodos"
+    response = client.post(
+        url, headers=superuser_token_headers, json={"title": "Step", "desc": ""}
+    )
+    subtodo_id = response.json()["id"]
+
+    with Session(engine) as other:
+        # Another request completes the subtodo and holds its lock meanwhile
+        subtodo = other.exec(
+            select(SubTodo).where(SubTodo.id == subtodo_id).with_for_update()
+        ).one()
+        subtodo.status = StatusEnum.completed
+        other.add(subtodo)
+        crud.adjust_subtodo_counters(session=other, todo_id=todo.id, completed=1)
+        other.flush()
+        request = threading.Thread(
+            target=client.put,
+            args=(f"{url}/{subtodo_id}",),
+            kwargs={
+                "headers": superuser_token_headers,
+                "json": {"status": "completed"},
+            },
+        )
+        request.start()
+        time.sleep(0.5)
+        other.commit()
+    request.join()
+
+    db.expire_all()
+    counted = db.get(Todo, todo.id)
+    assert counted is not None
+    assert counted.subtodo_completed == 1
+
+
+def test_delete_subtodo_of_other_todo(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    todo = create_random_todo(db)
+    other_todo = create_random_todo(db)
+    response = client.post(
+        f"{settings.API_V1_STR}/todos/{other_todo.id}/subtodos",
+        headers=superuser_token_headers,
+        json={"title": "sub", "desc": ""},
+    )
+    sub_todo_id = response.json()["id"]
+
+    response = client.delete(
+        f"{settings.API_V1_STR}/todos/{todo.id}/subtodos/{sub_todo_id}",
+        headers=superuser_token_headers,
+    )
+    assert response.status_code == 404
+    assert response.json()["detail"] == "SubTodo not found"
+
+
+def test_read_subtodos_not_modified(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    todo = create_random_todo(db)
+    url = f"{settings.API_V1_STR}/todos/{todo.id}/subtodos"
+    response = client.post(
+        url, headers=superuser_token_headers, json={"title": "sub", "desc": ""}
+    )
+    sub_todo_id = response.json()["id"]
+
+    for path in (url, f"{url}/{sub_todo_id}"):
+        response = client.get(path, headers=superuser_token_headers)
+        etag = response.headers["etag"]
+        response = client.get(
+            path, headers={**superuser_token_headers, "If-None-Match": etag}
+        )
+        assert response.status_code == 304
+        assert response.content == b""
+
+    list_etag = client.get(url, headers=superuser_token_headers).headers["etag"]
+    item_etag = client.get(
+        f"{url}/{sub_todo_id}", headers=superuser_token_headers
+    ).headers["etag"]
+    client.put(
+        f"{url}/{sub_todo_id}", headers=superuser_token_headers, json={"title": "new"}
+    )
+    response = client.get(
+        url, headers={**superuser_token_headers, "If-None-Match": list_etag}
+    )
+    assert response.status_code == 200
+    response = client.get(
+        f"{url}/{sub_todo_id}",
+        headers={**superuser_token_headers, "If-None-Match": item_etag},
+    )
+    assert response.status_code == 200
+    assert response.json()["title"] == "new"
+
+    # Adding a subtodo changes the list
+    list_etag = client.get(url, headers=superuser_token_headers).headers["etag"]
+    client.post(url, headers=superuser_token_headers, json={"title": "two", "desc": ""})
+    response = client.get(
+        url, headers={**superuser_token_headers, "If-None-Match": list_etag}
+    )
+    assert response.status_code == 200
+    assert response.json()["count"] == 2
@@ -0,0 +1,823 @@
+import asyncio
+import base64
+import json
+import uuid
+from datetime import datetime, timedelta
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from app import crud
+from app.core.config import settings
+from app.core.db import engine
+from app.core.events import change_listener, notify_change
+from app.core.read_cache import MemoryBackend, read_cache
+from app.models import (
+    ChangeAction,
+    SubTodo,
+    Todo,
+    TodoChangeEvent,
+    Tombstone,
+    TombstoneKind,
+    User,
+    UserCreate,
+)
+from app.tests.utils.todo import create_random_todo
+from app.tests.utils.user import user_authentication_headers
+from app.tests.utils.utils import random_email, random_lower_string
+
+
+def _create_user_with_headers(
+    client: TestClient, db: Session
+) -> tuple[User, dict[str, str]]:
+    email = random_email()
+    password = random_lower_string()
+    user = crud.create_user(
+        session=db, user_create=UserCreate(email=email, password=password)
+    )
+    headers = user_authentication_headers(client=client, email=email, password=password)
+    return user, headers
+
+
+def test_create_todo(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    data = {"title": "Foo", "desc": "Fighters"}
+    response = client.post(
+        f"{settings.API_V1_STR}/todos/",
+        headers=normal_user_token_headers,
+        json=data,
+    )
+    assert response.status_code == 200
+    content = response.json()
+    assert content["title"] == data["title"]
+    assert content["desc"] == data["desc"]
+    assert content["status"] == "in_progress"
+    assert "id" in content
+    assert "owner_id" in content
+
+
+def test_read_todo_not_found(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    response = client.get(
+        f"{settings.API_V1_STR}/todos/{uuid.uuid4()}",
+        headers=superuser_token_headers,
+    )
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Task not found"
+
+
+def test_read_todos_cursor_pagination(client: TestClient, db: Session) -> None:
+    user, headers = _create_user_with_headers(client, db)
+    todos = [create_random_todo(db, owner=user) for _ in range(5)]
+    seen: list[str] = []
+    cursor = None
+    while True:
+        params: dict[str, str | int] = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(
+            f"{settings.API_V1_STR}/todos/", headers=headers, params=params
+        )
+        assert response.status_code == 200
+        content = response.json()
+        assert content["count"] == 5
+        seen.extend(todo["id"] for todo in content["data"])
+        cursor = content["next_cursor"]
+        if not cursor:
+            break
+    newest_first = sorted(todos, key=lambda t: (t.created_at, t.id), reverse=True)
+    assert seen == [str(todo.id) for todo in newest_first]
+
+
+def test_read_todos_offset_page_matches_cursor_page(
+    client: TestClient, db: Session
+) -> None:
+    user, headers = _create_user_with_headers(client, db)
+    for _ in range(4):
+        create_random_todo(db, owner=user)
+    first = client.get(
+        f"{settings.API_V1_STR}/todos/", headers=headers, params={"limit": 2}
+    ).json()
+    by_cursor = client.get(
+        f"{settings.API_V1_STR}/todos/",
+        headers=headers,
+        params={"limit": 2, "cursor": first["next_cursor"]},
+    ).json()
+    by_offset = client.get(
+        f"{settings.API_V1_STR}/todos/",
+        headers=headers,
+        params={"limit": 2, "skip": 2},
+    ).json()
+    assert by_cursor["data"] == by_offset["data"]
+    assert by_cursor["next_cursor"] is None
+
+
+def test_read_todos_fast_responses_match(client: TestClient, db: Session) -> None:
+    user, headers = _create_user_with_headers(client, db)
+    for _ in range(2):
+        create_random_todo(db, owner=user, title="fast path")
+    todo = create_random_todo(db, owner=user)
+    db.add(SubTodo(title="Step", desc="One", todo_id=todo.id))
+    db.commit()
+    first = client.get(
+        f"{settings.API_V1_STR}/todos/", headers=headers, params={"limit": 2}
+    ).json()
+    cases: list[dict[str, str | int]] = [
+        {"limit": 2},
+        {"limit": 2, "cursor": first["next_cursor"]},
+        {"limit": 2, "skip": 1, "count_mode": "none"},
+        {"search": "fast path"},
+    ]
+    for params in cases:
+        responses = []
+        for fast in (False, True):
+            with patch.object(settings, "FAST_LIST_RESPONSES", fast):
+                response = client.get(
+                    f"{settings.API_V1_STR}/todos/", headers=headers, params=params
+                )
+            assert response.status_code == 200
+            assert response.headers["content-type"] == "application/json"
+            responses.append(response.json())
+        assert responses[0] == responses[1]
+        assert responses[0]["data"]
+
+
+def test_read_todo_not_modified(client: TestClient, db: Session) -> None:
+    user, headers = _create_user_with_headers(client, db)
+    todo = create_random_todo(db, owner=user)
+    url = f"{settings.API_V1_STR}/todos/{todo.id}"
+    response = client.get(url, headers=headers)
+    etag = response.headers["etag"]
+    assert response.headers["last-modified"]
+    assert response.headers["cache-control"] == "private, no-cache"
+
+    response = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+    response = client.get(url, headers={**headers, "If-None-Match": f"W/{etag}"})
+    assert response.status_code == 304
+    response = client.get(
+        url,
+        headers={
+            **headers,
+            "If-Modified-Since": response.headers["last-modified"],
+        },
+    )
+    assert response.status_code == 304
+
+    client.put(url, headers=headers, json={"title": "Changed"})
+    response = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["title"] == "Changed"
+
+
+def test_read_todo_cached(client: TestClient, db: Session) -> None:
+    user, headers = _create_user_with_headers(client, db)
+    todo = create_random_todo(db, owner=user)
+    url = f"{settings.API_V1_STR}/todos/{todo.id}"
+    with patch.object(read_cache, "backend", MemoryBackend(maxsize=100, ttl=60)):
+        first = client.get(url, headers=headers)
+        # Changed behind the app's back, the cached response is served
+        todo.title = "Unseen"
+        db.add(todo)
+        db.commit()
+        hits = read_cache.hits
+        second = client.get(url, headers=headers)
+        assert read_cache.hits == hits + 1
+        assert second.json() == first.json()
+        assert second.headers["etag"] == first.headers["etag"]
+        response = client.get(
+            url, headers={**headers, "If-None-Match": first.headers["etag"]}
+        )
+        assert response.status_code == 304
+
+        client.put(url, headers=headers, json={"desc": "Changed"})
+        response = client.get(url, headers=headers)
+        assert response.json()["title"] == "Unseen"
+        assert response.json()["desc"] == "Changed"
+
+        subtodos_url = f"{url}/subtodos"
+        client.post(subtodos_url, headers=headers, json={"title": "One", "desc": "A"})
+        assert client.get(subtodos_url, headers=headers).json()["count"] == 1
+        client.post(subtodos_url, headers=headers, json={"title": "Two", "desc": "B"})
+        assert client.get(subtodos_url, headers=headers).json()["count"] == 2
+
+
+def test_read_todos_not_modified(client: TestClient, db: Session) -> None:
+    user, headers = _create_user_with_headers(client, db)
+    todo = create_random_todo(db, owner=user)
+    url = f"{settings.API_V1_STR}/todos/"
+
+    def get(etag: str | None = None, params: dict[str, Any] | None = None) -> Any:
+        conditional = {"If-None-Match": etag} if etag else {}
+        return client.get(url, headers={**headers, **conditional}, params=params)
+
+    response = get()
+    etag = response.headers["etag"]
+    assert get(etag).status_code == 304
+    # Only the ETag tells whether a list changed
+    assert "last-modified" not in response.headers
+    since = {"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"}
+    assert client.get(url, headers={**headers, **since}).status_code == 200
+    for fast in (False, True):
+        with patch.object(settings, "FAST_LIST_RESPONSES", fast):
+            response = get()
+            assert response.status_code == 200
+            assert response.headers["etag"] == etag
+    # Another page of the same todos
+    assert get(etag, {"limit": 1}).status_code == 200
+
+    response = client.post(url, headers=headers, json={"title": "New", "desc": ""})
+    new_id = response.json()["id"]
+    response = get(etag)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    client.put(f"{url}{todo.id}", headers=headers, json={"status": "completed"})
+    response = get(etag)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    client.post(
+        f"{url}{todo.id}/subtodos", headers=headers, json={"title": "Sub", "desc": ""}
+    )
+    response = get(etag)
+    assert response.status_code == 200
+    assert response.json()["data"][-1]["subtodo_total"] == 1
+    etag = response.headers["etag"]
+    client.delete(f"{url}{new_id}", headers=headers)
+    response = get(etag)
+    assert response.status_code == 200
+    assert response.json()["count"] == 1
+
+
+def test_read_todos_not_modified_out_of_order_commits(
+    client: TestClient, db: Session
+) -> None:
+    user, headers = _create_user_with_headers(client, db)
+    first_todo = create_random_todo(db, owner=user)
+    second_todo = create_random_todo(db, owner=user)
+    url = f"{settings.API_V1_STR}/todos/"
+
+    def update(session: Session, todo_id: uuid.UUID, title: str) -> None:
+        todo = session.get(Todo, todo_id)
+        assert todo
+        todo.sqlmodel_update({"title": title, "updated_at": datetime.now()})
+        session.add(todo)
+        notify_change(
+            session=session,
+            event=TodoChangeEvent(
+                kind=TombstoneKind.todo,
+                action=ChangeAction.updated,
+                owner_id=user.id,
+                object_id=todo_id,
+            ),
+        )
+        session.flush()
+
+    with Session(engine) as first, Session(engine) as second:
+        # The first write is made earlier but commits last
+        update(first, first_todo.id, "First")
+        update(second, second_todo.id, "Second")
+        second.commit()
+        etag = client.get(url, headers=headers).headers["etag"]
+        first.commit()
+    response = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert {todo["title"] for todo in response.json()["data"]} == {"First", "Second"}
+
+
+def test_read_todos_invalid_cursor(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    response = client.get(
+        f"{settings.API_V1_STR}/todos/",
+        headers=normal_user_token_headers,
+        params={"cursor": "not-a-cursor"},
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_read_todos_cursor_with_invalid_id(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    # Well-formed base64 JSON, with a number in place of the id
+    cursor = base64.urlsafe_b64encode(b"[null,5]").decode()
+    response = client.get(
+        f"{settings.API_V1_STR}/todos/",
+        headers=normal_user_token_headers,
+        params={"cursor": cursor},
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_read_todos_count_modes(client: TestClient, db: Session) -> None:
+    user, headers = _create_user_with_headers(client, db)
+    for _ in range(3):
+        create_random_todo(db, owner=user)
+    counts = {}
+    for mode in ("exact", "estimated", "none"):
+        response = client.get(
+            f"{settings.API_V1_STR}/todos/",
+            headers=headers,
+            params={"limit": 2, "count_mode": mode},
+        )
+        assert response.status_code == 200
+        content = response.json()
+        assert content["has_more"] is True
+        counts[mode] = content["count"]
+    assert counts == {"exact": 3, "estimated": 3, "none": None}
+
+
+def test_read_todos_estimated_count_with_status_filter(
+    client: TestClient, db: Session
+) -> None:
+    user, headers = _create_user_with_headers(client, db)
+    for _ in range(3):
+        create_random_todo(db, owner=user)
+    response = client.get(
+        f"{settings.API_V1_STR}/todos/",
+        headers=headers,
+        params={"count_mode": "estimated", "status": ["pending", "in_progress"]},
+    )
+    assert response.status_code == 200
+    assert response.json()["count"] == 3
+
+
+def test_read_todos_search(client: TestClient, db: Session) -> None:
+    user, headers = _create_user_with_headers(client, db)
+    word_match = create_random_todo(db, owner=user, title="buy milk", desc="shop")
+    ranked_higher = create_random_todo(
+        db, owner=user, title="milk the cow", desc="more milk"
+    )
+    substring_match = create_random_todo(db, owner=user, title="buttermilk pancakes")
+    create_random_todo(db, owner=user, title="walk the dog")
+
+    response = client.get(
+        f"{settings.API_V1_STR}/todos/", headers=headers, params={"search": "milk"}
+    )
+    assert response.status_code == 200
+    content = response.json()
+    assert content["count"] == 3
+    ids = [todo["id"] for todo in content["data"]]
+    assert set(ids) == {
+        str(word_match.id),
+        str(ranked_higher.id),
+        str(substring_match.id),
+    }
+    assert ids[0] == str(ranked_higher.id)
+    assert ids[-1] == str(substring_match.id)
+
+
+def test_read_todos_search_escapes_wildcards(client: TestClient, db: Session) -> None:
+    user, headers = _create_user_with_headers(client, db)
+    match = create_random_todo(db, owner=user, title="100% done")
+    create_random_todo(db, owner=user, title="1000 done")
+
+    response = client.get(
+        f"{settings.API_V1_STR}/todos/", headers=headers, params={"search": "0%"}
+    )
+    content = response.json()
+    assert [todo["id"] for todo in content["data"]] == [str(match.id)]
+
+
+def test_read_todos_legacy_search(client: TestClient, db: Session) -> None:
+    user, headers = _create_user_with_headers(client, db)
+    match = create_random_todo(db, owner=user, title="buttermilk")
+    create_random_todo(db, owner=user)
+
+    response = client.get(
+        f"{settings.API_V1_STR}/todos/",
+        headers=headers,
+        params={"search": "ttermil", "search_mode": "legacy"},
+    )
+    content = response.json()
+    assert content["count"] == 1
+    assert content["data"][0]["id"] == str(match.id)
+
+
+def test_read_todo_tree(client: TestClient, db: Session) -> None:
+    user, headers = _create_user_with_headers(client, db)
+    with_subtodos = create_random_todo(db, owner=user)
+    without_subtodos = create_random_todo(db, owner=user)
+    for title in ("first", "second"):
+        db.add(SubTodo(title=title, desc="", todo_id=with_subtodos.id))
+    db.commit()
+
+    response = client.get(f"{settings.API_V1_STR}/todos/tree", headers=headers)
+    assert response.status_code == 200
+    content = response.json()
+    assert content["count"] == 2
+    subtodos = {todo["id"]: todo["subtodos"] for todo in content["data"]}
+    assert sorted(sub["title"] for sub in subtodos[str(with_subtodos.id)]) == [
+        "first",
+        "second",
+    ]
+    assert subtodos[str(without_subtodos.id)] == []
+
+
+def test_create_todos_bulk(client: TestClient, db: Session) -> None:
+    _, headers = _create_user_with_headers(client, db)
+    data = [
+        {"title": "first", "desc": "a"},
+        {"title": "", "desc": "empty title"},
+        {"title": "second", "desc": "b"},
+        {"desc": "missing title"},
+    ]
+    response = client.post(
+        f"{settings.API_V1_STR}/todos/bulk", headers=headers, json=data
+    )
+    assert response.status_code == 200
+    content = response.json()
+    assert len(content["ids"]) == 2
+    assert [error["index"] for error in content["errors"]] == [1, 3]
+    assert content["errors"][1]["errors"][0]["loc"] == ["title"]
+
+    response = client.get(f"{settings.API_V1_STR}/todos/", headers=headers)
+    titles = {todo["id"]: todo["title"] for todo in response.json()["data"]}
+    assert sorted(titles[id] for id in content["ids"]) == ["first", "second"]
+
+
+@pytest.mark.parametrize("copy_threshold", [1000, 1])
+def test_create_todos_bulk_ignores_client_timestamps(
+    client: TestClient, db: Session, copy_threshold: int
+) -> None:
+    _, headers = _create_user_with_headers(client, db)
+    response = client.get(f"{settings.API_V1_STR}/todos/changes", headers=headers)
+    since = response.json()["token"]
+    backdated = "2000-01-01T00:00:00"
+    data = [
+        {"title": f"imported {i}", "desc": "", "updated_at": backdated}
+        for i in range(2)
+    ]
+    with patch("app.crud.TODO_BULK_COPY_THRESHOLD", copy_threshold):
+        response = client.post(
+            f"{settings.API_V1_STR}/todos/bulk", headers=headers, json=data
+        )
+    ids = response.json()["ids"]
+
+    response = client.get(
+        f"{settings.API_V1_STR}/todos/changes",
+        headers=headers,
+        params={"since": since},
+    )
+    assert {todo["id"] for todo in response.json()["todos"]} == set(ids)
+
+
+def test_create_todos_bulk_batches(client: TestClient, db: Session) -> None:
+    _, headers = _create_user_with_headers(client, db)
+    data = [{"title": f"batched {i}", "desc": ""} for i in range(5)]
+    with patch.object(crud, "TODO_BULK_BATCH_SIZE", 2):
+        response = client.post(
+            f"{settings.API_V1_STR}/todos/bulk", headers=headers, json=data
+        )
+    ids = response.json()["ids"]
+    assert len(ids) == 5
+    for i, id in enumerate(ids):
+        response = client.get(f"{settings.API_V1_STR}/todos/{id}", headers=headers)
+        assert response.json()["title"] == f"batched {i}"
+
+
+def test_create_todos_bulk_schema(client: TestClient) -> None:
+    openapi = client.get(f"{settings.API_V1_STR}/openapi.json").json()
+    body = openapi["paths"][f"{settings.API_V1_STR}/todos/bulk"]["post"]
+    schema = body["requestBody"]["content"]["application/json"]["schema"]
+    assert schema["items"] == {"$ref": "#/components/schemas/TodoCreate"}
+
+
+def test_create_todos_bulk_copy(client: TestClient, db: Session) -> None:
+    _, headers = _create_user_with_headers(client, db)
+    data = [{"title": f"todo {i}", "desc": ""} for i in range(1500)]
+    response = client.post(
+        f"{settings.API_V1_STR}/todos/bulk", headers=headers, json=data
+    )
+    assert response.status_code == 200
+    assert len(response.json()["ids"]) == 1500
+
+    response = client.get(
+        f"{settings.API_V1_STR}/todos/",
+        headers=headers,
+        params={"limit": 1, "search": "todo 1499"},
+    )
+    assert response.json()["data"][0]["title"] == "todo 1499"
+
+
+def test_update_todos_bulk(client: TestClient, db: Session) -> None:
+    user, headers = _create_user_with_headers(client, db)
+    selected = [create_random_todo(db, owner=user) for _ in range(2)]
+    untouched = create_random_todo(db, owner=user)
+    other_users_todo = create_random_todo(db)
+
+    response = client.patch(
+        f"{settings.API_V1_STR}/todos/bulk",
+        headers=headers,
+        json={
+            "filter": {"ids": [str(todo.id) for todo in [*selected, other_users_todo]]},
+            "status": "completed",
+        },
+    )
+    assert response.status_code == 200
+    assert response.json() == {"count": 2}
+
+    for todo in [*selected, untouched, other_users_todo]:
+        db.refresh(todo)
+    assert [todo.status for todo in selected] == ["completed", "completed"]
+    assert untouched.status == "in_progress"
+    assert other_users_todo.status == "in_progress"
+
+
+def test_delete_todos_bulk_by_status(client: TestClient, db: Session) -> None:
+    user, headers = _create_user_with_headers(client, db)
+    for _ in range(3):
+        create_random_todo(db, owner=user)
+    client.patch(
+        f"{settings.API_V1_STR}/todos/bulk",
+        headers=headers,
+        json={"status": "completed"},
+    )
+    remaining = create_random_todo(db, owner=user)
+
+    response = client.request(
+        "DELETE",
+        f"{settings.API_V1_STR}/todos/bulk",
+        headers=headers,
+        json={"status": "completed"},
+    )
+    assert response.status_code == 200
+    assert response.json() == {"count": 3}
+
+    response = client.get(f"{settings.API_V1_STR}/todos/", headers=headers)
+    assert [todo["id"] for todo in response.json()["data"]] == [str(remaining.id)]
+
+
+def test_delete_todos_bulk_empty_filter(client: TestClient, db: Session) -> None:
+    user, headers = _create_user_with_headers(client, db)
+    for _ in range(2):
+        create_random_todo(db, owner=user)
+
+    response = client.request(
+        "DELETE", f"{settings.API_V1_STR}/todos/bulk", headers=headers, json={}
+    )
+    assert response.status_code == 422
+    response = client.get(f"{settings.API_V1_STR}/todos/", headers=headers)
+    assert response.json()["count"] == 2
+
+    response = client.request(
+        "DELETE",
+        f"{settings.API_V1_STR}/todos/bulk",
+        headers=headers,
+        json={"all": True},
+    )
+    assert response.status_code == 200
+    assert response.json() == {"count": 2}
+
+
+def test_read_todos_status_filter(client: TestClient, db: Session) -> None:
+    user, headers = _create_user_with_headers(client, db)
+    open_todo = create_random_todo(db, owner=user)
+    completed_todo = create_random_todo(db, owner=user)
+    client.put(
+        f"{settings.API_V1_STR}/todos/{completed_todo.id}",
+        headers=headers,
+        json={"status": "completed"},
+    )
+
+    response = client.get(
+        f"{settings.API_V1_STR}/todos/",
+        headers=headers,
+        params={"status": ["pending", "in_progress"]},
+    )
+    assert response.status_code == 200
+    assert [todo["id"] for todo in response.json()["data"]] == [str(open_todo.id)]
+
+
+def test_update_todo_invalid_status(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    todo = create_random_todo(db)
+    response = client.put(
+        f"{settings.API_V1_STR}/todos/{todo.id}",
+        headers=normal_user_token_headers,
+        json={"status": "done-ish"},
+    )
+    assert response.status_code == 422
+
+
+def test_read_todo_stats(client: TestClient, db: Session) -> None:
+    user, headers = _create_user_with_headers(client, db)
+    for _ in range(3):
+        create_random_todo(db, owner=user, title="chore")
+    create_random_todo(db, owner=user, title="errand")
+    create_random_todo(db)
+    client.patch(
+        f"{settings.API_V1_STR}/todos/bulk",
+        headers=headers,
+        json={"filter": {"search": "errand"}, "status": "completed"},
+    )
+
+    response = client.get(f"{settings.API_V1_STR}/todos/stats", headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {
+        "counts": {"pending": 0, "completed": 1, "in_progress": 3},
+        "total": 4,
+    }
+
+    response = client.get(
+        f"{settings.API_V1_STR}/todos/stats",
+        headers=headers,
+        params={"search": "chore"},
+    )
+    assert response.json()["total"] == 3
+
+
+def test_read_all_todo_stats(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    normal_user_token_headers: dict[str, str],
+    db: Session,
+) -> None:
+    create_random_todo(db)
+    response = client.get(
+        f"{settings.API_V1_STR}/todos/stats/all", headers=superuser_token_headers
+    )
+    assert response.status_code == 200
+    assert response.json()["total"] >= 1
+
+    response = client.get(
+        f"{settings.API_V1_STR}/todos/stats/all", headers=normal_user_token_headers
+    )
+    assert response.status_code == 403
+
+
+def test_delete_todo_with_subtodos(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    todo = create_random_todo(db)
+    db.add(SubTodo(title="sub", desc="", todo_id=todo.id))
+    db.commit()
+    response = client.delete(
+        f"{settings.API_V1_STR}/todos/{todo.id}", headers=superuser_token_headers
+    )
+    assert response.status_code == 200
+    assert response.json()["message"] == "Task deleted successfully"
+
+
+def test_read_todo_changes(client: TestClient, db: Session) -> None:
+    user, headers = _create_user_with_headers(client, db)
+    unchanged = create_random_todo(db, owner=user)
+    updated = create_random_todo(db, owner=user)
+    deleted = create_random_todo(db, owner=user)
+    subtodo_parent = create_random_todo(db, owner=user)
+
+    response = client.get(f"{settings.API_V1_STR}/todos/changes", headers=headers)
+    assert response.status_code == 200
+    content = response.json()
+    assert len(content["todos"]) == 4
+    assert content["deleted"] == []
+
+    with patch("app.api.routes.todos.SYNC_OVERLAP", timedelta(0)):
+        since = content["token"]
+        client.put(
+            f"{settings.API_V1_STR}/todos/{updated.id}",
+            headers=headers,
+            json={"title": "renamed"},
+        )
+        client.delete(f"{settings.API_V1_STR}/todos/{deleted.id}", headers=headers)
+        subtodo = client.post(
+            f"{settings.API_V1_STR}/todos/{subtodo_parent.id}/subtodos",
+            headers=headers,
+            json={"title": "sub", "desc": ""},
+        ).json()
+
+        response = client.get(
+            f"{settings.API_V1_STR}/todos/changes",
+            headers=headers,
+            params={"since": since},
+        )
+    content = response.json()
+    changed_ids = {todo["id"] for todo in content["todos"]}
+    assert changed_ids == {str(updated.id), str(subtodo_parent.id)}
+    assert str(unchanged.id) not in changed_ids
+    assert [sub["id"] for sub in content["subtodos"]] == [subtodo["id"]]
+    assert [(d["kind"], d["object_id"]) for d in content["deleted"]] == [
+        ("todo", str(deleted.id))
+    ]
+
+
+def test_read_todo_changes_ignores_client_timestamps(
+    client: TestClient, db: Session
+) -> None:
+    _, headers = _create_user_with_headers(client, db)
+    response = client.get(f"{settings.API_V1_STR}/todos/changes", headers=headers)
+    since = response.json()["token"]
+    backdated = "2000-01-01T00:00:00"
+    response = client.post(
+        f"{settings.API_V1_STR}/todos/",
+        headers=headers,
+        json={
+            "title": "Imported",
+            "desc": "",
+            "created_at": backdated,
+            "updated_at": backdated,
+        },
+    )
+    assert response.status_code == 200
+    todo = response.json()
+    assert todo["updated_at"] != backdated
+
+    response = client.get(
+        f"{settings.API_V1_STR}/todos/changes",
+        headers=headers,
+        params={"since": since},
+    )
+    assert [t["id"] for t in response.json()["todos"]] == [todo["id"]]
+
+
+def test_read_todo_changes_invalid_token(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    response = client.get(
+        f"{settings.API_V1_STR}/todos/changes",
+        headers=normal_user_token_headers,
+        params={"since": "???"},
+    )
+    assert response.status_code == 400
+
+
+def test_read_todo_changes_expired_token(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    synced_at = datetime.now() - timedelta(days=settings.TOMBSTONE_RETENTION_DAYS + 1)
+    response = client.get(
+        f"{settings.API_V1_STR}/todos/changes",
+        headers=normal_user_token_headers,
+        params={
+            "since": base64.urlsafe_b64encode(synced_at.isoformat().encode()).decode()
+        },
+    )
+    assert response.status_code == 410
+
+
+def test_delete_todo_purges_expired_tombstones(client: TestClient, db: Session) -> None:
+    user, headers = _create_user_with_headers(client, db)
+    expired = Tombstone(
+        owner_id=user.id,
+        kind=TombstoneKind.todo,
+        object_id=uuid.uuid4(),
+        deleted_at=datetime.now()
+        - timedelta(days=settings.TOMBSTONE_RETENTION_DAYS + 1),
+    )
+    db.add(expired)
+    db.commit()
+    todo = create_random_todo(db, owner=user)
+
+    with patch("app.crud.TOMBSTONES_PRUNE_INTERVAL", 0):
+        response = client.delete(
+            f"{settings.API_V1_STR}/todos/{todo.id}", headers=headers
+        )
+    assert response.status_code == 200
+    db.expire_all()
+    tombstones = db.exec(select(Tombstone).where(Tombstone.owner_id == user.id)).all()
+    assert [t.object_id for t in tombstones] == [todo.id]
+
+
+def test_todo_change_events(client: TestClient, db: Session) -> None:
+    user, headers = _create_user_with_headers(client, db)
+    _, other_headers = _create_user_with_headers(client, db)
+
+    def create(headers: dict[str, str]) -> str:
+        response = client.post(
+            f"{settings.API_V1_STR}/todos/",
+            headers=headers,
+            json={"title": "Live", "desc": "Push"},
+        )
+        return str(response.json()["id"])
+
+    async def receive() -> tuple[str, dict[str, str]]:
+        async with change_listener.subscribe(user.id) as queue:
+            # The LISTEN connection is opened lazily, retry until it is up
+            for _ in range(20):
+                await asyncio.to_thread(create, other_headers)
+                todo_id = await asyncio.to_thread(create, headers)
+                try:
+                    payload = await asyncio.wait_for(queue.get(), 0.5)
+                except asyncio.TimeoutError:
+                    continue
+                while payload and json.loads(payload)["object_id"] != todo_id:
+                    payload = await asyncio.wait_for(queue.get(), 0.5)
+                assert payload is not None
+                return todo_id, json.loads(payload)
+        raise AssertionError("no change event received")
+
+    todo_id, event = asyncio.run(receive())
+    assert event["kind"] == "todo"
+    assert event["action"] == "created"
+    assert event["owner_id"] == str(user.id)
+    assert event["object_id"] == todo_id
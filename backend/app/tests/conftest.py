@@ -7,7 +7,7 @@ from sqlmodel import Session, delete
 from app.core.config import settings
 from app.core.db import engine, init_db
 from app.main import app
-from app.models import Item, User
+from app.models import EmailOutbox, Item, LoginBucket, User
 from app.tests.utils.user import authentication_token_from_email
 from app.tests.utils.utils import get_superuser_token_headers
 
@@ -16,11 +16,18 @@ from app.tests.utils.utils import get_superuser_token_headers
 def db() -> Generator[Session, None, None]:
     with Session(engine) as session:
         init_db(session)
+        # Login budgets left over by an earlier run
+        session.execute(delete(LoginBucket))
+        session.commit()
         yield session
         statement = delete(Item)
         session.execute(statement)
         statement = delete(User)
         session.execute(statement)
+        statement = delete(LoginBucket)
+        session.execute(statement)
+        statement = delete(EmailOutbox)
+        session.execute(statement)
         session.commit()
 
 
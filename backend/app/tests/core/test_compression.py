@@ -0,0 +1,139 @@
+import asyncio
+import gzip
+import zlib
+from typing import Any
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+from starlette.types import Message
+
+from app.core.compression import (
+    COMPRESSION_RATIO,
+    RESPONSE_BYTES,
+    CompressionMiddleware,
+    negotiate_encoding,
+)
+from app.core.config import settings
+
+PAYLOAD = {"data": [{"title": "Buy milk", "desc": "At the shop"}] * 100}
+
+test_app = FastAPI()
+test_app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+
+@test_app.get("/large/{id}")
+def large(id: int) -> Any:
+    return {"id": id, **PAYLOAD}
+
+
+@test_app.get("/small")
+def small() -> Any:
+    return {"ok": True}
+
+
+@test_app.get("/binary")
+def binary() -> PlainTextResponse:
+    return PlainTextResponse(b"\0" * 1000, media_type="application/octet-stream")
+
+
+@test_app.get("/tagged")
+def tagged() -> JSONResponse:
+    return JSONResponse(PAYLOAD, headers={"ETag": '"abc"'})
+
+
+@test_app.get("/events")
+def events() -> StreamingResponse:
+    def stream() -> Any:
+        for i in range(3):
+            yield f"data: {i}\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+test_client = TestClient(test_app)
+
+
+def test_negotiate_encoding() -> None:
+    encodings = ["br", "zstd", "gzip"]
+    assert negotiate_encoding("gzip, br", encodings) == "br"
+    assert negotiate_encoding("gzip;q=1, br;q=0.5", encodings) == "gzip"
+    assert negotiate_encoding("br;q=0, *", encodings) == "zstd"
+    assert negotiate_encoding("identity", encodings) is None
+    assert negotiate_encoding("", encodings) is None
+    assert negotiate_encoding("br", ["gzip"]) is None
+
+
+def test_compresses_large_responses() -> None:
+    original = RESPONSE_BYTES.value("/large/{id}", "gzip", "original")
+    ratios = COMPRESSION_RATIO.count("/large/{id}", "gzip")
+    response = test_client.get("/large/1", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.json() == {"id": 1, **PAYLOAD}
+    assert int(response.headers["content-length"]) < len(response.content)
+    assert RESPONSE_BYTES.value("/large/{id}", "gzip", "original") == original + len(
+        response.content
+    )
+    assert COMPRESSION_RATIO.count("/large/{id}", "gzip") == ratios + 1
+
+
+def test_skips_small_binary_and_unaccepted() -> None:
+    response = test_client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+    response = test_client.get("/binary", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    response = test_client.get("/large/1", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+
+
+def test_weakens_etag_of_compressed_responses() -> None:
+    response = test_client.get("/tagged", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["etag"] == 'W/"abc"'
+
+
+def test_flushes_every_streamed_chunk() -> None:
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/events",
+        "raw_path": b"/events",
+        "root_path": "",
+        "scheme": "http",
+        "query_string": b"",
+        "headers": [(b"accept-encoding", b"gzip")],
+        "server": ("test", 80),
+        "client": ("test", 1234),
+        "http_version": "1.1",
+    }
+    sent: list[Message] = []
+
+    async def receive() -> Message:
+        await asyncio.sleep(10)
+        return {"type": "http.disconnect"}
+
+    async def send(message: Message) -> None:
+        sent.append(message)
+
+    asyncio.run(test_app(scope, receive, send))
+
+    start, *bodies = sent
+    headers = dict(start["headers"])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in headers
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    # Every event can be decoded as soon as its chunk arrives
+    chunks = [decompressor.decompress(body["body"]) for body in bodies]
+    assert chunks[:3] == [b"data: 0\n\n", b"data: 1\n\n", b"data: 2\n\n"]
+    assert gzip.decompress(b"".join(body["body"] for body in bodies)) == (
+        b"data: 0\n\ndata: 1\n\ndata: 2\n\n"
+    )
+
+
+def test_app_compresses_responses(client: TestClient) -> None:
+    response = client.get(
+        f"{settings.API_V1_STR}/openapi.json", headers={"Accept-Encoding": "gzip"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
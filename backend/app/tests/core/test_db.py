@@ -0,0 +1,176 @@
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi import Request
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, exc
+from sqlmodel import Session
+
+from app import crud
+from app.api.deps import get_read_db
+from app.core.config import settings
+from app.core.db import (
+    LAST_WRITE_COOKIE,
+    POOL_CHECKOUT_TIMEOUTS,
+    POOL_CHECKOUT_WAIT,
+    InstrumentedNullPool,
+    InstrumentedQueuePool,
+    ReplicaSet,
+    engine_options,
+    wrote_recently,
+)
+from app.models import AuthUser
+from app.tests.utils.user import create_random_user
+
+
+def test_engine_options_queue() -> None:
+    with patch.multiple(settings, POSTGRES_POOL_SIZE=20, POSTGRES_POOL_PRE_PING=True):
+        options = engine_options(name="test")
+    assert options["poolclass"] is InstrumentedQueuePool
+    assert options["pool_size"] == 20
+    assert options["pool_pre_ping"] is True
+    assert "connect_args" not in options
+
+
+def test_engine_options_pgbouncer() -> None:
+    with patch.object(settings, "POSTGRES_POOL_MODE", "pgbouncer"):
+        options = engine_options(name="test")
+    assert options["poolclass"] is InstrumentedNullPool
+    assert "pool_size" not in options
+    assert options["connect_args"] == {"prepare_threshold": None}
+
+
+def test_pool_checkout_timeout_is_counted() -> None:
+    with patch.multiple(
+        settings,
+        POSTGRES_POOL_SIZE=1,
+        POSTGRES_MAX_OVERFLOW=0,
+        POSTGRES_POOL_TIMEOUT=0.05,
+    ):
+        engine = create_engine(
+            str(settings.SQLALCHEMY_DATABASE_URI),
+            **engine_options(name="timeout_test"),
+        )
+    waits = POOL_CHECKOUT_WAIT.count("timeout_test")
+    with engine.connect():
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+    engine.dispose()
+    assert POOL_CHECKOUT_TIMEOUTS.value("timeout_test") == 1
+    assert POOL_CHECKOUT_WAIT.count("timeout_test") == waits + 2
+
+
+def test_metrics_endpoint(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    client.get(f"{settings.API_V1_STR}/todos/", headers=normal_user_token_headers)
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert 'db_pool_checkout_wait_seconds_count{pool="primary"}' in r.text
+    assert 'db_pool_connections_in_use{pool="primary"} ' in r.text
+
+
+def _replica_set(*ports: int) -> ReplicaSet:
+    return ReplicaSet(
+        [
+            create_engine(
+                str(settings.SQLALCHEMY_DATABASE_URI).replace(
+                    f":{settings.POSTGRES_PORT}/", f":{port}/"
+                ),
+                **engine_options(name=f"replica_test_{port}", pre_ping=True),
+            )
+            for port in ports
+        ]
+    )
+
+
+def _request(cookie: str | None = None) -> Request:
+    headers = [(b"cookie", cookie.encode())] if cookie else []
+    return Request({"type": "http", "headers": headers})
+
+
+def test_read_db_fails_over_to_next_replica(db: Session) -> None:
+    user = create_random_user(db)
+    # Nothing listens on port 1, the second replica is the same database
+    replica_set = _replica_set(1, settings.POSTGRES_PORT)
+    with patch("app.api.deps.replicas", replica_set):
+        for _ in range(2):
+            sessions = get_read_db(db, AuthUser.model_validate(user), _request())
+            session = next(sessions)
+            assert session.get_bind() is replica_set.engines[1]
+            sessions.close()
+    assert replica_set.candidates() == [replica_set.engines[1]]
+
+
+def test_read_db_falls_back_to_primary(db: Session) -> None:
+    user = create_random_user(db)
+    with patch("app.api.deps.replicas", _replica_set(1)):
+        sessions = get_read_db(db, AuthUser.model_validate(user), _request())
+        assert next(sessions) is db
+        sessions.close()
+
+
+def test_read_db_reads_your_writes(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    user = crud.get_user_by_email(session=db, email=settings.EMAIL_TEST_USER)
+    assert user
+    r = client.post(
+        f"{settings.API_V1_STR}/todos/",
+        headers=normal_user_token_headers,
+        json={"title": "Fresh", "desc": "Write"},
+    )
+    assert r.status_code == 200
+    assert wrote_recently(user.id)
+    with patch("app.api.deps.replicas", _replica_set(settings.POSTGRES_PORT)):
+        sessions = get_read_db(db, AuthUser.model_validate(user), _request())
+        assert next(sessions) is db
+        sessions.close()
+
+
+def test_read_db_reads_your_writes_from_other_workers(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    user = crud.get_user_by_email(session=db, email=settings.EMAIL_TEST_USER)
+    assert user
+    with patch("app.core.db.replicas", _replica_set(settings.POSTGRES_PORT)):
+        r = client.post(
+            f"{settings.API_V1_STR}/todos/",
+            headers=normal_user_token_headers,
+            json={"title": "Fresh", "desc": "Write"},
+        )
+    assert r.status_code == 200
+    cookie = r.headers["set-cookie"]
+    assert cookie.startswith(f"{LAST_WRITE_COOKIE}=")
+    client.cookies.clear()
+    # Another worker only knows of the write from the cookie
+    with (
+        patch("app.api.deps.replicas", _replica_set(settings.POSTGRES_PORT)),
+        patch("app.core.db._recent_writers", {}),
+    ):
+        sessions = get_read_db(
+            db, AuthUser.model_validate(user), _request(cookie.split(";")[0])
+        )
+        assert next(sessions) is db
+        sessions.close()
+        forged = f"{LAST_WRITE_COOKIE}={time.time() + 3600}"
+        sessions = get_read_db(db, AuthUser.model_validate(user), _request(forged))
+        assert next(sessions) is not db
+        sessions.close()
+
+
+def test_read_routes_use_replicas(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    pool_name = f"replica_test_{settings.POSTGRES_PORT}"
+    checkouts = POOL_CHECKOUT_WAIT.count(pool_name)
+    with (
+        patch("app.api.deps.replicas", _replica_set(settings.POSTGRES_PORT)),
+        patch("app.api.deps.wrote_recently", return_value=False),
+    ):
+        r = client.get(
+            f"{settings.API_V1_STR}/todos/", headers=normal_user_token_headers
+        )
+    assert r.status_code == 200
+    assert POOL_CHECKOUT_WAIT.count(pool_name) == checkouts + 1
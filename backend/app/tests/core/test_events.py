@@ -0,0 +1,100 @@
+import asyncio
+import uuid
+from typing import Any
+from unittest.mock import patch
+
+import psycopg
+from sqlmodel import Session
+
+from app.api.deps import auth_cache, invalidate_auth_user
+from app.core.events import ChangeListener, notify_change, notify_user_change
+from app.models import AuthUser, ChangeAction, TodoChangeEvent, TombstoneKind
+
+
+def _change(owner_id: uuid.UUID) -> TodoChangeEvent:
+    return TodoChangeEvent(
+        kind=TombstoneKind.todo,
+        action=ChangeAction.updated,
+        owner_id=owner_id,
+        object_id=uuid.uuid4(),
+    )
+
+
+def test_dispatch_survives_bad_payloads_and_handlers() -> None:
+    listener = ChangeListener()
+    seen: list[TodoChangeEvent] = []
+
+    def failing(_: TodoChangeEvent) -> None:
+        raise RuntimeError("boom")
+
+    listener._handlers.extend([failing, seen.append])
+    listener._dispatch("not json")
+    change = _change(uuid.uuid4())
+    listener._dispatch(change.model_dump_json())
+    assert seen == [change]
+
+
+def test_listener_reconnects_after_any_error(db: Session) -> None:
+    listener = ChangeListener()
+    owner_id = uuid.uuid4()
+    connect = psycopg.AsyncConnection.connect
+    attempts = 0
+
+    async def flaky_connect(*args: Any, **kwargs: Any) -> psycopg.AsyncConnection[Any]:
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise RuntimeError("boom")
+        return await connect(*args, **kwargs)
+
+    async def receive() -> str | None:
+        async with listener.subscribe(owner_id) as queue:
+            # Notify until the listener is connected again and delivers one
+            for _ in range(50):
+                notify_change(session=db, event=_change(owner_id))
+                db.commit()
+                try:
+                    return await asyncio.wait_for(queue.get(), 0.2)
+                except asyncio.TimeoutError:
+                    continue
+            return None
+
+    async def run() -> str | None:
+        try:
+            return await receive()
+        finally:
+            assert listener._task is not None
+            listener._task.cancel()
+
+    with patch.object(psycopg.AsyncConnection, "connect", flaky_connect):
+        payload = asyncio.run(run())
+    assert attempts == 2
+    assert payload is not None
+
+
+def test_user_changes_reach_every_listener(db: Session) -> None:
+    # A listener of its own stands for another worker
+    listener = ChangeListener()
+    user_id = uuid.uuid4()
+    seen: list[uuid.UUID] = []
+    listener._dispatch_user("not a uuid")
+
+    async def run() -> None:
+        listener.watch_users(seen.append)
+        listener.watch_users(invalidate_auth_user)
+        try:
+            for _ in range(50):
+                notify_user_change(session=db, user_id=user_id)
+                db.commit()
+                await asyncio.sleep(0.2)
+                if seen:
+                    return
+        finally:
+            await listener.stop()
+
+    auth_cache.set(
+        str(user_id), AuthUser(id=user_id, is_active=True, is_superuser=False)
+    )
+    asyncio.run(run())
+    assert seen[0] == user_id
+    assert auth_cache.get(str(user_id)) is None
@@ -0,0 +1,92 @@
+import subprocess
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.http_metrics import (
+    HTTP_REQUEST_DURATION,
+    HTTP_REQUESTS,
+    HTTP_REQUESTS_IN_FLIGHT,
+    HTTP_RESPONSE_SIZE,
+)
+from app.core.metrics import Histogram, MultiprocessWriter, merge_metrics
+
+
+def test_histogram_buckets() -> None:
+    histogram = Histogram("test_buckets", "Test.", ["name"], buckets=(1, 5))
+    for value in (0.5, 1, 3, 10):
+        histogram.observe(value, "a")
+    assert histogram.count("a") == 4
+    assert list(histogram.collect())[2:] == [
+        'test_buckets_bucket{name="a",le="1"} 2',
+        'test_buckets_bucket{name="a",le="5"} 3',
+        'test_buckets_bucket{name="a",le="+Inf"} 4',
+        'test_buckets_sum{name="a"} 14.5',
+        'test_buckets_count{name="a"} 4',
+    ]
+
+
+def test_merge_metrics() -> None:
+    worker = (
+        "# HELP requests_total Requests.\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{route="/a"} 2\n'
+        "# HELP in_flight In flight.\n"
+        "# TYPE in_flight gauge\n"
+        "in_flight 3\n"
+    )
+    other = worker.replace("} 2\n", '} 5\nrequests_total{route="/b"} 1\n')
+    assert merge_metrics([(worker, True), (other, False)]) == (
+        "# HELP requests_total Requests.\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{route="/a"} 7\n'
+        'requests_total{route="/b"} 1\n'
+        "# HELP in_flight In flight.\n"
+        "# TYPE in_flight gauge\n"
+        "in_flight 3\n"
+    )
+
+
+def test_multiprocess_writer(tmp_path: Path) -> None:
+    exited = subprocess.Popen(["true"])
+    exited.wait()
+    (tmp_path / f"metrics_{exited.pid}.prom").write_text(
+        "# HELP test_workers_total Test.\n"
+        "# TYPE test_workers_total counter\n"
+        "test_workers_total 2\n"
+    )
+    writer = MultiprocessWriter(str(tmp_path), interval=60)
+    writer.start()
+    writer.stop()
+    assert writer.path.exists()
+    text = writer.render()
+    assert "test_workers_total 2\n" in text
+    assert "# TYPE http_requests_total counter\n" in text
+
+
+def test_http_metrics(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    route = f"{settings.API_V1_STR}/todos/{{id}}"
+    r = client.post(
+        f"{settings.API_V1_STR}/todos/",
+        headers=normal_user_token_headers,
+        json={"title": "Metrics", "desc": "Route"},
+    )
+    url = f"{settings.API_V1_STR}/todos/{r.json()['id']}"
+    requests = HTTP_REQUESTS.value("GET", route, "200")
+    durations = HTTP_REQUEST_DURATION.count("GET", route)
+    sizes = HTTP_RESPONSE_SIZE.count("GET", route)
+    client.get(url, headers=normal_user_token_headers)
+    assert HTTP_REQUESTS.value("GET", route, "200") == requests + 1
+    assert HTTP_REQUEST_DURATION.count("GET", route) == durations + 1
+    assert HTTP_RESPONSE_SIZE.count("GET", route) == sizes + 1
+    assert HTTP_REQUESTS_IN_FLIGHT.value("GET") == 0
+
+    missing = HTTP_REQUESTS.value("GET", "other", "404")
+    client.get("/missing/path")
+    assert HTTP_REQUESTS.value("GET", "other", "404") == missing + 1
+
+    r = client.get("/metrics")
+    assert f'http_requests_total{{method="GET",route="{route}",status="200"}}' in r.text
@@ -0,0 +1,158 @@
+import socket
+import time
+from collections.abc import Generator
+from datetime import datetime, timedelta
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+from aiosmtpd.controller import Controller
+from sqlmodel import Session, delete, select
+
+from app.core.config import settings
+from app.core.outbox import (
+    EMAILS_SENT,
+    OutboxWorker,
+    enqueue_email,
+    purge_dropped_emails,
+    send_due_emails,
+)
+from app.models import EmailOutbox
+from app.tests.utils.utils import random_email
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.messages: list[tuple[Any, list[str]]] = []
+
+    async def handle_DATA(self, _: Any, session: Any, envelope: Any) -> str:
+        self.messages.append((session.peer, envelope.rcpt_tos))
+        return "250 OK"
+
+
+@pytest.fixture()
+def smtp_server(db: Session) -> Generator[Recorder, None, None]:
+    db.execute(delete(EmailOutbox))
+    db.commit()
+    recorder = Recorder()
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    controller = Controller(recorder, hostname="127.0.0.1", port=port)
+    controller.start()
+    try:
+        with patch.multiple(
+            settings,
+            SMTP_HOST="127.0.0.1",
+            SMTP_PORT=port,
+            SMTP_TLS=False,
+            SMTP_SSL=False,
+            SMTP_USER=None,
+            SMTP_PASSWORD=None,
+        ):
+            yield recorder
+    finally:
+        controller.stop()
+
+
+def _enqueue(db: Session, count: int) -> list[str]:
+    emails = [random_email() for _ in range(count)]
+    for email_to in emails:
+        enqueue_email(
+            session=db, email_to=email_to, subject="Subject", html_content="<p>Hi</p>"
+        )
+    db.commit()
+    return emails
+
+
+def test_send_due_emails_over_one_connection(
+    smtp_server: Recorder, db: Session
+) -> None:
+    emails = _enqueue(db, 3)
+    sent = EMAILS_SENT.value("sent")
+    assert send_due_emails() == 3
+    assert [rcpt_tos for _, rcpt_tos in smtp_server.messages] == [
+        [email] for email in emails
+    ]
+    assert len({peer for peer, _ in smtp_server.messages}) == 1
+    assert EMAILS_SENT.value("sent") == sent + 3
+    assert db.exec(select(EmailOutbox)).all() == []
+    assert send_due_emails() == 0
+
+
+def test_send_due_emails_in_batches(smtp_server: Recorder, db: Session) -> None:
+    _enqueue(db, 3)
+    assert send_due_emails(limit=2) == 2
+    assert send_due_emails(limit=2) == 1
+    assert len(smtp_server.messages) == 3
+    # One connection per batch
+    assert len({peer for peer, _ in smtp_server.messages}) == 2
+
+
+def test_send_due_emails_retries_with_backoff(
+    smtp_server: Recorder, db: Session
+) -> None:
+    (email_to,) = _enqueue(db, 1)
+    with patch.object(settings, "SMTP_PORT", 1):
+        assert send_due_emails() == 1
+    queued = db.exec(select(EmailOutbox)).one()
+    assert queued.attempts == 1
+    assert queued.last_error
+    assert queued.next_attempt_at
+    retry_at = datetime.now() + timedelta(seconds=settings.EMAIL_RETRY_SECONDS)
+    assert abs(queued.next_attempt_at - retry_at) < timedelta(seconds=5)
+    # Not due yet
+    assert send_due_emails() == 0
+
+    queued.next_attempt_at = datetime.now()
+    db.add(queued)
+    db.commit()
+    assert send_due_emails() == 1
+    assert [rcpt_tos for _, rcpt_tos in smtp_server.messages] == [[email_to]]
+
+
+def test_send_due_emails_gives_up(smtp_server: Recorder, db: Session) -> None:
+    _enqueue(db, 1)
+    queued = db.exec(select(EmailOutbox)).one()
+    queued.attempts = settings.EMAIL_MAX_ATTEMPTS - 1
+    db.add(queued)
+    db.commit()
+    with patch.object(settings, "SMTP_PORT", 1):
+        assert send_due_emails() == 1
+    db.refresh(queued)
+    assert queued.attempts == settings.EMAIL_MAX_ATTEMPTS
+    assert queued.next_attempt_at is None
+    assert queued.html_content == ""
+    assert smtp_server.messages == []
+
+
+@pytest.mark.usefixtures("smtp_server")
+def test_purge_dropped_emails(db: Session) -> None:
+    _enqueue(db, 3)
+    dropped, old_dropped, pending = db.exec(select(EmailOutbox)).all()
+    old = datetime.now() - timedelta(days=settings.EMAIL_OUTBOX_RETENTION_DAYS + 1)
+    dropped.next_attempt_at = None
+    old_dropped.next_attempt_at = None
+    old_dropped.created_at = old
+    pending.created_at = old
+    db.add_all([dropped, old_dropped, pending])
+    db.commit()
+    assert purge_dropped_emails() == 1
+    remaining = {email.id for email in db.exec(select(EmailOutbox)).all()}
+    assert remaining == {dropped.id, pending.id}
+
+
+def test_outbox_worker_sends_on_notify(smtp_server: Recorder, db: Session) -> None:
+    worker = OutboxWorker()
+    worker.start()
+    try:
+        # Longer than the test waits, so only the notification can wake it
+        with patch.object(settings, "EMAIL_POLL_SECONDS", 60):
+            time.sleep(0.5)
+            (email_to,) = _enqueue(db, 1)
+            deadline = time.monotonic() + 5
+            while not smtp_server.messages and time.monotonic() < deadline:
+                time.sleep(0.05)
+    finally:
+        worker.stop()
+    assert [rcpt_tos for _, rcpt_tos in smtp_server.messages] == [[email_to]]
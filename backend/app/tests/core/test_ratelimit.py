@@ -0,0 +1,35 @@
+from unittest.mock import patch
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.ratelimit import LOGIN_RATE_LIMITED, take_login_attempt
+from app.tests.utils.utils import random_email, random_lower_string
+
+
+def test_take_login_attempt_per_email() -> None:
+    email = random_email()
+    ip = random_lower_string()
+    rejected = LOGIN_RATE_LIMITED.value("email")
+    with (
+        patch.multiple(settings, LOGIN_EMAIL_BURST=2, LOGIN_EMAIL_PER_MINUTE=1),
+        engine.begin() as connection,
+    ):
+        assert take_login_attempt(connection, email=email, ip=ip) == 0
+        assert take_login_attempt(connection, email=email.upper(), ip=ip) == 0
+        retry_after = take_login_attempt(connection, email=email, ip=ip)
+        assert 60 < retry_after <= 120
+        # Other emails from the same IP are still allowed
+        assert take_login_attempt(connection, email=random_email(), ip=ip) == 0
+    assert LOGIN_RATE_LIMITED.value("email") == rejected + 1
+
+
+def test_take_login_attempt_per_ip() -> None:
+    ip = random_lower_string()
+    with (
+        patch.multiple(settings, LOGIN_IP_BURST=2, LOGIN_IP_PER_MINUTE=1),
+        engine.begin() as connection,
+    ):
+        assert take_login_attempt(connection, email=random_email(), ip=ip) == 0
+        assert take_login_attempt(connection, email=random_email(), ip=ip) == 0
+        assert take_login_attempt(connection, email=random_email(), ip=ip) > 0
+        assert take_login_attempt(connection, email=random_email(), ip=None) == 0
@@ -0,0 +1,162 @@
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from typing import Any
+from unittest.mock import patch
+
+import fakeredis
+import psycopg
+import pytest
+import redis
+from sqlmodel import Session, func, select
+
+from app.core.events import ChangeListener, change_listener, notify_change
+from app.core.read_cache import (
+    READ_CACHE_ERRORS,
+    READ_CACHE_INVALIDATIONS,
+    CachedResponse,
+    MemoryBackend,
+    ReadCache,
+    RedisBackend,
+)
+from app.models import ChangeAction, TodoChangeEvent, TombstoneKind
+
+CACHED = CachedResponse(
+    body=b'{"title": "Buy milk"}',
+    etag='"abc"',
+    last_modified=datetime(2024, 1, 1, tzinfo=timezone.utc),
+)
+
+
+@pytest.fixture(params=["memory", "redis"])
+def cache(request: pytest.FixtureRequest) -> ReadCache:
+    if request.param == "memory":
+        return ReadCache(MemoryBackend(maxsize=100, ttl=60))
+    return ReadCache(RedisBackend(fakeredis.FakeRedis(), ttl=60))
+
+
+def _change(owner_id: uuid.UUID) -> TodoChangeEvent:
+    return TodoChangeEvent(
+        kind=TombstoneKind.todo,
+        action=ChangeAction.updated,
+        owner_id=owner_id,
+        object_id=uuid.uuid4(),
+    )
+
+
+def test_read_cache_round_trip(cache: ReadCache) -> None:
+    owner_id = uuid.uuid4()
+    cached, token = cache.get(owner_id, "todo:1")
+    assert cached is None
+    assert token is not None
+    cache.set(owner_id, "todo:1", token, CACHED)
+    assert cache.get(owner_id, "todo:1") == (CACHED, token)
+    assert cache.get(uuid.uuid4(), "todo:1")[0] is None
+    assert cache.get(None, "todo:1") == (None, None)
+
+
+def test_read_cache_round_trip_async(cache: ReadCache) -> None:
+    owner_id = uuid.uuid4()
+
+    async def run() -> tuple[CachedResponse | None, bytes | None]:
+        _, token = await cache.get_async(owner_id, "todo:1")
+        await cache.set_async(owner_id, "todo:1", token, CACHED)
+        return await cache.get_async(owner_id, "todo:1")
+
+    cached, token = asyncio.run(run())
+    assert cached == CACHED
+    assert token is not None
+
+
+def test_read_cache_invalidates_owner(cache: ReadCache) -> None:
+    owner_id, other_id = uuid.uuid4(), uuid.uuid4()
+    for owner in (owner_id, other_id):
+        _, token = cache.get(owner, "todo:1")
+        cache.set(owner, "todo:1", token, CACHED)
+    # A read that started before the write stores a stale entry afterwards
+    _, stale_token = cache.get(owner_id, "todo:2")
+    cache.invalidate(owner_id)
+    cache.set(owner_id, "todo:2", stale_token, CACHED)
+    assert cache.get(owner_id, "todo:1")[0] is None
+    assert cache.get(owner_id, "todo:2")[0] is None
+    assert cache.get(other_id, "todo:1")[0] == CACHED
+
+
+def test_read_cache_broadcast(cache: ReadCache) -> None:
+    owner_id = uuid.uuid4()
+    _, token = cache.get(owner_id, "todo:1")
+    cache.set(owner_id, "todo:1", token, CACHED)
+    broadcasts = READ_CACHE_INVALIDATIONS.value("broadcast")
+    cache.on_change(_change(owner_id))
+    assert cache.backend is not None
+    if cache.backend.shared:
+        # The writer already invalidated the shared entries
+        assert cache.get(owner_id, "todo:1")[0] == CACHED
+        assert READ_CACHE_INVALIDATIONS.value("broadcast") == broadcasts
+    else:
+        assert cache.get(owner_id, "todo:1")[0] is None
+        assert READ_CACHE_INVALIDATIONS.value("broadcast") == broadcasts + 1
+
+
+def test_change_listener_calls_watchers() -> None:
+    cache = ReadCache(MemoryBackend(maxsize=100, ttl=60))
+    owner_id = uuid.uuid4()
+    _, token = cache.get(owner_id, "todo:1")
+    cache.set(owner_id, "todo:1", token, CACHED)
+    change_listener._handlers.append(cache.on_change)
+    try:
+        change_listener._dispatch(_change(owner_id).model_dump_json())
+    finally:
+        change_listener._handlers.remove(cache.on_change)
+    assert cache.get(owner_id, "todo:1")[0] is None
+
+
+def test_reconnect_drops_memory_entries(db: Session) -> None:
+    cache = ReadCache(MemoryBackend(maxsize=100, ttl=60))
+    owner_id = uuid.uuid4()
+    _, token = cache.get(owner_id, "todo:1")
+    cache.set(owner_id, "todo:1", token, CACHED)
+    listener = ChangeListener()
+    listener.watch_reconnects(cache.on_reconnect)
+    connect = psycopg.AsyncConnection.connect
+    connections: list[psycopg.AsyncConnection[Any]] = []
+
+    async def tracked_connect(*args: Any, **kwargs: Any) -> Any:
+        connection = await connect(*args, **kwargs)
+        connections.append(connection)
+        return connection
+
+    async def run() -> str | None:
+        async with listener.subscribe(owner_id) as queue:
+            # Wait until the first connection delivers events
+            for _ in range(50):
+                notify_change(session=db, event=_change(owner_id))
+                db.commit()
+                try:
+                    await asyncio.wait_for(queue.get(), 0.2)
+                    break
+                except asyncio.TimeoutError:
+                    continue
+            assert cache.get(owner_id, "todo:1")[0] == CACHED
+            db.exec(select(func.pg_terminate_backend(connections[0].info.backend_pid)))
+            # Subscribers are asked to resync once reconnected
+            try:
+                return await asyncio.wait_for(queue.get(), 10)
+            finally:
+                assert listener._task is not None
+                listener._task.cancel()
+
+    with patch.object(psycopg.AsyncConnection, "connect", tracked_connect):
+        assert asyncio.run(run()) is None
+    assert len(connections) == 2
+    assert cache.get(owner_id, "todo:1")[0] is None
+
+
+def test_read_cache_falls_back_on_errors() -> None:
+    client = redis.Redis(port=1, socket_connect_timeout=0.1)
+    cache = ReadCache(RedisBackend(client, ttl=60))
+    errors = READ_CACHE_ERRORS.value()
+    owner_id = uuid.uuid4()
+    assert cache.get(owner_id, "todo:1") == (None, None)
+    cache.invalidate(owner_id)
+    assert READ_CACHE_ERRORS.value() == errors + 2
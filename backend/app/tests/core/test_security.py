@@ -0,0 +1,93 @@
+import asyncio
+import time
+import uuid
+from unittest.mock import patch
+
+import pytest
+
+from app.core.security import PasswordHasher, PasswordHashingBusy, TokenRevocations
+
+
+def test_token_revocations_revoke_until_refresh() -> None:
+    with patch("app.core.security.time.monotonic", return_value=100.0):
+        revocations = TokenRevocations(refresh_seconds=5)
+    user_id = uuid.uuid4()
+    # Unknown users are checked against the database
+    assert revocations.is_revoked(user_id, 0)
+    revocations.update([user_id], {user_id: 0})
+    assert not revocations.is_revoked(user_id, 0)
+    with patch("app.core.security.time.monotonic", return_value=101.0):
+        revocations.revoke(user_id)
+    assert revocations.is_revoked(user_id, 0)
+    assert revocations.is_revoked(user_id, 1)
+    with patch("app.core.security.time.monotonic", return_value=106.0):
+        assert revocations.due() == [user_id]
+    revocations.update([user_id], {user_id: 1})
+    assert revocations.is_revoked(user_id, 0)
+    assert not revocations.is_revoked(user_id, 1)
+
+
+def test_token_revocations_stale_refresh() -> None:
+    with patch("app.core.security.time.monotonic", return_value=100.0):
+        revocations = TokenRevocations(refresh_seconds=5)
+    user_id = uuid.uuid4()
+    revocations.update([user_id], {user_id: 1})
+    revocations.is_revoked(user_id, 1)
+    with patch("app.core.security.time.monotonic", return_value=106.0):
+        assert revocations.due() == [user_id]
+    # The user is revoked while the refresh reads the old version
+    with patch("app.core.security.time.monotonic", return_value=107.0):
+        revocations.revoke(user_id)
+    revocations.update([user_id], {user_id: 1})
+    assert revocations.is_revoked(user_id, 1)
+    with patch("app.core.security.time.monotonic", return_value=112.0):
+        assert revocations.due() == [user_id]
+    revocations.update([user_id], {user_id: 2})
+    assert not revocations.is_revoked(user_id, 2)
+    # A version read earlier never lowers the one known
+    revocations.update([user_id], {user_id: 1})
+    assert revocations.is_revoked(user_id, 1)
+
+
+def test_token_revocations_deleted_user() -> None:
+    revocations = TokenRevocations(refresh_seconds=5)
+    user_id = uuid.uuid4()
+    revocations.update([user_id], {})
+    assert revocations.is_revoked(user_id, 10)
+
+
+def test_token_revocations_due() -> None:
+    with patch("app.core.security.time.monotonic", return_value=100.0):
+        revocations = TokenRevocations(refresh_seconds=5)
+    user_id = uuid.uuid4()
+    with patch("app.core.security.time.monotonic", return_value=106.0):
+        assert revocations.due() == []
+        revocations.is_revoked(user_id, 0)
+        assert revocations.due() == [user_id]
+        revocations.is_revoked(user_id, 0)
+        assert revocations.due() == []
+    with patch("app.core.security.time.monotonic", return_value=111.0):
+        assert revocations.due() == [user_id]
+
+
+def test_password_hasher_rejects_beyond_queue() -> None:
+    hasher = PasswordHasher(workers=1, max_queue=1)
+
+    async def check() -> None:
+        slow = asyncio.ensure_future(hasher.run_async(time.sleep, 0.5))
+        await asyncio.sleep(0)
+        with pytest.raises(PasswordHashingBusy):
+            hasher.run(time.sleep, 0)
+        await slow
+
+    try:
+        asyncio.run(check())
+        assert hasher.run(abs, -1) == 1
+    finally:
+        hasher.shutdown()
+
+
+def test_password_hasher_inline() -> None:
+    hasher = PasswordHasher(workers=0, max_queue=1)
+    assert hasher.run(abs, -1) == 1
+    assert asyncio.run(hasher.run_async(abs, -2)) == 2
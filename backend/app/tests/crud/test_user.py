@@ -1,8 +1,10 @@
+from unittest.mock import patch
+
 from fastapi.encoders import jsonable_encoder
 from sqlmodel import Session
 
 from app import crud
-from app.core.security import verify_password
+from app.core.security import pwd_context, verify_password
 from app.models import User, UserCreate, UserUpdate
 from app.tests.utils.utils import random_email, random_lower_string
 
@@ -89,3 +91,40 @@ def test_update_user(db: Session) -> None:
     assert user_2
     assert user.email == user_2.email
     assert verify_password(new_password, user_2.hashed_password)
+
+
+def test_update_user_role_bumps_token_version(db: Session) -> None:
+    user_in = UserCreate(email=random_email(), password=random_lower_string())
+    user = crud.create_user(session=db, user_create=user_in)
+    assert user.token_version == 0
+    crud.update_user(session=db, db_user=user, user_in=UserUpdate(full_name="Name"))
+    assert user.token_version == 0
+    crud.update_user(session=db, db_user=user, user_in=UserUpdate(is_superuser=False))
+    assert user.token_version == 0
+    crud.update_user(session=db, db_user=user, user_in=UserUpdate(is_active=False))
+    assert user.token_version == 1
+
+
+def test_authenticate_user_rehashes_outdated_cost(db: Session) -> None:
+    email = random_email()
+    password = random_lower_string()
+    user = crud.create_user(
+        session=db, user_create=UserCreate(email=email, password=password)
+    )
+    user.hashed_password = pwd_context.copy(bcrypt__rounds=4).hash(password)
+    db.add(user)
+    db.commit()
+
+    authenticated_user = crud.authenticate(session=db, email=email, password=password)
+    assert authenticated_user
+    db.refresh(user)
+    assert not pwd_context.needs_update(user.hashed_password)
+    assert verify_password(password, user.hashed_password)
+
+
+def test_not_authenticate_unknown_user_spends_a_check(db: Session) -> None:
+    password = random_lower_string()
+    with patch("app.crud.verify_dummy_password") as verify_dummy_password:
+        user = crud.authenticate(session=db, email=random_email(), password=password)
+    assert user is None
+    verify_dummy_password.assert_called_once_with(password)
@@ -0,0 +1,46 @@
+from pathlib import Path
+from unittest.mock import patch
+
+from jinja2 import Template
+
+from app.core.config import settings
+from app.utils import (
+    EMAIL_TEMPLATES_DIR,
+    _bytecode_cache,
+    email_templates,
+    generate_reset_password_email,
+    warm_email_templates,
+)
+
+
+def test_warm_email_templates_compiles_them_once() -> None:
+    warm_email_templates()
+    template = email_templates.get_template("reset_password.html")
+    assert email_templates.get_template("reset_password.html") is template
+
+
+def test_render_email_template_matches_template_file() -> None:
+    email = generate_reset_password_email(
+        email_to="user@example.com", email="user@example.com", token="token"
+    )
+    source = (EMAIL_TEMPLATES_DIR / "reset_password.html").read_text()
+    assert email.html_content == Template(source).render(
+        project_name=settings.PROJECT_NAME,
+        username="user@example.com",
+        email="user@example.com",
+        valid_hours=settings.EMAIL_RESET_TOKEN_EXPIRE_HOURS,
+        link=f"{settings.FRONTEND_HOST}/reset-password?token=token",
+    )
+
+
+def test_email_templates_bytecode_cache(tmp_path: Path) -> None:
+    with patch.object(settings, "EMAIL_TEMPLATES_BYTECODE_DIR", None):
+        assert _bytecode_cache() is None
+    directory = tmp_path / "templates"
+    with patch.object(settings, "EMAIL_TEMPLATES_BYTECODE_DIR", str(directory)):
+        bytecode_cache = _bytecode_cache()
+    with patch.object(email_templates, "bytecode_cache", bytecode_cache):
+        email_templates.cache.clear()  # type: ignore[union-attr]
+        email_templates.get_template("test_email.html")
+    email_templates.cache.clear()  # type: ignore[union-attr]
+    assert list(directory.iterdir())
@@ -0,0 +1,23 @@
+from sqlmodel import Session
+
+from app.models import Todo, TodoCreate, User
+from app.tests.utils.user import create_random_user
+from app.tests.utils.utils import random_lower_string
+
+
+def create_random_todo(
+    db: Session,
+    owner: User | None = None,
+    title: str | None = None,
+    desc: str | None = None,
+) -> Todo:
+    if owner is None:
+        owner = create_random_user(db)
+    todo_in = TodoCreate(
+        title=title or random_lower_string(), desc=desc or random_lower_string()
+    )
+    todo = Todo.model_validate(todo_in, update={"owner_id": owner.id})
+    db.add(todo)
+    db.commit()
+    db.refresh(todo)
+    return todo
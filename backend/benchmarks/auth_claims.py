@@ -0,0 +1,41 @@
+"""
+Compare how read_todos authorizes the current user under load.
+
+"lookup" loads the user on every request, "cache" uses the per-worker auth
+cache and "claims" reads is_active and is_superuser from the token
+(settings.AUTH_TOKEN_CLAIMS).
+"""
+
+import argparse
+
+from benchmarks.common import BASE_URL, load, login, run_server
+
+MODES = {
+    "lookup": {"AUTH_CACHE_TTL_SECONDS": "0", "AUTH_TOKEN_CLAIMS": "false"},
+    "cache": {"AUTH_TOKEN_CLAIMS": "false"},
+    "claims": {"AUTH_CACHE_TTL_SECONDS": "0", "AUTH_TOKEN_CLAIMS": "true"},
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--mode", choices=list(MODES), action="append")
+    args = parser.parse_args()
+
+    for name in args.mode or list(MODES):
+        with run_server(MODES[name]):
+            headers = login()
+            result = load(
+                "GET",
+                f"{BASE_URL}/todos/?limit=20&count_mode=none",
+                concurrency=args.concurrency,
+                seconds=args.seconds,
+                headers=headers,
+            )
+            print(f"{name:6} read_todos {result}")
+
+
+if __name__ == "__main__":
+    main()
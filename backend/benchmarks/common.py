@@ -0,0 +1,168 @@
+"""
+Helpers shared by the load benchmarks.
+
+Run the benchmarks from the backend directory against a migrated database,
+e.g. `python -m benchmarks.db_stack`.
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any
+
+import httpx
+
+from app.core.config import settings
+
+HOST = "127.0.0.1"
+PORT = 8765
+BASE_URL = f"http://{HOST}:{PORT}{settings.API_V1_STR}"
+
+
+@dataclass
+class LoadResult:
+    requests: int
+    errors: int
+    seconds: float
+    p50_ms: float
+    p99_ms: float
+
+    @property
+    def rps(self) -> float:
+        return self.requests / self.seconds
+
+    def __str__(self) -> str:
+        return (
+            f"{self.rps:8.1f} req/s  p50 {self.p50_ms:7.1f} ms  "
+            f"p99 {self.p99_ms:7.1f} ms  errors {self.errors}"
+        )
+
+
+@contextmanager
+def run_server(env: dict[str, str], workers: int = 1) -> Iterator[None]:
+    """
+    Serve the app with uvicorn in a subprocess, with `env` on top of ours.
+    """
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--host",
+            HOST,
+            "--port",
+            str(PORT),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ],
+        env={**os.environ, **env},
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"server exited with code {process.returncode}")
+            try:
+                httpx.get(f"{BASE_URL}/utils/health-check/").raise_for_status()
+                break
+            except httpx.TransportError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.2)
+        yield
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            # Requests stuck waiting on the pool block a graceful shutdown
+            process.kill()
+            process.wait()
+
+
+def login(
+    email: str = settings.FIRST_SUPERUSER,
+    password: str = settings.FIRST_SUPERUSER_PASSWORD,
+) -> dict[str, str]:
+    r = httpx.post(
+        f"{BASE_URL}/login/access-token",
+        data={"username": email, "password": password},
+    )
+    r.raise_for_status()
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+async def _load(
+    method: str,
+    url: str,
+    *,
+    concurrency: int,
+    seconds: float,
+    **kwargs: object,
+) -> LoadResult:
+    latencies: list[float] = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        end = time.monotonic() + seconds
+
+        async def worker() -> None:
+            nonlocal errors
+            while time.monotonic() < end:
+                start = time.monotonic()
+                try:
+                    r = await client.request(method, url, **kwargs)  # type: ignore[arg-type]
+                    r.raise_for_status()
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.monotonic() - start)
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.monotonic() - started
+    latencies.sort()
+    if not latencies:
+        return LoadResult(0, errors, elapsed, 0.0, 0.0)
+    return LoadResult(
+        requests=len(latencies),
+        errors=errors,
+        seconds=elapsed,
+        p50_ms=latencies[len(latencies) // 2] * 1000,
+        p99_ms=latencies[int(len(latencies) * 0.99)] * 1000,
+    )
+
+
+def load(
+    method: str,
+    url: str,
+    *,
+    concurrency: int,
+    seconds: float,
+    **kwargs: object,
+) -> LoadResult:
+    """
+    Keep `concurrency` clients requesting `url` back to back for `seconds`.
+    """
+    return asyncio.run(
+        _load(method, url, concurrency=concurrency, seconds=seconds, **kwargs)
+    )
+
+
+def load_together(*jobs: dict[str, Any]) -> list[LoadResult]:
+    """
+    Run several loads at the same time, each given as the arguments of `load`.
+    """
+
+    async def run() -> list[LoadResult]:
+        return await asyncio.gather(*(_load(**job) for job in jobs))
+
+    return asyncio.run(run())
@@ -0,0 +1,58 @@
+"""
+Compare the sync and async database stacks (settings.ASYNC_DB) under load.
+
+Each stack is served by one uvicorn worker while 500 concurrent clients list
+todos and read a single todo.
+"""
+
+import argparse
+
+import httpx
+
+from benchmarks.common import BASE_URL, load, login, run_server
+
+SEED_TODOS = 200
+
+
+def seed(headers: dict[str, str]) -> list[str]:
+    todos = [{"title": f"Benchmark {i}", "desc": "db stack"} for i in range(SEED_TODOS)]
+    r = httpx.post(f"{BASE_URL}/todos/bulk", headers=headers, json=todos)
+    r.raise_for_status()
+    return [str(id) for id in r.json()["ids"]]
+
+
+def cleanup(headers: dict[str, str], ids: list[str]) -> None:
+    httpx.request(
+        "DELETE", f"{BASE_URL}/todos/bulk", headers=headers, json={"ids": ids}
+    ).raise_for_status()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--stack", choices=["sync", "async"], action="append")
+    args = parser.parse_args()
+
+    for name in args.stack or ["sync", "async"]:
+        async_db = "true" if name == "async" else "false"
+        with run_server({"ASYNC_DB": async_db}):
+            headers = login()
+            ids = seed(headers)
+            for label, url in (
+                ("list todos", f"{BASE_URL}/todos/?limit=20&count_mode=none"),
+                ("read todo", f"{BASE_URL}/todos/{ids[0]}"),
+            ):
+                result = load(
+                    "GET",
+                    url,
+                    concurrency=args.concurrency,
+                    seconds=args.seconds,
+                    headers=headers,
+                )
+                print(f"{name:5} {label:10} {result}")
+            cleanup(headers, ids)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Measure the cost per request of the request metrics (settings.HTTP_METRICS).
+
+"asgi" calls a small app in process, without a network, with and without
+MetricsMiddleware, and reports the time per request. "server" loads the
+health check of the real app served by uvicorn with the metrics on and
+off.
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Any
+
+from fastapi import FastAPI
+from starlette.types import ASGIApp, Message
+
+from app.core.http_metrics import MetricsMiddleware
+from benchmarks.common import BASE_URL, load, run_server
+
+
+def build_app(metrics: bool) -> ASGIApp:
+    app = FastAPI()
+
+    @app.get("/todos/{id}")
+    async def read_todo(id: int) -> Any:
+        return {"id": id, "title": "Buy milk", "desc": "At the shop"}
+
+    return MetricsMiddleware(app) if metrics else app
+
+
+async def _call(app: ASGIApp, requests: int) -> float:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/todos/1",
+        "raw_path": b"/todos/1",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [],
+        "server": ("test", 80),
+        "client": ("test", 1234),
+    }
+
+    async def receive() -> Message:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(_: Message) -> None:
+        pass
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return time.perf_counter() - start
+
+
+def bench_asgi(requests: int, rounds: int) -> None:
+    apps = {"off": build_app(False), "on": build_app(True)}
+    # Warm up, then keep the best round of each to leave out the noise
+    for app in apps.values():
+        asyncio.run(_call(app, requests // 10))
+    best = {
+        name: min(asyncio.run(_call(app, requests)) for _ in range(rounds))
+        for name, app in apps.items()
+    }
+    for name, seconds in best.items():
+        print(f"asgi   metrics {name:3}  {seconds / requests * 1e6:7.2f} us/request")
+    overhead = (best["on"] - best["off"]) / requests * 1e6
+    print(
+        f"asgi   overhead     {overhead:7.2f} us/request "
+        f"({(best['on'] / best['off'] - 1) * 100:.1f}%)"
+    )
+
+
+def bench_server(concurrency: int, seconds: float) -> None:
+    for name, enabled in (("off", "false"), ("on", "true")):
+        with run_server({"HTTP_METRICS": enabled}):
+            result = load(
+                "GET",
+                f"{BASE_URL}/utils/health-check/",
+                concurrency=concurrency,
+                seconds=seconds,
+            )
+            print(f"server metrics {name:3}  {result}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--mode", choices=["asgi", "server"], action="append")
+    args = parser.parse_args()
+
+    modes = args.mode or ["asgi", "server"]
+    if "asgi" in modes:
+        bench_asgi(args.requests, args.rounds)
+    if "server" in modes:
+        bench_server(args.concurrency, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
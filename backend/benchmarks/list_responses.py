@@ -0,0 +1,57 @@
+"""
+Compare how read_todos serializes pages of 100, 1,000 and 10,000 todos.
+
+"models" loads ORM objects and validates them through TodosPublic, "fast"
+selects the public columns and writes them with orjson
+(settings.FAST_LIST_RESPONSES). Missing todos are created for the
+superuser first.
+"""
+
+import argparse
+
+import httpx
+
+from benchmarks.common import BASE_URL, load, login, run_server
+
+MODES = {
+    "models": {"FAST_LIST_RESPONSES": "false"},
+    "fast": {"FAST_LIST_RESPONSES": "true"},
+}
+SIZES = [100, 1_000, 10_000]
+
+
+def ensure_todos(headers: dict[str, str], count: int) -> None:
+    r = httpx.get(f"{BASE_URL}/todos/", headers=headers, params={"limit": 1})
+    r.raise_for_status()
+    missing = count - r.json()["count"]
+    if missing > 0:
+        todos = [{"title": f"Todo {i}", "desc": "Benchmark"} for i in range(missing)]
+        httpx.post(
+            f"{BASE_URL}/todos/bulk", headers=headers, json=todos, timeout=120
+        ).raise_for_status()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--mode", choices=list(MODES), action="append")
+    args = parser.parse_args()
+
+    for name in args.mode or list(MODES):
+        with run_server(MODES[name]):
+            headers = login()
+            ensure_todos(headers, max(SIZES))
+            for size in SIZES:
+                result = load(
+                    "GET",
+                    f"{BASE_URL}/todos/?limit={size}&count_mode=none",
+                    concurrency=args.concurrency,
+                    seconds=args.seconds,
+                    headers=headers,
+                )
+                print(f"{name:6} {size:6} rows {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Measure logins per second per core, and todo reads during the login storm.
+
+"inline" hashes passwords on the request threads, "pool" in a process pool
+(settings.PASSWORD_HASH_WORKERS).
+"""
+
+import argparse
+import os
+
+from app.core.config import settings
+from benchmarks.common import BASE_URL, load_together, login, run_server
+
+CORES = os.cpu_count() or 1
+
+MODES = {
+    "inline": {"PASSWORD_HASH_WORKERS": "0"},
+    "pool": {"PASSWORD_HASH_WORKERS": str(CORES)},
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--readers", type=int, default=10)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--rounds", type=int, default=settings.PASSWORD_BCRYPT_ROUNDS)
+    parser.add_argument("--mode", choices=list(MODES), action="append")
+    args = parser.parse_args()
+
+    for name in args.mode or list(MODES):
+        env = {
+            **MODES[name],
+            "PASSWORD_BCRYPT_ROUNDS": str(args.rounds),
+            # All logins are for the same email from the same IP
+            "LOGIN_RATE_LIMIT": "false",
+        }
+        with run_server(env):
+            headers = login()
+            logins, reads = load_together(
+                {
+                    "method": "POST",
+                    "url": f"{BASE_URL}/login/access-token",
+                    "concurrency": args.concurrency,
+                    "seconds": args.seconds,
+                    "data": {
+                        "username": settings.FIRST_SUPERUSER,
+                        "password": settings.FIRST_SUPERUSER_PASSWORD,
+                    },
+                },
+                {
+                    "method": "GET",
+                    "url": f"{BASE_URL}/todos/?limit=20&count_mode=none",
+                    "concurrency": args.readers,
+                    "seconds": args.seconds,
+                    "headers": headers,
+                },
+            )
+            print(f"{name:6} logins     {logins}  {logins.rps / CORES:6.1f} /s/core")
+            print(f"{name:6} read todos {reads}")
+
+
+if __name__ == "__main__":
+    main()